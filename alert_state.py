@@ -0,0 +1,282 @@
+"""
+アラート状態管理モジュール
+センサーごとのリスクレベルをヒステリシス付きの状態機械で管理し、通知の要否を判定する
+
+閾値付近で値が上下しても、以下の条件を満たすまでレベルは下がらない:
+    - 閾値からヒステリシス幅以上下回る
+    - 現在のレベルに最低滞在時間以上とどまっている
+レベルの上昇は即座に反映する。通知はレベルが上昇したときのみ行い、
+再通知間隔を設定した場合は同じレベルが続いていても一定時間ごとに再通知する。
+通知済みのレベルは判定時に記録し（送信中に同じアラートを重ねて送らないため）、
+全チャネルへの送信に失敗した場合はnotify_failedで元に戻して次の測定値で再通知する。
+
+通知は全セッションで共通のチャネルに送るため、状態機械はプロセス内で1つを共有する
+（get_shared_alert_state）。状態の保存は評価の経路では行わず、バックグラウンドでまとめて行う。
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from typing import Optional
+
+from heatstroke import HEATSTROKE_LEVELS, ALERT_LEVELS, get_heatstroke_risk
+
+# リスクレベルの深刻度（大きいほど危険）
+LEVEL_RANK = {level: rank for rank, level in enumerate(HEATSTROKE_LEVELS)}
+
+# 既定値
+DEFAULT_HYSTERESIS_DI = 1.0
+DEFAULT_HYSTERESIS_WBGT = 0.5
+DEFAULT_MIN_DWELL_SECONDS = 60.0
+DEFAULT_RENOTIFY_MINUTES = 0.0
+
+# 状態が変化してから保存するまでの待ち時間（秒、この間の変化はまとめて1回で保存）
+SAVE_DELAY_SECONDS = 1.0
+
+# プロセス内で共有する状態機械
+_shared = None
+_shared_lock = threading.Lock()
+
+
+class AlertStateMachine:
+    """センサーごとのアラート状態機械"""
+
+    def __init__(self, hysteresis_di: Optional[float] = None, hysteresis_wbgt: Optional[float] = None,
+                 min_dwell: Optional[float] = None, renotify_after: Optional[float] = None,
+                 state_file: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            hysteresis_di: レベルを下げるために不快指数が閾値を下回るべき幅
+                （省略時は環境変数ALERT_HYSTERESIS_DI）
+            hysteresis_wbgt: レベルを下げるためにWBGTが閾値を下回るべき幅
+                （省略時は環境変数ALERT_HYSTERESIS_WBGT）
+            min_dwell: レベルを下げるまでの最低滞在時間（秒、省略時は環境変数ALERT_MIN_DWELL_SECONDS）
+            renotify_after: 同じレベルが続く場合の再通知間隔（秒、0で上昇時のみ通知。
+                省略時は環境変数ALERT_RENOTIFY_MINUTES）
+            state_file: 状態の保存先（省略時は環境変数ALERT_STATE_FILE、未設定または空文字なら保存しない）
+        """
+        self.hysteresis_di = _setting(hysteresis_di, 'ALERT_HYSTERESIS_DI', DEFAULT_HYSTERESIS_DI)
+        self.hysteresis_wbgt = _setting(hysteresis_wbgt, 'ALERT_HYSTERESIS_WBGT', DEFAULT_HYSTERESIS_WBGT)
+        self.min_dwell = _setting(min_dwell, 'ALERT_MIN_DWELL_SECONDS', DEFAULT_MIN_DWELL_SECONDS)
+        if renotify_after is None:
+            renotify_after = _setting(None, 'ALERT_RENOTIFY_MINUTES', DEFAULT_RENOTIFY_MINUTES) * 60
+        self.renotify_after = renotify_after
+        self.state_file = state_file if state_file is not None else os.getenv('ALERT_STATE_FILE')
+
+        self.sensors = {}  # センサーID -> {'level', 'entered_at', 'notified_level', 'notified_at'}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # ファイルへの書き込みを1件ずつにする
+        self._save_timer = None
+        if self.state_file:
+            self.load()
+
+    def evaluate(self, sensor_id, di: float, wbgt: float, timestamp: datetime) -> Optional[dict]:
+        """
+        測定値を評価して状態を更新
+
+        Args:
+            sensor_id: センサーID
+            di: 不快指数
+            wbgt: WBGT
+            timestamp: 測定時刻
+
+        Returns:
+            状態が変化したか通知が必要な場合は
+            {'level', 'previous_level', 'changed', 'notify', 'notified_at', 'previous_notified'} の辞書、
+            それ以外はNone（'notified_at'・'previous_notified'は通知が必要な場合のみ設定）
+        """
+        now = timestamp.timestamp()
+        raw_level = get_heatstroke_risk(di, wbgt)
+
+        with self._lock:
+            state = self.sensors.get(sensor_id)
+            if state is None:
+                state = {'level': 'safe', 'entered_at': now, 'notified_level': None, 'notified_at': None}
+                self.sensors[sensor_id] = state
+
+            previous = state['level']
+            level = previous
+            if LEVEL_RANK[raw_level] > LEVEL_RANK[previous]:
+                level = raw_level
+            elif LEVEL_RANK[raw_level] < LEVEL_RANK[previous] and now - state['entered_at'] >= self.min_dwell:
+                # ヒステリシス幅だけ余裕を持たせた値で判定し、閾値付近での往復を抑える
+                lowered = get_heatstroke_risk(di + self.hysteresis_di, wbgt + self.hysteresis_wbgt)
+                if LEVEL_RANK[lowered] < LEVEL_RANK[previous]:
+                    level = lowered
+
+            changed = level != previous
+            if changed:
+                state['level'] = level
+                state['entered_at'] = now
+                if level not in ALERT_LEVELS:
+                    # 警戒レベルを下回ったら一連のアラートは終了
+                    state['notified_level'] = None
+                    state['notified_at'] = None
+
+            notify = False
+            previous_notified = None
+            if level in ALERT_LEVELS:
+                notified = state['notified_level']
+                if notified is None or LEVEL_RANK[level] > LEVEL_RANK[notified]:
+                    notify = True
+                elif self.renotify_after > 0 and now - state['notified_at'] >= self.renotify_after:
+                    notify = True
+                if notify:
+                    previous_notified = (state['notified_level'], state['notified_at'])
+                    state['notified_level'] = level
+                    state['notified_at'] = now
+
+        if not changed and not notify:
+            return None
+
+        self.schedule_save()
+        return {
+            'level': level, 'previous_level': previous, 'changed': changed, 'notify': notify,
+            'notified_at': now if notify else None, 'previous_notified': previous_notified
+        }
+
+    def notify_failed(self, sensor_id, decision: dict):
+        """
+        通知の送信失敗を記録し、通知済みのレベルを判定前の状態に戻す
+
+        以降に別の通知（レベルの上昇・再通知）が記録されている場合はそちらを優先し、何もしない。
+
+        Args:
+            sensor_id: センサーID
+            decision: evaluateが返した辞書（'notify'がTrueのもの）
+        """
+        with self._lock:
+            state = self.sensors.get(sensor_id)
+            if (state is None or state['notified_level'] != decision['level']
+                    or state['notified_at'] != decision['notified_at']):
+                return
+            state['notified_level'], state['notified_at'] = decision['previous_notified']
+        self.schedule_save()
+
+    def level(self, sensor_id) -> str:
+        """
+        センサーの現在のレベルを取得
+
+        Args:
+            sensor_id: センサーID
+
+        Returns:
+            リスクレベル（未登録の場合は'safe'）
+        """
+        state = self.sensors.get(sensor_id)
+        return state['level'] if state else 'safe'
+
+    def reset(self, sensor_ids=None):
+        """
+        状態をリセット
+
+        Args:
+            sensor_ids: リセットするセンサーIDのイテラブル（省略時は全センサー）
+        """
+        with self._lock:
+            if sensor_ids is None:
+                self.sensors = {}
+            else:
+                for sensor_id in sensor_ids:
+                    self.sensors.pop(sensor_id, None)
+        self.schedule_save()
+
+    def to_dict(self) -> dict:
+        """
+        状態を辞書に変換
+
+        Returns:
+            保存用の辞書
+        """
+        with self._lock:
+            return {'sensors': [[sensor_id, dict(state)] for sensor_id, state in self.sensors.items()]}
+
+    def load_dict(self, data: dict):
+        """
+        辞書から状態を復元
+
+        Args:
+            data: to_dictで作成した辞書
+        """
+        with self._lock:
+            self.sensors = {sensor_id: state for sensor_id, state in data.get('sensors', [])}
+
+    def schedule_save(self):
+        """状態の保存をバックグラウンドで予約（SAVE_DELAY_SECONDS以内の変化はまとめて保存）"""
+        if not self.state_file:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(SAVE_DELAY_SECONDS, self._save_in_background)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _save_in_background(self):
+        """予約された保存を実行"""
+        with self._lock:
+            self._save_timer = None
+        self.save()
+
+    def save(self):
+        """状態をファイルに保存（一意な一時ファイルに書き込んでから置き換える）"""
+        if not self.state_file:
+            return
+        data = self.to_dict()
+        directory = os.path.dirname(os.path.abspath(self.state_file))
+        with self._save_lock:
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.state_file) + '.',
+                                                suffix='.tmp')
+            except OSError as e:
+                print(f"アラート状態の保存エラー: {e}")
+                return
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.state_file)
+            except OSError as e:
+                print(f"アラート状態の保存エラー: {e}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def load(self):
+        """ファイルから状態を読み込み"""
+        try:
+            with open(self.state_file, encoding='utf-8') as f:
+                self.load_dict(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"アラート状態の読み込みエラー: {e}")
+
+
+def get_shared_alert_state() -> AlertStateMachine:
+    """
+    プロセス内で共有するアラート状態機械を取得
+
+    セッションごとに状態機械を作ると、同じ保存先（ALERT_STATE_FILE）を互いに上書きするため、
+    全セッションで1つを共有する。
+
+    Returns:
+        AlertStateMachine
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = AlertStateMachine()
+            atexit.register(_shared.save)
+        return _shared
+
+
+def _setting(value: Optional[float], env_name: str, default: float) -> float:
+    """引数・環境変数・既定値の順に設定値を決定"""
+    if value is not None:
+        return value
+    return float(os.getenv(env_name, default))
@@ -0,0 +1,122 @@
+"""
+屋外WBGT計算のベンチマーク
+アプリの取り込み経路（1回の読み込み分をadd_data_pointsでまとめて追加）の処理速度を計測し、
+取り込みレートに追いつけるかを確認する
+
+使い方:
+    python benchmark_wbgt.py --sensors 5000 --interval 2
+
+取り込みレートは「センサー数 ÷ 測定間隔」（件/秒）として計算する。
+全センサーを屋外センサー（OUTDOOR_SENSORS）として扱い、アラート状態の保存・測定値ログ・通知は行わない。
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from monitoring import make_offline_state, add_data_point, add_data_points
+
+# ベンチマーク用のセンサーIDの接頭辞（OUTDOOR_SENSORSに設定して屋外センサーとして扱う）
+SENSOR_ZONE = 'bench'
+
+
+def make_polls(sensors: int, polls: int, interval: float, seed: int = 0) -> list:
+    """
+    ベンチマーク用の測定値を生成
+
+    Args:
+        sensors: センサー数
+        polls: 読み込み回数
+        interval: 測定間隔（秒）
+        seed: 乱数シード
+
+    Returns:
+        読み込みごとの測定値の辞書のリストのリスト
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    sensor_ids = [f"{SENSOR_ZONE}/s{i}" for i in range(sensors)]
+    result = []
+    for poll in range(polls):
+        timestamp = start + timedelta(seconds=poll * interval)
+        temps = np.round(rng.uniform(20, 40, sensors), 1).tolist()
+        humidities = np.round(rng.uniform(30, 95, sensors), 1).tolist()
+        wind_speeds = np.round(rng.uniform(0, 8, sensors), 1).tolist()
+        solars = np.round(rng.uniform(0, 1000, sensors)).tolist()
+        result.append([
+            {'timestamp': timestamp, 'sensor_id': sensor_id, 'temperature': temp, 'humidity': humidity,
+             'wind_speed': wind_speed, 'solar_radiation': solar}
+            for sensor_id, temp, humidity, wind_speed, solar
+            in zip(sensor_ids, temps, humidities, wind_speeds, solars)
+        ])
+    return result
+
+
+def measure_batched(polls: list) -> float:
+    """
+    読み込みごとにまとめて追加した場合の処理時間を計測
+
+    Args:
+        polls: make_pollsで生成した測定値
+
+    Returns:
+        処理時間（秒）
+    """
+    state = make_offline_state()
+    started = time.perf_counter()
+    for readings in polls:
+        add_data_points(state, readings)
+    return time.perf_counter() - started
+
+
+def measure_looped(readings: list) -> float:
+    """
+    1件ずつ追加した場合の処理時間を計測（比較用）
+
+    Args:
+        readings: 測定値の辞書のリスト
+
+    Returns:
+        処理時間（秒）
+    """
+    state = make_offline_state()
+    started = time.perf_counter()
+    for r in readings:
+        add_data_point(state, r['timestamp'], r['temperature'], r['humidity'], sensor_id=r['sensor_id'],
+                       wind_speed=r['wind_speed'], solar_radiation=r['solar_radiation'])
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="屋外WBGT計算のベンチマーク")
+    parser.add_argument('--sensors', type=int, default=5000, help="屋外センサー数")
+    parser.add_argument('--interval', type=float, default=2.0, help="測定間隔（秒）")
+    parser.add_argument('--polls', type=int, default=5, help="計測する読み込み回数")
+    parser.add_argument('--loop-sample', type=int, default=500, help="1件ずつ追加する場合の計測件数")
+    args = parser.parse_args()
+
+    os.environ['OUTDOOR_SENSORS'] = SENSOR_ZONE
+    polls = make_polls(args.sensors, args.polls, args.interval)
+
+    batched = measure_batched(polls)
+    batched_rate = args.sensors * args.polls / batched
+    looped = measure_looped(polls[0][:args.loop_sample])
+    looped_rate = min(args.loop_sample, args.sensors) / looped
+
+    ingest_rate = args.sensors / args.interval
+    print(f"取り込みレート:        {ingest_rate:,.0f}件/秒（{args.sensors}センサー / {args.interval:g}秒）")
+    print(f"読み込みごとに追加:    {batched_rate:,.0f}件/秒（1回あたり{batched / args.polls * 1000:.1f}ms）")
+    print(f"1件ずつ追加:           {looped_rate:,.0f}件/秒")
+    print(f"高速化:                {batched_rate / looped_rate:.1f}倍")
+    print(f"余裕:                  {batched_rate / ingest_rate:.1f}倍")
+
+    if batched_rate < ingest_rate:
+        print("取り込みレートに追いついていません")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,375 @@
+"""
+チェックポイントモジュール
+測定値のバッファとアラート・通知の状態を定期的にバイナリ形式で保存し、再起動後に読み込んで再開する
+
+ファイル形式:
+    マジック（8バイト） + ヘッダー長（8バイト、リトルエンディアン） + ヘッダー（JSON）
+    + 測定値の列（各列を64バイト境界に揃えた生の配列）
+測定値の列はメモリマップで読み込み、セッション状態への復元も列ごとにまとめて変換する。
+保存はバックグラウンドのスレッドで一時ファイルに書き込んでから置き換える。
+
+保存先は全セッションで共通のため、保存は1つのセッション（書き込み担当）のみが行い、
+担当のセッションが保存しなくなった場合（タブを閉じた・休止した）は別のセッションが引き継ぐ。
+新しく開いたセッションは、再起動後に限らず最新のチェックポイント（書き込み担当のセッションの
+最後の保存時点のバッファ）から開始する。
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from heatstroke import get_heatstroke_risk
+from zone_index import ZoneRiskIndex
+
+MAGIC = b'HSCKPT01'
+HEADER_OFFSET = len(MAGIC) + 8
+ALIGNMENT = 64
+
+# 既定の保存間隔（秒）
+DEFAULT_INTERVAL_SECONDS = 30.0
+
+# 測定値の列と保存時の型（センサーIDはヘッダーのセンサーID一覧の番号として保存）
+COLUMN_DTYPES = {
+    'timestamp': '<f8',
+    'sensor_id': '<i4',
+    'temperature': '<f8',
+    'humidity': '<f8',
+    'discomfort_index': '<f8',
+    'wbgt': '<f8'
+}
+
+# 保存用のスレッド（プロセス内で共有、同時に1件のみ保存）
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint')
+_pending = None
+_pending_lock = threading.Lock()
+
+# 読み込み済みのチェックポイント（パス -> (更新時刻, 内容)）
+_loaded = {}
+
+# 書き込み担当のセッション（パス -> {'session_id', 'written_at'}）
+_writers = {}
+
+# 書き込み担当を引き継ぐまでの時間（保存間隔に対する倍率）
+WRITER_TIMEOUT_INTERVALS = 3
+
+
+def get_checkpoint_file() -> Optional[str]:
+    """
+    チェックポイントの保存先を取得
+
+    Returns:
+        保存先のパス（環境変数CHECKPOINT_FILE、未設定ならNone）
+    """
+    return os.getenv('CHECKPOINT_FILE')
+
+
+def get_checkpoint_interval() -> float:
+    """
+    チェックポイントの保存間隔を取得
+
+    Returns:
+        保存間隔（秒、環境変数CHECKPOINT_INTERVAL_SECONDSで変更可能）
+    """
+    return float(os.getenv('CHECKPOINT_INTERVAL_SECONDS', DEFAULT_INTERVAL_SECONDS))
+
+
+def take_snapshot(state) -> dict:
+    """
+    セッション状態からチェックポイントの内容を作成（呼び出し元のスレッドで実行）
+
+    Args:
+        state: セッション状態（st.session_stateまたは辞書）
+
+    Returns:
+        {'header', 'columns'} の辞書
+    """
+    sensor_data = state['sensor_data']
+    sensor_ids = list(dict.fromkeys(sensor_data['sensor_id']))
+    codes = {sensor_id: code for code, sensor_id in enumerate(sensor_ids)}
+
+    columns = {
+        'timestamp': np.array([t.timestamp() for t in sensor_data['timestamp']], dtype=COLUMN_DTYPES['timestamp']),
+        'sensor_id': np.array([codes[s] for s in sensor_data['sensor_id']], dtype=COLUMN_DTYPES['sensor_id'])
+    }
+    for key in ('temperature', 'humidity', 'discomfort_index', 'wbgt'):
+        columns[key] = np.array(sensor_data[key], dtype=COLUMN_DTYPES[key])
+
+    notifier = state.get('line_notifier')
+    header = {
+        'created_at': time.time(),
+        'rows': len(sensor_data['timestamp']),
+        'sensor_ids': sensor_ids,
+        'data_version': state.get('data_version', 0),
+        'alert_history': [
+            dict(alert, timestamp=alert['timestamp'].timestamp()) for alert in state['alert_history']
+        ],
+        'alert_state': state['alert_state'].to_dict(),
+        'last_sent_levels': [[k, v] for k, v in notifier.last_sent_levels.items()] if notifier else [],
+        'feed_seen': {name: t.timestamp() for name, t in state.get('feed_seen', {}).items()}
+    }
+    return {'header': header, 'columns': columns}
+
+
+def write_checkpoint(path: str, snapshot: dict):
+    """
+    チェックポイントをファイルに書き込む（一時ファイルに書き込んでから置き換える）
+
+    Args:
+        path: 保存先のパス
+        snapshot: take_snapshotで作成した内容
+    """
+    header = dict(snapshot['header'], columns={})
+    # 列の位置はヘッダーの長さに依存するため、ヘッダーが収まるまで開始位置をずらして決める
+    data_start = _align(HEADER_OFFSET)
+    while True:
+        offset = data_start
+        for name, values in snapshot['columns'].items():
+            header['columns'][name] = {'dtype': values.dtype.str, 'offset': offset}
+            offset = _align(offset + values.nbytes)
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        if HEADER_OFFSET + len(header_bytes) <= data_start:
+            break
+        data_start = _align(HEADER_OFFSET + len(header_bytes))
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(len(header_bytes).to_bytes(8, 'little'))
+            f.write(header_bytes)
+            for name, values in snapshot['columns'].items():
+                f.write(b'\0' * (header['columns'][name]['offset'] - f.tell()))
+                f.write(values.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_checkpoint(path: str) -> Optional[dict]:
+    """
+    チェックポイントをメモリマップで読み込む（同じファイルは一度だけ読み込む）
+
+    Args:
+        path: チェックポイントのパス
+
+    Returns:
+        {'header', 'columns'} の辞書（ファイルがない場合・形式が不正な場合・途中で切れている場合はNone）
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _loaded.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        mapped = np.memmap(path, dtype=np.uint8, mode='r')
+        if mapped[:len(MAGIC)].tobytes() != MAGIC:
+            raise ValueError("チェックポイントの形式が不正です")
+        header_length = int.from_bytes(mapped[len(MAGIC):HEADER_OFFSET].tobytes(), 'little')
+        if HEADER_OFFSET + header_length > mapped.size:
+            raise ValueError("チェックポイントのヘッダーが途中で切れています")
+        header = json.loads(mapped[HEADER_OFFSET:HEADER_OFFSET + header_length].tobytes())
+        rows = int(header['rows'])
+        if rows < 0:
+            raise ValueError(f"チェックポイントの件数が不正です: {rows}")
+        columns = {}
+        for name in COLUMN_DTYPES:
+            column = header['columns'][name]
+            dtype = np.dtype(column['dtype'])
+            offset = int(column['offset'])
+            if offset < HEADER_OFFSET or offset + rows * dtype.itemsize > mapped.size:
+                raise ValueError(f"チェックポイントの列が途中で切れています: {name}")
+            columns[name] = mapped[offset:offset + rows * dtype.itemsize].view(dtype)
+        if rows and not 0 <= columns['sensor_id'].min() <= columns['sensor_id'].max() < len(header['sensor_ids']):
+            raise ValueError("チェックポイントのセンサーIDが不正です")
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"チェックポイントの読み込みエラー: {e}")
+        return None
+
+    snapshot = {'header': header, 'columns': columns}
+    _loaded[path] = (mtime, snapshot)
+    return snapshot
+
+
+def restore_state(state, snapshot: dict):
+    """
+    チェックポイントの内容をセッション状態に復元
+
+    アラート状態は全セッションで共有しているため、まだ何も記録されていない場合
+    （再起動後の最初のセッション）のみ復元する。ファイルに保存している場合（ALERT_STATE_FILE）は
+    そちらの方が新しいため上書きしない。
+
+    Args:
+        state: init_session_stateで初期化したセッション状態
+        snapshot: load_checkpointで読み込んだ内容
+    """
+    header, columns = snapshot['header'], snapshot['columns']
+    rows = header['rows']
+
+    # 列ごとにまとめて変換する（1件ずつdatetimeを作るとバッファが大きい場合に起動が遅くなる）
+    timestamps = _to_datetimes(columns['timestamp'])
+    codes = np.asarray(columns['sensor_id'])
+    sensor_ids = np.empty(len(header['sensor_ids']), dtype=object)
+    sensor_ids[:] = header['sensor_ids']
+
+    sensor_data = state['sensor_data']
+    sensor_data['timestamp'] = timestamps
+    sensor_data['sensor_id'] = sensor_ids[codes].tolist() if rows else []
+    for key in ('temperature', 'humidity', 'discomfort_index', 'wbgt'):
+        sensor_data[key] = columns[key].tolist()
+
+    state['alert_history'] = [
+        dict(alert, timestamp=datetime.fromtimestamp(alert['timestamp'])) for alert in header['alert_history']
+    ]
+    alert_state = state['alert_state']
+    if not alert_state.state_file and not alert_state.sensors:
+        alert_state.load_dict(header['alert_state'])
+    if state.get('line_notifier'):
+        state['line_notifier'].last_sent_levels = {k: v for k, v in header['last_sent_levels']}
+    seen = state.setdefault('feed_seen', {})
+    for name, t in header.get('feed_seen', {}).items():
+        seen.setdefault(name, datetime.fromtimestamp(t))
+
+    # ゾーン別リスクはセンサーごとの最新の測定値から作り直す
+    zone_index = ZoneRiskIndex()
+    if rows:
+        # 各センサーの最後の行を求める（逆順で最初に現れる位置）
+        unique_codes, first_from_end = np.unique(codes[::-1], return_index=True)
+        for code, index in zip(unique_codes.tolist(), (rows - 1 - first_from_end).tolist()):
+            sensor_id = header['sensor_ids'][code]
+            if sensor_id is None:
+                continue
+            di, wbgt = sensor_data['discomfort_index'][index], sensor_data['wbgt'][index]
+            zone_index.update(sensor_id, get_heatstroke_risk(di, wbgt), wbgt, di, timestamps[index])
+    state['zone_index'] = zone_index
+
+    state['data_version'] = state.get('data_version', 0) + rows
+
+
+def warm_start(state, path: Optional[str] = None) -> bool:
+    """
+    チェックポイントがあればセッション状態に復元（セッションごとに一度だけ）
+
+    実行中に新しく開いたセッションも、最新のチェックポイント（書き込み担当のセッションの
+    最後の保存時点、最大で保存間隔だけ古い）から開始する。
+    読み込み・復元に失敗した場合はエラーを表示して、空の状態から開始する。
+
+    Args:
+        state: init_session_stateで初期化したセッション状態
+        path: チェックポイントのパス（省略時は環境変数CHECKPOINT_FILE）
+
+    Returns:
+        復元した場合はTrue
+    """
+    if state.get('warm_started'):
+        return False
+    state['warm_started'] = True
+    path = path or get_checkpoint_file()
+    if not path:
+        return False
+    try:
+        snapshot = load_checkpoint(path)
+        if snapshot is None:
+            return False
+        restore_state(state, snapshot)
+    except Exception as e:
+        print(f"チェックポイントの復元エラー: {e!r}")
+        for key in state['sensor_data']:
+            state['sensor_data'][key] = []
+        state['alert_history'] = []
+        state['zone_index'] = ZoneRiskIndex()
+        return False
+    return True
+
+
+def maybe_checkpoint(state, path: Optional[str] = None, session_id: Optional[str] = None) -> bool:
+    """
+    保存間隔が経過していればチェックポイントをバックグラウンドで保存
+
+    内容の作成（配列への変換）は呼び出し元のスレッドで行い、ファイルへの書き込みのみを
+    バックグラウンドで行う。前回の保存が終わっていない場合、測定値が変わっていない場合、
+    バッファが空の場合（休止中など）は保存しない。
+    session_idを指定した場合は、書き込み担当のセッションのみが保存する
+    （担当のセッションが保存間隔の3倍の間保存しなければ引き継ぐ）。
+
+    Args:
+        state: セッション状態（st.session_stateまたは辞書）
+        path: 保存先のパス（省略時は環境変数CHECKPOINT_FILE）
+        session_id: セッションID
+
+    Returns:
+        保存を開始した場合はTrue
+    """
+    global _pending
+    path = path or get_checkpoint_file()
+    if not path or not state['sensor_data']['timestamp']:
+        return False
+    now = time.time()
+    interval = get_checkpoint_interval()
+    if now - state.get('checkpointed_at', 0) < interval:
+        return False
+    if state.get('checkpointed_version') == state.get('data_version'):
+        return False
+
+    with _pending_lock:
+        if session_id is not None:
+            writer = _writers.get(path)
+            if (writer is not None and writer['session_id'] != session_id
+                    and now - writer['written_at'] < max(interval, 1.0) * WRITER_TIMEOUT_INTERVALS):
+                return False
+            _writers[path] = {'session_id': session_id, 'written_at': now}
+        if _pending is not None and not _pending.done():
+            return False
+        snapshot = take_snapshot(state)
+        _pending = _executor.submit(_write_in_background, path, snapshot)
+    state['checkpointed_at'] = now
+    state['checkpointed_version'] = state.get('data_version')
+    return True
+
+
+def _write_in_background(path: str, snapshot: dict):
+    """バックグラウンドでチェックポイントを書き込む"""
+    try:
+        write_checkpoint(path, snapshot)
+    except OSError as e:
+        print(f"チェックポイントの保存エラー: {e}")
+
+
+def _to_datetimes(timestamps: np.ndarray) -> list:
+    """UNIX時刻の配列をローカル時刻（タイムゾーンなし）のdatetimeのリストにまとめて変換"""
+    if len(timestamps) == 0:
+        return []
+    first, last = float(timestamps.min()), float(timestamps.max())
+    offset = _utc_offset(first)
+    if _utc_offset(last) != offset:
+        # 期間中にUTCとの時差が変わる（夏時間の切り替えなど）場合は1件ずつ変換
+        return [datetime.fromtimestamp(t) for t in timestamps.tolist()]
+    # datetime.fromtimestampと同じく、整数部と小数部に分けてからマイクロ秒に丸める
+    fraction, seconds = np.modf(np.asarray(timestamps, dtype=np.float64))
+    micros = (seconds.astype(np.int64) + int(offset)) * 1_000_000 + np.round(fraction * 1e6).astype(np.int64)
+    return micros.astype('datetime64[us]').astype(object).tolist()
+
+
+def _utc_offset(t: float) -> float:
+    """指定した時刻のローカル時刻とUTCの差（秒）"""
+    return datetime.fromtimestamp(t, timezone.utc).astimezone().utcoffset().total_seconds()
+
+
+def _align(offset: int) -> int:
+    """オフセットをALIGNMENTの倍数に切り上げる"""
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
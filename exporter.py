@@ -0,0 +1,482 @@
+"""
+データエクスポートモジュール
+測定値・DI/WBGT・アラートの遷移をCSV/Parquetに逐次書き出す
+
+使い方:
+    python exporter.py readings_log.csv --kind readings --format csv -o readings.csv
+    python exporter.py readings_log.csv --kind alerts --format parquet -o alerts.parquet \\
+        --start 2026-08-01 --end 2026-08-02
+
+入力は測定値ログ（READINGS_LOGで記録したCSV）。全件をDataFrameとして
+読み込むことはせず、1行ずつ計算してチャンク単位で書き出すため、
+対象期間の長さに関わらずメモリ使用量は一定に保たれる。
+
+測定値ログは全セッションで同じファイルに書き込むため、プロセス内で1つのReadingLogを共有し、
+書き込みは1つのセッションのみが行う（同じ測定値がタブの数だけ記録されないようにする）。
+アラートの遷移は、アプリと同じアラート状態機械（ヒステリシス・最低滞在時間・再通知）で
+測定値を判定し直して取り出す。
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+from alert_state import AlertStateMachine
+from heatstroke import (
+    ALERT_LEVELS, calculate_discomfort_index, calculate_wbgt, calculate_outdoor_wbgt_batch,
+    get_heatstroke_risk, get_wbgt_mode
+)
+
+# 測定値ログの列
+READING_LOG_COLUMNS = ['timestamp', 'sensor_id', 'temperature', 'humidity',
+                       'wind_speed', 'solar_radiation']
+
+# エクスポートの列
+READING_COLUMNS = ['timestamp', 'sensor_id', 'temperature', 'humidity',
+                   'discomfort_index', 'wbgt', 'risk_level']
+ALERT_COLUMNS = ['timestamp', 'sensor_id', 'from_level', 'to_level', 'notified',
+                 'temperature', 'humidity', 'discomfort_index', 'wbgt']
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# 書き込み担当のセッションが書き込まなくなってから引き継ぐまでの既定の時間（秒）
+DEFAULT_TAKEOVER_SECONDS = 10.0
+
+# プロセス内で共有する測定値ログ（パス -> ReadingLog）
+_reading_logs = {}
+_reading_logs_lock = threading.Lock()
+
+
+def append_reading_log(path: str, timestamp: datetime, sensor_id: Optional[str],
+                       temp: float, humidity: float,
+                       wind_speed: Optional[float] = None, solar_radiation: Optional[float] = None):
+    """
+    測定値ログに1件追記する
+
+    Args:
+        path: 測定値ログのパス（存在しない場合はヘッダー付きで作成）
+        timestamp: 測定時刻
+        sensor_id: センサーID
+        temp: 気温（℃）
+        humidity: 湿度（%）
+        wind_speed: 風速（m/s、屋外センサーのみ）
+        solar_radiation: 全天日射量（W/m²、屋外センサーのみ）
+    """
+    _append_rows(path, [{
+        'timestamp': timestamp, 'sensor_id': sensor_id, 'temperature': temp, 'humidity': humidity,
+        'wind_speed': wind_speed, 'solar_radiation': solar_radiation
+    }])
+
+
+def _append_rows(path: str, readings: list):
+    """測定値の辞書のリストを測定値ログに追記（存在しない場合はヘッダー付きで作成）"""
+    is_new = not os.path.exists(path)
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if is_new:
+            writer.writerow(READING_LOG_COLUMNS)
+        for r in readings:
+            writer.writerow([r['timestamp'].isoformat(), _format_value(r.get('sensor_id')),
+                             r['temperature'], r['humidity'],
+                             _format_value(r.get('wind_speed')), _format_value(r.get('solar_radiation'))])
+
+
+class ReadingLog:
+    """
+    測定値ログ（プロセス内でパスごとに1つを共有する）
+
+    どのセッションも同じセンサー・同じ気象観測値を取り込むため、書き込みは
+    1つのセッション（書き込み担当）のみが行う。担当のセッションが一定時間書き込まない場合
+    （タブを閉じた・休止した）は、次に書き込もうとしたセッションが引き継ぐ。
+    センサーごとに記録済みの最新の時刻以前の測定値（引き継ぎ前に記録した観測値など）は記録しない。
+    """
+
+    def __init__(self, path: str, takeover_after: float = DEFAULT_TAKEOVER_SECONDS):
+        """
+        初期化
+
+        Args:
+            path: 測定値ログのパス
+            takeover_after: 書き込み担当を引き継ぐまでの時間（秒）
+        """
+        self.path = path
+        self.takeover_after = takeover_after
+        self._lock = threading.Lock()
+        self._owner = None
+        self._owner_written_at = 0.0
+        self._last_timestamps = {}  # センサーID -> 記録済みの最新の測定時刻
+
+    def session(self) -> 'ReadingLogSession':
+        """
+        セッションごとの書き込み口を作成
+
+        Returns:
+            ReadingLogSession
+        """
+        return ReadingLogSession(self)
+
+    def write(self, owner, readings: list) -> int:
+        """
+        測定値を記録（書き込み担当のセッションのみ）
+
+        Args:
+            owner: 書き込むセッション（ReadingLogSession）
+            readings: 測定値の辞書のリスト
+                （'timestamp', 'sensor_id', 'temperature', 'humidity', 'wind_speed', 'solar_radiation'）
+
+        Returns:
+            記録した件数
+        """
+        with self._lock:
+            now = time.monotonic()
+            if (self._owner is not None and self._owner is not owner
+                    and now - self._owner_written_at < self.takeover_after):
+                return 0
+            self._owner = owner
+            self._owner_written_at = now
+
+            rows = []
+            for r in readings:
+                last = self._last_timestamps.get(r.get('sensor_id'))
+                if last is not None and r['timestamp'] <= last:
+                    continue
+                self._last_timestamps[r.get('sensor_id')] = r['timestamp']
+                rows.append(r)
+            if rows:
+                _append_rows(self.path, rows)
+            return len(rows)
+
+    def release(self, owner):
+        """
+        書き込み担当を解除（休止したセッションから呼び出し、すぐに別のセッションが引き継ぐ）
+
+        Args:
+            owner: 書き込み担当を解除するセッション（ReadingLogSession）
+        """
+        with self._lock:
+            if self._owner is owner:
+                self._owner = None
+
+
+class ReadingLogSession:
+    """セッションごとの測定値ログの書き込み口（書き込み担当の判定に使う）"""
+
+    def __init__(self, log: ReadingLog):
+        self.log = log
+
+    @property
+    def path(self) -> str:
+        """測定値ログのパス"""
+        return self.log.path
+
+    def write(self, readings: list) -> int:
+        """
+        測定値を記録（このセッションが書き込み担当でない場合は記録しない）
+
+        Args:
+            readings: 測定値の辞書のリスト
+
+        Returns:
+            記録した件数
+        """
+        return self.log.write(self, readings)
+
+    def release(self):
+        """書き込み担当を解除"""
+        self.log.release(self)
+
+
+def get_reading_log(path: str, takeover_after: float = DEFAULT_TAKEOVER_SECONDS) -> ReadingLog:
+    """
+    プロセス内で共有する測定値ログを取得
+
+    Args:
+        path: 測定値ログのパス
+        takeover_after: 書き込み担当を引き継ぐまでの時間（秒、最初に作成するときのみ使用）
+
+    Returns:
+        ReadingLog
+    """
+    with _reading_logs_lock:
+        log = _reading_logs.get(path)
+        if log is None:
+            log = ReadingLog(path, takeover_after)
+            _reading_logs[path] = log
+        return log
+
+
+def iter_readings_from_state(sensor_data: dict) -> Iterator[dict]:
+    """
+    セッション状態のバッファから測定値を1件ずつ取り出す
+
+    Args:
+        sensor_data: st.session_state.sensor_data
+
+    Yields:
+        測定値の辞書（READING_COLUMNSの列）
+    """
+    columns = [sensor_data[key] for key in
+               ('timestamp', 'sensor_id', 'temperature', 'humidity', 'discomfort_index', 'wbgt')]
+    for timestamp, sensor_id, temp, humidity, di, wbgt in zip(*columns):
+        yield {
+            'timestamp': timestamp,
+            'sensor_id': sensor_id,
+            'temperature': temp,
+            'humidity': humidity,
+            'discomfort_index': di,
+            'wbgt': wbgt,
+            'risk_level': get_heatstroke_risk(di, wbgt)
+        }
+
+
+def iter_readings_from_log(path: str, start: Optional[datetime] = None,
+                           end: Optional[datetime] = None,
+                           chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    測定値ログをチャンク単位で読み込み、DI/WBGTとリスクレベルを計算する
+
+    屋外センサーのWBGTはチャンクごとにまとめて計算する。
+
+    Args:
+        path: 測定値ログのパス
+        start: この時刻以降の測定値のみ対象（省略時は先頭から）
+        end: この時刻より前の測定値のみ対象（省略時は末尾まで）
+        chunk_size: 1チャンクあたりの行数
+
+    Yields:
+        測定値の辞書（READING_COLUMNSの列）
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = csv.DictReader(f)
+        while True:
+            chunk = []
+            lines = list(islice(rows, chunk_size))
+            for row in lines:
+                timestamp = datetime.fromisoformat(row['timestamp'])
+                if start and timestamp < start:
+                    continue
+                if end and timestamp >= end:
+                    continue
+                chunk.append({
+                    'timestamp': timestamp,
+                    'sensor_id': row.get('sensor_id') or None,
+                    'temperature': float(row['temperature']),
+                    'humidity': float(row['humidity']),
+                    'wind_speed': row.get('wind_speed') or None,
+                    'solar_radiation': row.get('solar_radiation') or None
+                })
+            if not lines:
+                return
+
+            outdoor = [r for r in chunk
+                       if r['wind_speed'] and r['solar_radiation'] and get_wbgt_mode(r['sensor_id']) == 'outdoor']
+            if outdoor:
+                wbgts = calculate_outdoor_wbgt_batch(
+                    [r['temperature'] for r in outdoor], [r['humidity'] for r in outdoor],
+                    [float(r['wind_speed']) for r in outdoor], [float(r['solar_radiation']) for r in outdoor],
+                    [r['timestamp'] for r in outdoor]
+                )
+                for r, wbgt in zip(outdoor, wbgts):
+                    r['wbgt'] = float(wbgt)
+
+            for r in chunk:
+                di = calculate_discomfort_index(r['temperature'], r['humidity'])
+                wbgt = r.get('wbgt')
+                if wbgt is None:
+                    wbgt = calculate_wbgt(r['temperature'], r['humidity'])
+                yield {
+                    'timestamp': r['timestamp'],
+                    'sensor_id': r['sensor_id'],
+                    'temperature': r['temperature'],
+                    'humidity': r['humidity'],
+                    'discomfort_index': di,
+                    'wbgt': wbgt,
+                    'risk_level': get_heatstroke_risk(di, wbgt)
+                }
+            if len(lines) < chunk_size:
+                return
+
+
+def iter_alert_transitions(readings: Iterable[dict],
+                           alert_state: Optional[AlertStateMachine] = None) -> Iterator[dict]:
+    """
+    測定値からセンサーごとのアラートの遷移を取り出す
+
+    アプリと同じアラート状態機械で判定し直すため、閾値付近の往復（ヒステリシス・最低滞在時間で
+    抑制されるもの）や注意以下のレベル間の変化は含まない。警戒レベル以上への遷移・警戒レベル以上での
+    レベルの変化・警戒レベル未満への復帰・再通知を出力する（アプリのアラート履歴と同じ判定）。
+
+    Args:
+        readings: 測定値の辞書のイテラブル（時刻順）
+        alert_state: 判定に使うアラート状態機械（省略時は環境変数の設定で新しく作成し、保存しない）
+
+    Yields:
+        遷移の辞書（ALERT_COLUMNSの列、'notified'は通知対象と判定したかどうか）
+    """
+    if alert_state is None:
+        alert_state = AlertStateMachine(state_file='')
+    for reading in readings:
+        sensor_id = reading['sensor_id']
+        decision = alert_state.evaluate(sensor_id, reading['discomfort_index'], reading['wbgt'],
+                                        reading['timestamp'])
+        if decision is None:
+            continue
+        if decision['level'] not in ALERT_LEVELS and decision['previous_level'] not in ALERT_LEVELS:
+            continue
+        yield {
+            'timestamp': reading['timestamp'],
+            'sensor_id': sensor_id,
+            'from_level': decision['previous_level'],
+            'to_level': decision['level'],
+            'notified': decision['notify'],
+            'temperature': reading['temperature'],
+            'humidity': reading['humidity'],
+            'discomfort_index': reading['discomfort_index'],
+            'wbgt': reading['wbgt']
+        }
+
+
+def _format_value(value) -> str:
+    """CSVに書き出す値を文字列に変換"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def stream_csv(rows: Iterable[dict], columns: list,
+               chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    行をCSV文字列のチャンクとして逐次生成する
+
+    Args:
+        rows: 行の辞書のイテラブル
+        columns: 出力する列
+        chunk_size: 1チャンクあたりの行数
+
+    Yields:
+        CSV文字列（最初のチャンクはヘッダー行を含む）
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        for row in chunk:
+            writer.writerow([_format_value(row[column]) for column in columns])
+        if buffer.tell():
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if len(chunk) < chunk_size:
+            return
+
+
+def write_csv(rows: Iterable[dict], columns: list, path: str,
+              chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    行をCSVファイルに逐次書き出す
+
+    Args:
+        rows: 行の辞書のイテラブル
+        columns: 出力する列
+        path: 出力先のパス（'-'の場合は標準出力）
+        chunk_size: 1チャンクあたりの行数
+
+    Returns:
+        書き出したバイト数
+    """
+    written = 0
+    f = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+    try:
+        for chunk in stream_csv(rows, columns, chunk_size):
+            f.write(chunk)
+            written += len(chunk.encode('utf-8'))
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return written
+
+
+def write_parquet(rows: Iterable[dict], columns: list, path: str,
+                  row_group_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    行をParquetファイルにRow Group単位で逐次書き出す
+
+    Args:
+        rows: 行の辞書のイテラブル
+        columns: 出力する列
+        path: 出力先のパス
+        row_group_size: 1 Row Groupあたりの行数
+
+    Returns:
+        書き出した行数
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet出力にはpyarrowが必要です（pip install pyarrow）")
+
+    types = {
+        'timestamp': pa.timestamp('us'),
+        'temperature': pa.float64(),
+        'humidity': pa.float64(),
+        'discomfort_index': pa.float64(),
+        'wbgt': pa.float64(),
+        'notified': pa.bool_()
+    }
+    schema = pa.schema([(column, types.get(column, pa.string())) for column in columns])
+
+    count = 0
+    rows = iter(rows)
+    with pq.ParquetWriter(path, schema) as writer:
+        while True:
+            chunk = list(islice(rows, row_group_size))
+            if chunk:
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                count += len(chunk)
+            if len(chunk) < row_group_size:
+                break
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="測定値・アラートのエクスポート")
+    parser.add_argument('log', help="測定値ログ（CSV）のパス")
+    parser.add_argument('--kind', choices=['readings', 'alerts'], default='readings',
+                        help="readings: 測定値とDI/WBGT、alerts: アラートの遷移（アプリと同じ判定）")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('-o', '--output', default='-', help="出力先（CSVのみ'-'で標準出力）")
+    parser.add_argument('--start', type=datetime.fromisoformat, help="開始日時（ISO形式）")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="終了日時（ISO形式、この時刻を含まない）")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="1チャンク（Row Group）あたりの行数")
+    args = parser.parse_args()
+
+    rows = iter_readings_from_log(args.log, args.start, args.end, args.chunk_size)
+    columns = READING_COLUMNS
+    if args.kind == 'alerts':
+        rows = iter_alert_transitions(rows)
+        columns = ALERT_COLUMNS
+
+    if args.format == 'parquet':
+        if args.output == '-':
+            parser.error("Parquet出力には--outputの指定が必要です")
+        count = write_parquet(rows, columns, args.output, args.chunk_size)
+        print(f"{count}行を書き出しました: {args.output}", file=sys.stderr)
+    else:
+        write_csv(rows, columns, args.output, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+熱中症指標モジュール
+気温・湿度から不快指数・WBGTを計算し、熱中症リスクレベルを判定する
+"""
+import math
+import os
+from datetime import datetime, timezone
+from typing import Optional
+import numpy as np
+from dotenv import dotenv_values
+from wbgt_outdoor import cos_solar_zenith, outdoor_wbgt
+
+# 閾値設定（熱中症対策用）
+HEATSTROKE_LEVELS = {
+    'safe': {'di': 70, 'wbgt': 21, 'color': '#27ae60', 'label': '安全', 'advice': '通常の活動が可能です'},
+    'caution': {'di': 75, 'wbgt': 25, 'color': '#f39c12', 'label': '注意', 'advice': 'こまめな水分補給を心がけましょう'},
+    'warning': {'di': 80, 'wbgt': 28, 'color': '#e67e22', 'label': '警戒', 'advice': '積極的な休憩と水分・塩分補給が必要です'},
+    'severe_warning': {'di': 85, 'wbgt': 31, 'color': '#e74c3c', 'label': '厳重警戒', 'advice': '激しい運動は避け、頻繁に休憩をとってください'},
+    'danger': {'di': 90, 'wbgt': 35, 'color': '#c0392b', 'label': '危険', 'advice': '外出・運動を控え、涼しい場所で過ごしてください'}
+}
+
+# 通知対象のリスクレベル（深刻度の低い順）
+ALERT_LEVELS = ['warning', 'severe_warning', 'danger']
+
+# 閾値を持つリスクレベル（深刻度の低い順）
+THRESHOLD_LEVELS = ['caution', 'warning', 'severe_warning', 'danger']
+
+# 閾値を変更する環境変数（不快指数, WBGT）
+THRESHOLD_SETTINGS = {
+    'caution': ('CAUTION_THRESHOLD', 'WBGT_CAUTION_THRESHOLD'),
+    'warning': ('WARNING_THRESHOLD', 'WBGT_WARNING_THRESHOLD'),
+    'severe_warning': ('SEVERE_WARNING_THRESHOLD', 'WBGT_SEVERE_WARNING_THRESHOLD'),
+    'danger': ('DANGER_THRESHOLD', 'WBGT_DANGER_THRESHOLD')
+}
+
+# 既定の閾値（不快指数, WBGT）
+DEFAULT_THRESHOLDS = {level: (HEATSTROKE_LEVELS[level]['di'], HEATSTROKE_LEVELS[level]['wbgt'])
+                      for level in THRESHOLD_LEVELS}
+
+# 閾値の読み込み元ファイルの更新時刻
+_threshold_file_mtime = None
+
+# 前回読み込んだ.envファイルの閾値（load_dotenvで環境変数に入った値と区別するために使用）
+_threshold_file_values = {}
+
+# 屋外WBGTの太陽位置計算に使う地点（既定: 東京）
+DEFAULT_SITE_LATITUDE = 35.68
+DEFAULT_SITE_LONGITUDE = 139.77
+
+
+def calculate_discomfort_index(temp, humidity):
+    """不快指数を計算"""
+    di = 0.81 * temp + 0.01 * humidity * (0.99 * temp - 14.3) + 46.3
+    return round(di, 1)
+
+def calculate_wbgt(temp, humidity):
+    """簡易WBGT（暑さ指数）を計算"""
+    # 室内での簡易計算式
+    wbgt = 0.567 * temp + 0.393 * (humidity / 100 * 6.105 * math.exp(17.27 * temp / (237.7 + temp))) + 3.94
+    return round(wbgt, 1)
+
+def calculate_outdoor_wbgt(temp, humidity, wind_speed, solar_radiation, timestamp=None):
+    """
+    屋外WBGT（暑さ指数）を計算
+
+    日射と風を考慮してLiljegrenの方法で黒球温度・自然湿球温度を求める。
+
+    Args:
+        temp: 気温（℃）
+        humidity: 湿度（%）
+        wind_speed: 風速（m/s）
+        solar_radiation: 全天日射量（W/m²）
+        timestamp: 測定時刻（太陽高度の計算に使用、省略時は現在時刻）
+
+    Returns:
+        WBGT（℃）
+    """
+    wbgt = calculate_outdoor_wbgt_batch([temp], [humidity], [wind_speed], [solar_radiation],
+                                        [timestamp or datetime.now()])
+    return float(wbgt[0])
+
+def calculate_outdoor_wbgt_batch(temps, humidities, wind_speeds, solar_radiations, timestamps):
+    """
+    複数の測定値の屋外WBGTをまとめて計算
+
+    Args:
+        temps: 気温（℃）の配列
+        humidities: 湿度（%）の配列
+        wind_speeds: 風速（m/s）の配列
+        solar_radiations: 全天日射量（W/m²）の配列
+        timestamps: 測定時刻（datetime、タイムゾーンなしはローカル時刻）の配列
+
+    Returns:
+        WBGT（℃、小数第1位に丸め）のNumPy配列
+    """
+    utc = [t.astimezone(timezone.utc).replace(tzinfo=None) for t in timestamps]
+    latitude, longitude = get_site_location()
+    cza = cos_solar_zenith(utc, latitude, longitude)
+    wbgt = outdoor_wbgt(temps, humidities, wind_speeds, solar_radiations, cza)
+    return np.round(wbgt, 1)
+
+def get_site_location():
+    """監視地点の緯度・経度を取得（環境変数SITE_LATITUDE・SITE_LONGITUDE）"""
+    return (float(os.getenv('SITE_LATITUDE', DEFAULT_SITE_LATITUDE)),
+            float(os.getenv('SITE_LONGITUDE', DEFAULT_SITE_LONGITUDE)))
+
+def get_wbgt_mode(sensor_id: Optional[str]) -> str:
+    """
+    センサーのWBGT計算方式を取得
+
+    環境変数OUTDOOR_SENSORSにカンマ区切りで指定したセンサーID（またはゾーン）に
+    含まれるセンサーは屋外、それ以外は屋内として扱う。
+
+    Args:
+        sensor_id: センサーID
+
+    Returns:
+        'indoor' または 'outdoor'
+    """
+    if sensor_id is None:
+        return 'indoor'
+    for outdoor in os.getenv('OUTDOOR_SENSORS', '').split(','):
+        outdoor = outdoor.strip().rstrip('/')
+        if outdoor and (sensor_id == outdoor or sensor_id.startswith(outdoor + '/')):
+            return 'outdoor'
+    return 'indoor'
+
+def calculate_sensor_wbgt(sensor_id, temp, humidity, wind_speed=None, solar_radiation=None, timestamp=None):
+    """
+    センサーの計算方式に応じたWBGTを計算
+
+    屋外センサーでも風速・日射量がない場合は屋内の簡易式で計算する。
+
+    Args:
+        sensor_id: センサーID
+        temp: 気温（℃）
+        humidity: 湿度（%）
+        wind_speed: 風速（m/s）
+        solar_radiation: 全天日射量（W/m²）
+        timestamp: 測定時刻
+
+    Returns:
+        WBGT（℃）
+    """
+    if get_wbgt_mode(sensor_id) == 'outdoor' and wind_speed is not None and solar_radiation is not None:
+        return calculate_outdoor_wbgt(temp, humidity, wind_speed, solar_radiation, timestamp)
+    return calculate_wbgt(temp, humidity)
+
+def get_thresholds() -> dict:
+    """
+    現在の閾値を取得
+
+    Returns:
+        リスクレベル -> (不快指数, WBGT) の辞書
+    """
+    return {level: (HEATSTROKE_LEVELS[level]['di'], HEATSTROKE_LEVELS[level]['wbgt'])
+            for level in THRESHOLD_LEVELS}
+
+def apply_thresholds(thresholds: dict):
+    """
+    閾値を変更
+
+    Args:
+        thresholds: リスクレベル -> (不快指数, WBGT) の辞書
+
+    Raises:
+        ValueError: 閾値がリスクレベルの順に増加していない場合
+    """
+    for index in (0, 1):
+        values = [thresholds[level][index] for level in THRESHOLD_LEVELS]
+        if any(a >= b for a, b in zip(values, values[1:])):
+            raise ValueError(f"閾値はリスクレベルの順に大きくしてください: {values}")
+    for level in THRESHOLD_LEVELS:
+        HEATSTROKE_LEVELS[level]['di'], HEATSTROKE_LEVELS[level]['wbgt'] = thresholds[level]
+
+def load_thresholds(env_file: str = '.env') -> bool:
+    """
+    .envファイルと環境変数から閾値を読み込んで反映
+
+    環境変数の値を優先し、ない場合は.envファイル、それもなければ既定値を使う。
+    ただし、load_dotenvで.envファイルから環境変数に入った値（前回読み込んだ.envの値と同じもの）は
+    .envファイルの最新の値で置き換えるため、.envを書き換えると再起動せずに反映される。
+
+    Args:
+        env_file: .envファイルのパス
+
+    Returns:
+        閾値が変更された場合はTrue
+    """
+    global _threshold_file_values
+    file_values = dotenv_values(env_file) if os.path.exists(env_file) else {}
+
+    def value(name, default):
+        raw = os.getenv(name)
+        if not raw or raw == _threshold_file_values.get(name):
+            raw = file_values.get(name) or raw
+        return float(raw) if raw else default
+
+    thresholds = {
+        level: (value(di_name, DEFAULT_THRESHOLDS[level][0]), value(wbgt_name, DEFAULT_THRESHOLDS[level][1]))
+        for level, (di_name, wbgt_name) in THRESHOLD_SETTINGS.items()
+    }
+    changed = thresholds != get_thresholds()
+    if changed:
+        apply_thresholds(thresholds)
+    _threshold_file_values = file_values
+    return changed
+
+def reload_thresholds(env_file: str = '.env') -> bool:
+    """
+    .envファイルが更新されていれば閾値を読み込み直す（再起動は不要）
+
+    設定に誤りがある場合はエラーを表示して現在の閾値を維持する。
+
+    Args:
+        env_file: .envファイルのパス
+
+    Returns:
+        閾値が変更された場合はTrue
+    """
+    global _threshold_file_mtime
+    mtime = os.path.getmtime(env_file) if os.path.exists(env_file) else None
+    if _threshold_file_mtime is not None and mtime == _threshold_file_mtime:
+        return False
+    _threshold_file_mtime = mtime
+    try:
+        return load_thresholds(env_file)
+    except ValueError as e:
+        print(f"閾値の設定エラー: {e}")
+        return False
+
+def get_heatstroke_risk(di, wbgt):
+    """熱中症リスクレベルを判定"""
+    if di >= HEATSTROKE_LEVELS['danger']['di'] or wbgt >= HEATSTROKE_LEVELS['danger']['wbgt']:
+        return 'danger'
+    elif di >= HEATSTROKE_LEVELS['severe_warning']['di'] or wbgt >= HEATSTROKE_LEVELS['severe_warning']['wbgt']:
+        return 'severe_warning'
+    elif di >= HEATSTROKE_LEVELS['warning']['di'] or wbgt >= HEATSTROKE_LEVELS['warning']['wbgt']:
+        return 'warning'
+    elif di >= HEATSTROKE_LEVELS['caution']['di'] or wbgt >= HEATSTROKE_LEVELS['caution']['wbgt']:
+        return 'caution'
+    else:
+        return 'safe'
+
+def get_hydration_recommendation(temp, humidity, activity_level='normal'):
+    """推奨水分補給量を計算（ml/時間）"""
+    base_amount = 200
+    
+    if temp > 30:
+        base_amount += (temp - 30) * 20
+    if humidity > 70:
+        base_amount += (humidity - 70) * 5
+    
+    if activity_level == 'light':
+        base_amount *= 1.2
+    elif activity_level == 'moderate':
+        base_amount *= 1.5
+    elif activity_level == 'heavy':
+        base_amount *= 2.0
+    
+    return int(base_amount)
@@ -3,23 +3,38 @@ LINE通知モジュール
 不快指数に応じた警告メッセージをLINEで送信する
 """
 import os
+import threading
 from typing import Optional
 from datetime import datetime
 from linebot import LineBotApi
-from linebot.models import TextSendMessage, FlexSendMessage
+from linebot.models import TextSendMessage, FlexSendMessage, CarouselContainer
 from linebot.exceptions import LineBotApiError
+from heatstroke import ALERT_LEVELS
+
+# カルーセルに含められるバブルの上限（LINE Messaging APIの仕様）
+MAX_CAROUSEL_BUBBLES = 12
+
+# まとめ送信に失敗したアラートを送信する最大回数（失敗した分は次の待ち時間の後に再送）
+MAX_DIGEST_ATTEMPTS = 3
 
 
 class LineNotifier:
     """LINE通知クラス"""
 
-    def __init__(self, channel_access_token: Optional[str] = None, user_id: Optional[str] = None):
+    def __init__(self, channel_access_token: Optional[str] = None, user_id: Optional[str] = None,
+                 coalesce_window: Optional[float] = None, endpoint: Optional[str] = None,
+                 timeout: Optional[float] = None):
         """
         初期化
 
         Args:
             channel_access_token: LINEチャネルアクセストークン（省略時は環境変数から取得）
             user_id: 送信先のLINEユーザーID（省略時は環境変数から取得）
+            coalesce_window: アラートをまとめて送信する待ち時間（秒）。
+                0の場合は1件ずつ即時送信（省略時は環境変数LINE_COALESCE_SECONDSから取得）
+            endpoint: Messaging APIのエンドポイント。ローカルの模擬サーバーなどを
+                指す場合に指定（省略時は環境変数LINE_API_ENDPOINT、未設定なら本番API）
+            timeout: APIリクエストのタイムアウト（秒、省略時はSDKの既定値）
         """
         self.channel_access_token = channel_access_token or os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
         self.user_id = user_id or os.getenv('LINE_USER_ID')
@@ -29,15 +44,41 @@ class LineNotifier:
         if not self.user_id:
             raise ValueError("LINE_USER_IDが設定されていません")
 
-        self.line_bot_api = LineBotApi(self.channel_access_token)
-        self.last_sent_level = None  # 連続送信防止用
+        if coalesce_window is None:
+            coalesce_window = float(os.getenv('LINE_COALESCE_SECONDS', '0'))
+        self.coalesce_window = max(0.0, coalesce_window)
+
+        api_options = {}
+        endpoint = endpoint or os.getenv('LINE_API_ENDPOINT')
+        if endpoint:
+            api_options['endpoint'] = endpoint
+        if timeout is not None:
+            api_options['timeout'] = timeout
+        self.line_bot_api = LineBotApi(self.channel_access_token, **api_options)
+        self.timeout = self.line_bot_api.http_client.timeout  # APIリクエストのタイムアウト（秒）
+        self.last_sent_levels = {}  # 連続送信防止用（センサーID -> 最後に送信したレベル）
+
+        # まとめ送信用のバッファ
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # まとめ送信を1件ずつ行う（タイマーと明示的なflushの競合防止）
+        self._pending = []
+        self._flush_timer = None
+
+    @property
+    def last_sent_level(self) -> Optional[str]:
+        """センサーIDを指定しない通知で最後に送信したレベル"""
+        return self.last_sent_levels.get(None)
 
     def send_discomfort_alert(self, temperature: float, humidity: float,
                              discomfort_index: float, wbgt: float,
-                             risk_level: str, risk_info: dict) -> bool:
+                             risk_level: str, risk_info: dict,
+                             sensor_id: Optional[str] = None, dedupe: bool = True) -> bool:
         """
         不快指数に応じた警告メッセージを送信
 
+        まとめ送信が有効な場合はバッファに追加し、待ち時間の経過後に
+        他のセンサーのアラートと一緒にカルーセルで送信する。
+
         Args:
             temperature: 気温（℃）
             humidity: 湿度（%）
@@ -45,23 +86,42 @@ class LineNotifier:
             wbgt: WBGT（暑さ指数）
             risk_level: リスクレベル（'caution', 'warning', 'severe_warning', 'danger'）
             risk_info: リスク情報の辞書
+            sensor_id: センサーID（省略可）
+            dedupe: Falseの場合は同じレベルの連続送信も許可する
+                （呼び出し側で通知の要否を判定している場合に使用）
 
         Returns:
-            送信成功時はTrue、失敗時はFalse
+            送信成功時（まとめ送信時はバッファへの追加時）はTrue、失敗時はFalse
         """
         # 警告レベル以下は送信しない
-        if risk_level not in ['warning', 'severe_warning', 'danger']:
+        if risk_level not in ALERT_LEVELS:
             return False
 
-        # 同じレベルの連続送信を防止
-        if self.last_sent_level == risk_level:
-            return False
+        # 同じレベルの連続送信を防止（まとめ送信のタイマーのスレッドと共有するためロック内で判定）
+        with self._lock:
+            if dedupe and self.last_sent_levels.get(sensor_id) == risk_level:
+                return False
+            if self.coalesce_window > 0:
+                self.last_sent_levels[sensor_id] = risk_level
+
+        if self.coalesce_window > 0:
+            self._enqueue_alert({
+                'temperature': temperature,
+                'humidity': humidity,
+                'discomfort_index': discomfort_index,
+                'wbgt': wbgt,
+                'risk_level': risk_level,
+                'risk_info': risk_info,
+                'sensor_id': sensor_id,
+                'timestamp': datetime.now()
+            })
+            return True
 
         try:
             # Flexメッセージを作成
             flex_message = self._create_flex_message(
                 temperature, humidity, discomfort_index, wbgt,
-                risk_level, risk_info
+                risk_level, risk_info, sensor_id=sensor_id
             )
 
             # メッセージを送信
@@ -70,7 +130,8 @@ class LineNotifier:
                 flex_message
             )
 
-            self.last_sent_level = risk_level
+            with self._lock:
+                self.last_sent_levels[sensor_id] = risk_level
             return True
 
         except LineBotApiError as e:
@@ -80,9 +141,210 @@ class LineNotifier:
             print(f"予期しないエラー: {e}")
             return False
 
+    def _enqueue_alert(self, alert: dict):
+        """
+        アラートをまとめ送信用のバッファに追加
+
+        最初のアラートが追加された時点でタイマーを開始し、待ち時間の経過後に
+        必ず送信する（後続のアラートでタイマーは延長しない）。
+
+        Args:
+            alert: アラート情報の辞書
+        """
+        with self._lock:
+            self._pending.append(alert)
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.coalesce_window, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self) -> bool:
+        """
+        バッファ内のアラートをまとめて送信
+
+        タイマーによる送信中に呼び出した場合は、その送信の完了を待ってから戻る。
+
+        Returns:
+            送信成功時（送信対象がない場合を含む）はTrue、失敗時はFalse
+        """
+        with self._flush_lock:
+            return self._flush_pending()
+
+    def _flush_pending(self) -> bool:
+        """
+        バッファ内のアラートを取り出して送信（_flush_lockを保持して呼び出す）
+
+        同じセンサーのアラートは最も深刻なレベル（同じレベルなら新しいもの）のみを送信する。
+        送信に失敗したアラートはバッファに戻し、次の待ち時間の後に再送する
+        （MAX_DIGEST_ATTEMPTS回失敗したアラートは破棄する）。
+        """
+        with self._lock:
+            alerts = self._pending
+            self._pending = []
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+        if not alerts:
+            return True
+
+        alerts = self._merge_by_sensor(alerts)
+        try:
+            self.line_bot_api.push_message(
+                self.user_id,
+                self._create_digest_message(alerts)
+            )
+            return True
+
+        except LineBotApiError as e:
+            print(f"LINE送信エラー: {e}")
+        except Exception as e:
+            print(f"予期しないエラー: {e}")
+
+        retry, dropped = [], []
+        for alert in alerts:
+            alert['attempts'] = alert.get('attempts', 0) + 1
+            (retry if alert['attempts'] < MAX_DIGEST_ATTEMPTS else dropped).append(alert)
+
+        with self._lock:
+            if retry:
+                # 送信待ちの先頭に戻し、次の待ち時間の後に再送
+                self._pending = retry + self._pending
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(self.coalesce_window, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+            # 破棄したアラートは次回の通知を妨げないようにする
+            for alert in dropped:
+                if self.last_sent_levels.get(alert['sensor_id']) == alert['risk_level']:
+                    del self.last_sent_levels[alert['sensor_id']]
+        if dropped:
+            print(f"LINE送信エラー: {len(dropped)}件のアラートを{MAX_DIGEST_ATTEMPTS}回送信できなかったため破棄しました")
+        return False
+
+    @staticmethod
+    def _merge_by_sensor(alerts: list) -> list:
+        """
+        同じセンサーのアラートを最も深刻なレベルのもの1件にまとめる
+
+        Args:
+            alerts: アラート情報の辞書のリスト（古い順）
+
+        Returns:
+            センサーごとに1件のアラートのリスト
+        """
+        merged = {}
+        for alert in alerts:
+            current = merged.get(alert['sensor_id'])
+            if current is None or (ALERT_LEVELS.index(alert['risk_level'])
+                                   >= ALERT_LEVELS.index(current['risk_level'])):
+                merged[alert['sensor_id']] = alert
+        return list(merged.values())
+
+    def _create_digest_message(self, alerts: list) -> FlexSendMessage:
+        """
+        複数のアラートをまとめたメッセージを作成
+
+        1件のみの場合は通常のFlexメッセージ、複数の場合は深刻度の高い順に
+        並べたカルーセルを作成する。上限を超えた分はサマリーバブルにまとめる。
+
+        Args:
+            alerts: アラート情報の辞書のリスト
+
+        Returns:
+            FlexSendMessage
+        """
+        alerts = sorted(
+            alerts,
+            key=lambda a: (ALERT_LEVELS.index(a['risk_level']), a['wbgt'], a['discomfort_index']),
+            reverse=True
+        )
+        messages = [
+            self._create_flex_message(
+                a['temperature'], a['humidity'], a['discomfort_index'], a['wbgt'],
+                a['risk_level'], a['risk_info'],
+                sensor_id=a['sensor_id'], timestamp=a['timestamp']
+            )
+            for a in alerts[:MAX_CAROUSEL_BUBBLES]
+        ]
+        if len(messages) == 1:
+            return messages[0]
+
+        bubbles = [message.contents for message in messages]
+        if len(alerts) > MAX_CAROUSEL_BUBBLES:
+            bubbles = bubbles[:MAX_CAROUSEL_BUBBLES - 1]
+            bubbles.append(self._create_summary_bubble(alerts[MAX_CAROUSEL_BUBBLES - 1:]))
+
+        top = alerts[0]
+        return FlexSendMessage(
+            alt_text=f"🚨 熱中症警告: {len(alerts)}件（最大: {top['risk_info']['label']}）",
+            contents=CarouselContainer(contents=bubbles)
+        )
+
+    def _create_summary_bubble(self, alerts: list) -> dict:
+        """
+        カルーセルに収まらないアラートのサマリーバブルを作成
+
+        Args:
+            alerts: サマリー対象のアラート情報の辞書のリスト（深刻度の高い順）
+
+        Returns:
+            バブルのコンテンツ
+        """
+        lines = []
+        for level in reversed(ALERT_LEVELS):
+            level_alerts = [a for a in alerts if a['risk_level'] == level]
+            if not level_alerts:
+                continue
+            sensors = '、'.join(str(a['sensor_id']) for a in level_alerts[:5])
+            if len(level_alerts) > 5:
+                sensors += f" 他{len(level_alerts) - 5}件"
+            lines.append({
+                "type": "text",
+                "text": f"{level_alerts[0]['risk_info']['label']}: {len(level_alerts)}件",
+                "weight": "bold",
+                "size": "md",
+                "color": level_alerts[0]['risk_info']['color'],
+                "margin": "lg"
+            })
+            lines.append({
+                "type": "text",
+                "text": sensors,
+                "size": "sm",
+                "wrap": True,
+                "color": "#666666",
+                "margin": "sm"
+            })
+
+        return {
+            "type": "bubble",
+            "size": "mega",
+            "header": {
+                "type": "box",
+                "layout": "vertical",
+                "contents": [
+                    {
+                        "type": "text",
+                        "text": f"📋 その他のアラート {len(alerts)}件",
+                        "weight": "bold",
+                        "size": "xl",
+                        "color": "#ffffff"
+                    }
+                ],
+                "backgroundColor": alerts[0]['risk_info']['color']
+            },
+            "body": {
+                "type": "box",
+                "layout": "vertical",
+                "contents": lines
+            }
+        }
+
     def _create_flex_message(self, temperature: float, humidity: float,
                             discomfort_index: float, wbgt: float,
-                            risk_level: str, risk_info: dict) -> FlexSendMessage:
+                            risk_level: str, risk_info: dict,
+                            sensor_id: Optional[str] = None,
+                            timestamp: Optional[datetime] = None) -> FlexSendMessage:
         """
         Flexメッセージを作成
 
@@ -93,6 +355,8 @@ class LineNotifier:
             wbgt: WBGT
             risk_level: リスクレベル
             risk_info: リスク情報
+            sensor_id: センサーID（省略時は表示しない）
+            timestamp: 測定時刻（省略時は現在時刻）
 
         Returns:
             FlexSendMessage
@@ -105,8 +369,8 @@ class LineNotifier:
         }
         icon = icon_map.get(risk_level, '⚠️')
 
-        # 現在時刻
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 測定時刻
+        now = (timestamp or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
 
         # Flexメッセージのコンテンツ
         flex_content = {
@@ -139,6 +403,15 @@ class LineNotifier:
                         "align": "center",
                         "margin": "md"
                     },
+                    *([{
+                        "type": "text",
+                        "text": f"📍 {sensor_id}",
+                        "size": "sm",
+                        "color": "#666666",
+                        "align": "center",
+                        "wrap": True,
+                        "margin": "sm"
+                    }] if sensor_id is not None else []),
                     {
                         "type": "separator",
                         "margin": "lg"
@@ -359,4 +632,5 @@ class LineNotifier:
 
     def reset_last_sent_level(self):
         """最後に送信したレベルをリセット（テスト用）"""
-        self.last_sent_level = None
+        with self._lock:
+            self.last_sent_levels = {}
@@ -0,0 +1,179 @@
+"""
+LINE Messaging API模擬サーバー
+本物のLINEサービスに接続せずに通知の負荷・障害時の挙動を確認するためのローカルサーバー
+
+使い方:
+    python mock_line_server.py --port 8080 --latency 0.05 --rate-limit 20
+
+LineNotifierの接続先は環境変数LINE_API_ENDPOINT（例: http://127.0.0.1:8080）で切り替える。
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from mock_server import MockServer
+
+
+class MockLineServer(MockServer):
+    """LINE Messaging APIのプッシュメッセージを受け付ける模擬サーバー"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 rate_limit: Optional[float] = None,
+                 error_burst_every: int = 0, error_burst_length: int = 0,
+                 timeout_rate: float = 0.0, hang_seconds: float = 10.0,
+                 seed: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            host: 待ち受けアドレス
+            port: 待ち受けポート（0の場合は空いているポートを自動選択）
+            latency: 応答までの基本遅延（秒）
+            jitter: 遅延に加えるランダムな揺らぎの最大値（秒）
+            rate_limit: 1秒あたりの許容リクエスト数。超過分は429を返す（Noneで無制限）
+            error_burst_every: このリクエスト数ごとに5xxエラーのバーストを発生させる（0で無効）
+            error_burst_length: 1回のバーストで5xxを返すリクエスト数
+            timeout_rate: メッセージを受理した後、応答を返さずに待機する確率
+            hang_seconds: timeout_rateで待機する時間（秒）
+            seed: 乱数シード
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_burst_every = error_burst_every
+        self.error_burst_length = error_burst_length
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+
+        self.requests = []  # 受信記録: {'received_at', 'status', 'hung', 'body'}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._request_count = 0
+        self._tokens = rate_limit or 0.0
+        self._token_time = time.perf_counter()
+
+        super().__init__(ThreadingHTTPServer((host, port), self._make_handler()))
+
+    def delivered_messages(self) -> list:
+        """
+        LINEに受理された（ユーザーに届いたとみなす）メッセージを取得
+
+        Returns:
+            (受信時刻, メッセージの辞書) のリスト
+        """
+        with self._lock:
+            records = [r for r in self.requests if r['status'] == 200]
+        return [
+            (record['received_at'], message)
+            for record in records
+            for message in record['body'].get('messages', [])
+        ]
+
+    def _decide_status(self) -> int:
+        """受信したリクエストに返すステータスコードを決定"""
+        with self._lock:
+            self._request_count += 1
+            count = self._request_count
+
+            if self.rate_limit:
+                now = time.perf_counter()
+                self._tokens = min(self.rate_limit,
+                                   self._tokens + (now - self._token_time) * self.rate_limit)
+                self._token_time = now
+                if self._tokens < 1:
+                    return 429
+                self._tokens -= 1
+
+        if self.error_burst_every and self.error_burst_length:
+            if (count - 1) % self.error_burst_every >= self.error_burst_every - self.error_burst_length:
+                return 500
+        return 200
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    self._respond(400, {'message': 'The request body has 1 error(s)'})
+                    return
+
+                delay = server.latency + server._random.uniform(0, server.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+
+                status = server._decide_status()
+                hung = status == 200 and server._random.random() < server.timeout_rate
+                with server._lock:
+                    server.requests.append({
+                        'received_at': time.perf_counter(),
+                        'status': status,
+                        'hung': hung,
+                        'body': body
+                    })
+
+                if hung:
+                    # 受理済みだがクライアントはタイムアウトする
+                    time.sleep(server.hang_seconds)
+
+                if status == 429:
+                    self._respond(429, {'message': 'The API rate limit has been exceeded. Try again later.'})
+                elif status == 500:
+                    self._respond(500, {'message': 'Internal server error'})
+                else:
+                    self._respond(200, {})
+
+            def _respond(self, status: int, payload: dict):
+                data = json.dumps(payload).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.send_header('x-line-request-id', f"mock-{time.perf_counter_ns()}")
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LINE Messaging API模擬サーバー")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help="応答遅延（秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="遅延の揺らぎ（秒）")
+    parser.add_argument('--rate-limit', type=float, default=None, help="1秒あたりの許容リクエスト数")
+    parser.add_argument('--error-burst-every', type=int, default=0, help="5xxバーストの間隔（リクエスト数）")
+    parser.add_argument('--error-burst-length', type=int, default=0, help="5xxバーストの長さ（リクエスト数）")
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help="応答を返さない確率")
+    parser.add_argument('--hang-seconds', type=float, default=10.0, help="応答を返さない時間（秒）")
+    args = parser.parse_args()
+
+    server = MockLineServer(
+        host=args.host, port=args.port,
+        latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+        error_burst_every=args.error_burst_every, error_burst_length=args.error_burst_length,
+        timeout_rate=args.timeout_rate, hang_seconds=args.hang_seconds
+    )
+    print(f"LINE模擬サーバー起動: {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
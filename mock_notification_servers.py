@@ -0,0 +1,233 @@
+"""
+通知チャネルの模擬サーバー
+外部のサービスに接続せずに、Webhook・メール（SMTP）・syslogの通知を受信して確認するためのローカルサーバー
+
+使い方:
+    python mock_notification_servers.py --webhook-port 8081 --smtp-port 8025 --syslog-port 8514 --webhook-latency 2
+
+起動後に表示される設定を.envに追加すると、アラートが各サーバーに送信される。
+"""
+import argparse
+import json
+import socketserver
+import threading
+import time
+from email import message_from_bytes, policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mock_server import MockServer
+
+
+class _RecordingServer(MockServer):
+    """受信内容を記録する模擬サーバー"""
+
+    def __init__(self, server):
+        self.received = []  # 受信記録: (受信時刻, 内容)
+        self._lock = threading.Lock()
+        super().__init__(server)
+
+    def record(self, item):
+        """受信内容を記録"""
+        with self._lock:
+            self.received.append((time.perf_counter(), item))
+
+    def messages(self) -> list:
+        """
+        受信内容を取得
+
+        Returns:
+            受信内容のリスト
+        """
+        with self._lock:
+            return [item for _, item in self.received]
+
+
+class MockWebhookServer(_RecordingServer):
+    """Webhookを受信する模擬サーバー（JSONのPOSTを記録）"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, status: int = 200):
+        """
+        初期化
+
+        Args:
+            host: 待ち受けアドレス
+            port: 待ち受けポート（0の場合は空いているポートを自動選択）
+            latency: 応答までの遅延（秒、遅いチャネルの再現に使用）
+            status: 返すステータスコード
+        """
+        self.latency = latency
+        self.status = status
+        super().__init__(ThreadingHTTPServer((host, port), self._make_handler()))
+
+    @property
+    def url(self) -> str:
+        """WebhookNotifierに渡すURL"""
+        host, port = self.address
+        return f"http://{host}:{port}/alerts"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                if server.latency > 0:
+                    time.sleep(server.latency)
+                try:
+                    server.record(json.loads(body))
+                except ValueError:
+                    server.record(body)
+                try:
+                    self.send_response(server.status)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class MockSmtpServer(_RecordingServer):
+    """メールを受信する模擬SMTPサーバー（HELO/EHLO・MAIL・RCPT・DATA・QUITのみ対応）"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        """
+        初期化
+
+        Args:
+            host: 待ち受けアドレス
+            port: 待ち受けポート（0の場合は空いているポートを自動選択）
+            latency: DATAの応答までの遅延（秒）
+        """
+        self.latency = latency
+        super().__init__(socketserver.ThreadingTCPServer((host, port), self._make_handler()))
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                self._reply('220 mock-smtp ready')
+                sender, recipients = None, []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode('utf-8', 'replace').strip()
+                    verb = command[:4].upper()
+                    if verb in ('HELO', 'EHLO'):
+                        self._reply('250 mock-smtp')
+                    elif verb == 'MAIL':
+                        sender, recipients = command.split(':', 1)[1].strip(), []
+                        self._reply('250 OK')
+                    elif verb == 'RCPT':
+                        recipients.append(command.split(':', 1)[1].strip())
+                        self._reply('250 OK')
+                    elif verb == 'DATA':
+                        self._reply('354 End data with <CR><LF>.<CR><LF>')
+                        data = self._read_data()
+                        if server.latency > 0:
+                            time.sleep(server.latency)
+                        message = message_from_bytes(data, policy=policy.default)
+                        server.record({
+                            'from': sender,
+                            'to': recipients,
+                            'subject': str(message['Subject']),
+                            'body': message.get_content()
+                        })
+                        self._reply('250 OK')
+                    elif verb == 'RSET':
+                        sender, recipients = None, []
+                        self._reply('250 OK')
+                    elif verb == 'NOOP':
+                        self._reply('250 OK')
+                    elif verb == 'QUIT':
+                        self._reply('221 Bye')
+                        return
+                    else:
+                        self._reply('502 Command not implemented')
+
+            def _read_data(self) -> bytes:
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line.rstrip(b'\r\n') == b'.':
+                        break
+                    # ドットで始まる行のエスケープを戻す
+                    lines.append(line[1:] if line.startswith(b'..') else line)
+                return b''.join(lines)
+
+            def _reply(self, text: str):
+                self.wfile.write(f"{text}\r\n".encode('utf-8'))
+
+        return Handler
+
+
+class MockSyslogServer(_RecordingServer):
+    """syslogを受信する模擬サーバー（UDP）"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        """
+        初期化
+
+        Args:
+            host: 待ち受けアドレス
+            port: 待ち受けポート（0の場合は空いているポートを自動選択）
+        """
+        super().__init__(socketserver.ThreadingUDPServer((host, port), self._make_handler()))
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server.record(self.request[0].decode('utf-8', 'replace'))
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="通知チャネルの模擬サーバー")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--webhook-port', type=int, default=8081)
+    parser.add_argument('--smtp-port', type=int, default=8025)
+    parser.add_argument('--syslog-port', type=int, default=8514)
+    parser.add_argument('--webhook-latency', type=float, default=0.0, help="Webhookの応答遅延（秒）")
+    parser.add_argument('--smtp-latency', type=float, default=0.0, help="SMTPの応答遅延（秒）")
+    args = parser.parse_args()
+
+    webhook = MockWebhookServer(args.host, args.webhook_port, latency=args.webhook_latency)
+    smtp = MockSmtpServer(args.host, args.smtp_port, latency=args.smtp_latency)
+    syslog = MockSyslogServer(args.host, args.syslog_port)
+    for server in (webhook, smtp, syslog):
+        server.start()
+
+    print("通知チャネル模擬サーバー起動（.envに以下を追加）:")
+    print(f"  NOTIFY_WEBHOOK_URL={webhook.url}")
+    print(f"  SMTP_HOST={args.host}")
+    print(f"  SMTP_PORT={args.smtp_port}")
+    print("  SMTP_TO=alerts@example.com")
+    print(f"  SYSLOG_ADDRESS={args.host}:{args.syslog_port}")
+
+    printed = {'webhook': 0, 'email': 0, 'syslog': 0}
+    try:
+        while True:
+            time.sleep(1)
+            for name, server in (('webhook', webhook), ('email', smtp), ('syslog', syslog)):
+                messages = server.messages()
+                for message in messages[printed[name]:]:
+                    print(f"[{name}] {message}")
+                printed[name] = len(messages)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in (webhook, smtp, syslog):
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+模擬サーバーの共通処理
+LINE・気象データ・通知チャネルの模擬サーバーで共有する起動・停止の処理
+"""
+import threading
+
+
+class MockServer:
+    """模擬サーバーの基底クラス（socketserverのサーバーをバックグラウンドで起動・停止する）"""
+
+    def __init__(self, server):
+        """
+        初期化
+
+        Args:
+            server: socketserverのサーバー（ThreadingHTTPServerなど）
+        """
+        self._server = server
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self) -> tuple:
+        """待ち受けアドレス (ホスト, ポート)"""
+        return self._server.server_address[:2]
+
+    @property
+    def endpoint(self) -> str:
+        """HTTPサーバーのベースURL"""
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """バックグラウンドスレッドでサーバーを起動"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """サーバーを停止"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        """現在のスレッドでサーバーを起動"""
+        self._server.serve_forever()
@@ -0,0 +1,208 @@
+"""
+外部気象データの模擬サーバー
+外部のフィードに接続せずに、気象観測値とWBGT予報の取得・キャッシュの動作を確認するためのローカルサーバー
+
+使い方:
+    python mock_weather_server.py --port 8090 --update-interval 60
+
+配信するデータ:
+    /observations.json   気象観測値（JSON、直近1時間分を10分ごと）
+    /wbgt_forecast.csv   WBGT予報（環境省の予測値CSV形式、3時間ごと）
+データは更新間隔ごとに作り直し、ETag / Last-Modifiedによる条件付きリクエストには304を返す。
+weather_feedsの取得先は環境変数WEATHER_OBSERVATION_URL / WBGT_FORECAST_URLで切り替える。
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mock_server import MockServer
+
+JST = timezone(timedelta(hours=9))
+
+
+class MockWeatherServer(MockServer):
+    """気象観測値とWBGT予報を配信する模擬サーバー"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, update_interval: float = 60.0,
+                 latency: float = 0.0, point: str = '44132'):
+        """
+        初期化
+
+        Args:
+            host: 待ち受けアドレス
+            port: 待ち受けポート（0の場合は空いているポートを自動選択）
+            update_interval: データを更新する間隔（秒）
+            latency: 応答までの遅延（秒）
+            point: WBGT予報の地点番号
+        """
+        self.update_interval = update_interval
+        self.latency = latency
+        self.point = point
+
+        self.requests = {}  # パス -> {'total', 'not_modified'}
+        self._lock = threading.Lock()
+        self._documents = {}  # パス -> (更新番号, 本文, ETag, Last-Modified)
+
+        super().__init__(ThreadingHTTPServer((host, port), self._make_handler()))
+
+    def request_count(self, path: str) -> dict:
+        """
+        パスごとの受信数を取得
+
+        Args:
+            path: パス（例: /observations.json）
+
+        Returns:
+            {'total', 'not_modified'} の辞書
+        """
+        with self._lock:
+            return dict(self.requests.get(path, {'total': 0, 'not_modified': 0}))
+
+    def _document(self, path: str):
+        """現在の更新番号の配信データを取得（更新番号が変わったら作り直す）"""
+        generation = int(time.time() // self.update_interval) if self.update_interval > 0 else 0
+        with self._lock:
+            cached = self._documents.get(path)
+            if cached and cached[0] == generation:
+                return cached
+        if self.update_interval > 0:
+            updated_at = generation * self.update_interval
+        else:
+            updated_at = time.time()
+
+        if path == '/observations.json':
+            body, content_type = self._observations(updated_at), 'application/json'
+        elif path == '/wbgt_forecast.csv':
+            body, content_type = self._forecast(updated_at), 'text/csv'
+        else:
+            return None
+
+        document = (generation, body, content_type,
+                    f'"{hashlib.sha1(body).hexdigest()}"', formatdate(updated_at, usegmt=True))
+        with self._lock:
+            self._documents[path] = document
+        return document
+
+    @staticmethod
+    def _weather(t: float) -> dict:
+        """時刻に応じた模擬の気象値（日中に暑くなる）"""
+        hour = datetime.fromtimestamp(t, JST).hour + datetime.fromtimestamp(t, JST).minute / 60
+        daytime = max(0.0, math.sin((hour - 6) / 12 * math.pi))
+        return {
+            'temperature': round(26 + 8 * daytime, 1),
+            'humidity': round(80 - 25 * daytime, 1),
+            'wind_speed': round(1.5 + math.sin(t / 600), 1),
+            'solar_radiation': round(850 * daytime)
+        }
+
+    def _observations(self, updated_at: float) -> bytes:
+        """直近1時間分の観測値（10分ごと）"""
+        latest = updated_at - updated_at % 600
+        observations = []
+        for i in range(5, -1, -1):
+            t = latest - i * 600
+            observations.append({'time': datetime.fromtimestamp(t, JST).isoformat(), **self._weather(t)})
+        return json.dumps({'observations': observations}, ensure_ascii=False).encode('utf-8')
+
+    def _forecast(self, updated_at: float) -> bytes:
+        """今後24時間分のWBGT予報（3時間ごと、値は10倍の整数）"""
+        issued = datetime.fromtimestamp(updated_at, JST).replace(minute=0, second=0, microsecond=0)
+        start = issued + timedelta(hours=3 - issued.hour % 3)
+        times = [start + timedelta(hours=3 * i) for i in range(8)]
+        values = []
+        for t in times:
+            weather = self._weather(t.timestamp())
+            values.append(str(round((0.7 * weather['temperature'] - 0.2 * (100 - weather['humidity']) / 10
+                                     + weather['solar_radiation'] / 200) * 10)))
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['', ''] + [t.strftime('%Y%m%d%H') for t in times])
+        writer.writerow([self.point, issued.strftime('%Y/%m/%d %H:%M')] + values)
+        return output.getvalue().encode('utf-8')
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if server.latency > 0:
+                    time.sleep(server.latency)
+                document = server._document(self.path)
+                if document is None:
+                    self._respond(404, b'', 'text/plain')
+                    return
+                _, body, content_type, etag, last_modified = document
+
+                not_modified = False
+                if self.headers.get('If-None-Match'):
+                    not_modified = self.headers['If-None-Match'] == etag
+                elif self.headers.get('If-Modified-Since'):
+                    try:
+                        since = parsedate_to_datetime(self.headers['If-Modified-Since'])
+                        not_modified = since >= parsedate_to_datetime(last_modified)
+                    except (TypeError, ValueError):
+                        pass
+
+                with server._lock:
+                    count = server.requests.setdefault(self.path, {'total': 0, 'not_modified': 0})
+                    count['total'] += 1
+                    count['not_modified'] += not_modified
+
+                if not_modified:
+                    self._respond(304, b'', content_type, etag, last_modified)
+                else:
+                    self._respond(200, body, content_type, etag, last_modified)
+
+            def _respond(self, status: int, body: bytes, content_type: str,
+                         etag: str = None, last_modified: str = None):
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', content_type)
+                    if status != 304:
+                        self.send_header('Content-Length', str(len(body)))
+                    if etag:
+                        self.send_header('ETag', etag)
+                    if last_modified:
+                        self.send_header('Last-Modified', last_modified)
+                    self.end_headers()
+                    if status != 304:
+                        self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="外部気象データの模擬サーバー")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--update-interval', type=float, default=60.0, help="データを更新する間隔（秒）")
+    parser.add_argument('--latency', type=float, default=0.0, help="応答遅延（秒）")
+    parser.add_argument('--point', default='44132', help="WBGT予報の地点番号")
+    args = parser.parse_args()
+
+    server = MockWeatherServer(host=args.host, port=args.port, update_interval=args.update_interval,
+                               latency=args.latency, point=args.point)
+    print(f"気象データ模擬サーバー起動: {server.endpoint}")
+    print(f"  観測値: {server.endpoint}/observations.json")
+    print(f"  WBGT予報: {server.endpoint}/wbgt_forecast.csv")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""
+監視データ管理モジュール
+センサーの測定値をセッション状態に蓄積し、アラート履歴の記録とLINE通知を行う
+"""
+import os
+from line_notifier import LineNotifier
+from exporter import get_reading_log
+from zone_index import ZoneRiskIndex
+from alert_state import AlertStateMachine, get_shared_alert_state
+from notifiers import NotificationDispatcher, build_alert_payload, build_channels_from_env, get_notify_timeout
+from refresh_scheduler import get_sensor_poll_seconds
+from heatstroke import (
+    HEATSTROKE_LEVELS, ALERT_LEVELS,
+    calculate_discomfort_index, calculate_sensor_wbgt, calculate_outdoor_wbgt_batch,
+    get_heatstroke_risk, get_wbgt_mode
+)
+
+# バッファの保持件数
+MAX_SENSOR_DATA = 200
+MAX_ALERT_HISTORY = 50
+
+
+def init_session_state(state):
+    """
+    セッション状態を初期化
+
+    Args:
+        state: セッション状態（st.session_stateまたは辞書）
+    """
+    if 'sensor_data' not in state:
+        state['sensor_data'] = {
+            'timestamp': [],
+            'sensor_id': [],
+            'temperature': [],
+            'humidity': [],
+            'discomfort_index': [],
+            'wbgt': []  # 暑さ指数（WBGT）
+        }
+
+    if 'is_connected' not in state:
+        state['is_connected'] = False
+
+    if 'data_version' not in state:
+        state['data_version'] = 0  # 測定値を追加するたびに増加（再描画の要否の判定に使用）
+
+    if 'alert_history' not in state:
+        state['alert_history'] = []
+
+    if 'alert_state' not in state:
+        state['alert_state'] = get_shared_alert_state()  # 全セッションで共有
+
+    if 'zone_index' not in state:
+        state['zone_index'] = ZoneRiskIndex()
+
+    if 'line_notifier' not in state:
+        # LINE Notifierの初期化（環境変数が設定されている場合のみ）
+        try:
+            if os.getenv('LINE_CHANNEL_ACCESS_TOKEN') and os.getenv('LINE_USER_ID'):
+                # 送信タイムアウトは他のチャネルと同じ設定（NOTIFY_TIMEOUT_SECONDS）を使う
+                state['line_notifier'] = LineNotifier(timeout=get_notify_timeout())
+                state['line_enabled'] = True
+            else:
+                state['line_notifier'] = None
+                state['line_enabled'] = False
+        except Exception as e:
+            state['line_notifier'] = None
+            state['line_enabled'] = False
+            print(f"LINE通知の初期化エラー: {e}")
+
+    if 'readings_log' not in state:
+        # 測定値ログ（Noneなら記録しない）。全セッションで共有し、書き込みは1つのセッションのみが行う
+        log_path = os.getenv('READINGS_LOG')
+        state['readings_log'] = (
+            get_reading_log(log_path, takeover_after=2 * get_sensor_poll_seconds()).session() if log_path else None
+        )
+
+    if 'notifier' not in state:
+        # 設定されている全チャネル（LINE・Webhook・メール・syslog）に並行して送信
+        channels = build_channels_from_env(state['line_notifier'] if state['line_enabled'] else None)
+        state['notifier'] = NotificationDispatcher(channels) if channels else None
+
+
+def make_offline_state(line_notifier=None, notifier=None) -> dict:
+    """
+    環境変数の設定を使わないセッション状態を作成（テスト・ベンチマーク・ハーネス用）
+
+    アラート状態は共有せずファイルにも保存せず、測定値ログは記録しない。
+    通知は指定したものにのみ送信する。
+
+    Args:
+        line_notifier: LINE通知（省略時はLINE通知なし）
+        notifier: 通知の送信先（NotificationDispatcher、省略時は送信しない）
+
+    Returns:
+        init_session_stateで初期化したセッション状態の辞書
+    """
+    state = {
+        'line_notifier': line_notifier,
+        'line_enabled': line_notifier is not None,
+        'alert_state': AlertStateMachine(state_file=''),
+        'notifier': notifier,
+        'readings_log': None
+    }
+    init_session_state(state)
+    return state
+
+
+def add_data_point(state, timestamp, temp, humidity, sensor_id=None,
+                   wind_speed=None, solar_radiation=None):
+    """
+    データポイントを追加
+
+    Args:
+        state: セッション状態（st.session_stateまたは辞書）
+        timestamp: 測定時刻
+        temp: 気温（℃）
+        humidity: 湿度（%）
+        sensor_id: センサーID（省略可）
+        wind_speed: 風速（m/s、屋外センサーのみ）
+        solar_radiation: 全天日射量（W/m²、屋外センサーのみ）
+    """
+    wbgt = calculate_sensor_wbgt(sensor_id, temp, humidity, wind_speed, solar_radiation, timestamp)
+    _append_reading(state, timestamp, temp, humidity, sensor_id, wbgt)
+    _trim_buffers(state)
+    _write_reading_log(state, [{
+        'timestamp': timestamp, 'sensor_id': sensor_id, 'temperature': temp, 'humidity': humidity,
+        'wind_speed': wind_speed, 'solar_radiation': solar_radiation
+    }])
+
+
+def add_data_points(state, readings):
+    """
+    1回の読み込み分の測定値をまとめて追加
+
+    屋外センサーのWBGT（Liljegrenの方法）は1件ずつでは遅いため、配列でまとめて計算する。
+
+    Args:
+        state: セッション状態（st.session_stateまたは辞書）
+        readings: 測定値の辞書のリスト
+            （'timestamp', 'temperature', 'humidity', 'sensor_id', 'wind_speed', 'solar_radiation'）
+    """
+    wbgts = [None] * len(readings)
+    outdoor = [i for i, reading in enumerate(readings)
+               if reading.get('wind_speed') is not None and reading.get('solar_radiation') is not None
+               and get_wbgt_mode(reading.get('sensor_id')) == 'outdoor']
+    if outdoor:
+        values = calculate_outdoor_wbgt_batch(
+            [readings[i]['temperature'] for i in outdoor],
+            [readings[i]['humidity'] for i in outdoor],
+            [readings[i]['wind_speed'] for i in outdoor],
+            [readings[i]['solar_radiation'] for i in outdoor],
+            [readings[i]['timestamp'] for i in outdoor]
+        )
+        for i, wbgt in zip(outdoor, values.tolist()):
+            wbgts[i] = wbgt
+
+    for reading, wbgt in zip(readings, wbgts):
+        temp, humidity = reading['temperature'], reading['humidity']
+        if wbgt is None:
+            wbgt = calculate_sensor_wbgt(reading.get('sensor_id'), temp, humidity)
+        _append_reading(state, reading['timestamp'], temp, humidity, reading.get('sensor_id'), wbgt)
+    _trim_buffers(state)
+    _write_reading_log(state, readings)
+
+
+def _append_reading(state, timestamp, temp, humidity, sensor_id, wbgt):
+    """測定値をバッファに追加し、アラート状態の更新と通知を行う（WBGTは計算済みの値を使う）"""
+    di = calculate_discomfort_index(temp, humidity)
+
+    sensor_data = state['sensor_data']
+    sensor_data['timestamp'].append(timestamp)
+    sensor_data['sensor_id'].append(sensor_id)
+    sensor_data['temperature'].append(temp)
+    sensor_data['humidity'].append(humidity)
+    sensor_data['discomfort_index'].append(di)
+    sensor_data['wbgt'].append(wbgt)
+    state['data_version'] = state.get('data_version', 0) + 1
+
+    # ゾーン別の最大リスクを更新
+    risk_level = get_heatstroke_risk(di, wbgt)
+    if sensor_id is not None:
+        state['zone_index'].update(sensor_id, risk_level, wbgt, di, timestamp)
+
+    # アラート状態の更新（閾値付近での往復はヒステリシスで抑制）
+    decision = state['alert_state'].evaluate(sensor_id, di, wbgt, timestamp)
+
+    # アラート履歴追加と通知
+    if decision and decision['level'] in ALERT_LEVELS:
+        alert_level = decision['level']
+        alert = {
+            'timestamp': timestamp,
+            'sensor_id': sensor_id,
+            'level': HEATSTROKE_LEVELS[alert_level]['label'],
+            'di': di,
+            'wbgt': wbgt,
+            'temp': temp,
+            'humidity': humidity,
+            'notified': decision['notify']
+        }
+        state['alert_history'].append(alert)
+
+        # 全チャネルに送信（重複の判定はアラート状態で行う。送信の完了は待たない）
+        if decision['notify'] and state['notifier']:
+            state['notifier'].dispatch(build_alert_payload(
+                temp, humidity, di, wbgt, alert_level, sensor_id=sensor_id, timestamp=timestamp
+            ), callback=_delivery_callback(state['alert_state'], sensor_id, decision, alert))
+
+
+def _delivery_callback(alert_state, sensor_id, decision: dict, alert: dict):
+    """送信結果のコールバックを作成（全チャネルで失敗したら通知済みの記録を戻し、次の測定値で再通知する）"""
+    def callback(delivered: bool):
+        if not delivered:
+            alert['notified'] = False
+            alert_state.notify_failed(sensor_id, decision)
+    return callback
+
+
+def _write_reading_log(state, readings):
+    """測定値ログに記録（エクスポート用、READINGS_LOGが設定されている場合のみ）"""
+    reading_log = state.get('readings_log')
+    if reading_log:
+        try:
+            reading_log.write(readings)
+        except OSError as e:
+            print(f"測定値ログの書き込みエラー: {e}")
+
+
+def _trim_buffers(state):
+    """バッファを保持件数に切り詰める"""
+    sensor_data = state['sensor_data']
+    # センサーごとに最新200件相当のデータのみ保持
+    max_points = MAX_SENSOR_DATA * max(1, state['zone_index'].sensor_count())
+    if len(sensor_data['timestamp']) > max_points:
+        for key in sensor_data:
+            sensor_data[key] = sensor_data[key][-max_points:]
+
+    # アラート履歴は最新50件
+    if len(state['alert_history']) > MAX_ALERT_HISTORY:
+        state['alert_history'] = state['alert_history'][-MAX_ALERT_HISTORY:]
+
+
+def clear_data(state):
+    """
+    蓄積データとアラート履歴をクリア
+
+    Args:
+        state: セッション状態（st.session_stateまたは辞書）
+    """
+    # アラート状態は全セッションで共有しているため、このセッションのセンサーのみリセット
+    state['alert_state'].reset(set(state['sensor_data']['sensor_id']))
+    for key in state['sensor_data']:
+        state['sensor_data'][key] = []
+    state['alert_history'] = []
+    state['zone_index'] = ZoneRiskIndex()
+    # LINE通知のレベルもリセット
+    if state['line_notifier']:
+        state['line_notifier'].reset_last_sent_level()
+
+
+def select_sensor_data(sensor_data: dict, sensor_id) -> dict:
+    """
+    指定したセンサーの測定値のみを取り出す
+
+    Args:
+        sensor_data: st.session_state.sensor_data
+        sensor_id: センサーID
+
+    Returns:
+        sensor_dataと同じ形式の辞書
+    """
+    if all(sid == sensor_id for sid in sensor_data['sensor_id']):
+        return sensor_data
+    indices = [i for i, sid in enumerate(sensor_data['sensor_id']) if sid == sensor_id]
+    return {key: [values[i] for i in indices] for key, values in sensor_data.items()}
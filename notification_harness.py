@@ -0,0 +1,293 @@
+"""
+通知スループット計測ハーネス
+LINE模擬サーバーに対してアラートの集中発生を再現し、通知の性能と欠損を計測する
+
+使い方:
+    python notification_harness.py --sessions 4 --sensors 50 --rounds 3 --coalesce 0.5 --rate-limit 20
+
+    --settleを指定すると、全ラウンドの後も最終レベルの測定値を投入し続け、
+    送信に失敗したアラートが次の測定値で再通知されるかを確認できる。
+
+add_data_point → NotificationDispatcher → send_discomfort_alert の経路で通知を送信し、以下を出力する:
+    - 送信数/秒（受理されたプッシュリクエスト数）
+    - アラートの配信遅延（p50/p99）
+    - 重複して届いたアラート数
+    - 同じセンサーのより深刻なレベルに置き換わったアラート数
+    - 届かなかったアラート数
+ネットワークには接続せず、すべてローカルで完結する。
+"""
+import argparse
+import contextlib
+import io
+import re
+import threading
+import time
+from datetime import datetime
+
+from heatstroke import HEATSTROKE_LEVELS, ALERT_LEVELS, calculate_discomfort_index, calculate_wbgt, get_heatstroke_risk
+from line_notifier import MAX_DIGEST_ATTEMPTS, LineNotifier
+from mock_line_server import MockLineServer
+from monitoring import make_offline_state, add_data_point
+from notifiers import LineChannel, NotificationDispatcher
+
+# 模擬データの湿度（%）
+HARNESS_HUMIDITY = 60.0
+
+
+def find_level_temperatures(humidity: float = HARNESS_HUMIDITY) -> dict:
+    """
+    各リスクレベルに到達する最低気温を求める
+
+    Args:
+        humidity: 湿度（%）
+
+    Returns:
+        リスクレベル -> 気温（℃）の辞書
+    """
+    temperatures = {}
+    for tenth in range(150, 500):
+        temp = tenth / 10
+        level = get_heatstroke_risk(calculate_discomfort_index(temp, humidity),
+                                    calculate_wbgt(temp, humidity))
+        temperatures.setdefault(level, temp)
+    return temperatures
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    パーセンタイルを計算（最近傍法）
+
+    Args:
+        values: 値のリスト
+        q: パーセンタイル（0-100）
+
+    Returns:
+        パーセンタイル値（空の場合は0）
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def extract_alerts(message: dict) -> tuple:
+    """
+    受信したメッセージから個別アラートとサマリー件数を取り出す
+
+    Args:
+        message: LINEメッセージの辞書
+
+    Returns:
+        ([(センサーID, レベル表示名), ...], サマリーにまとめられた件数)
+    """
+    contents = message.get('contents', {})
+    bubbles = contents.get('contents', []) if contents.get('type') == 'carousel' else [contents]
+
+    alerts = []
+    summarized = 0
+    labels = {info['label'] for info in HEATSTROKE_LEVELS.values()}
+    for bubble in bubbles:
+        header = bubble.get('header', {}).get('contents', [{}])[0].get('text', '')
+        summary = re.match(r'📋 その他のアラート (\d+)件', header)
+        if summary:
+            summarized += int(summary.group(1))
+            continue
+
+        texts = [item.get('text', '') for item in bubble.get('body', {}).get('contents', [])]
+        label = next((t for t in texts if t in labels), None)
+        sensor = next((t[2:] for t in texts if t.startswith('📍 ')), None)
+        alerts.append((sensor, label))
+    return alerts, summarized
+
+
+def run_session(session_index: int, args, endpoint: str, temperatures: dict,
+                expected: dict, start_barrier: threading.Barrier):
+    """
+    1セッション分のアラートを発生させる
+
+    Args:
+        session_index: セッション番号
+        args: コマンドライン引数
+        endpoint: 模擬サーバーのエンドポイント
+        temperatures: リスクレベル -> 気温の辞書
+        expected: 通知対象の (センサーID, レベル表示名) -> 発生時刻 を記録する辞書
+        start_barrier: 全セッションの開始を揃えるバリア
+    """
+    notifier = LineNotifier(
+        channel_access_token='harness-token',
+        user_id='harness-user',
+        coalesce_window=args.coalesce,
+        endpoint=endpoint,
+        timeout=args.client_timeout
+    )
+    # 環境変数の設定（アラート状態・測定値ログ・LINE以外の通知チャネル）は使わず、模擬サーバーのみに送信
+    state = make_offline_state(notifier, NotificationDispatcher([LineChannel(notifier)]))
+
+    start_barrier.wait()
+    for round_index in range(args.rounds):
+        level = ALERT_LEVELS[round_index % len(ALERT_LEVELS)]
+        for sensor_index in range(args.sensors):
+            sensor_id = f"h{session_index}-s{sensor_index}"
+            last_alert = state['alert_history'][-1] if state['alert_history'] else None
+            generated_at = time.perf_counter()
+            add_data_point(state, datetime.now(), temperatures[level], HARNESS_HUMIDITY,
+                           sensor_id=sensor_id)
+
+            # 通知対象と判定されたアラートのみ配信を期待する
+            alert = state['alert_history'][-1] if state['alert_history'] else None
+            if alert is not last_alert and alert['notified']:
+                expected.setdefault((sensor_id, alert['level']), generated_at)
+            if args.interval:
+                time.sleep(args.interval)
+
+    # 定期的な測定を模擬して最終レベルの測定値を投入し続ける（送信に失敗したアラートは再通知される）
+    final_level = ALERT_LEVELS[(args.rounds - 1) % len(ALERT_LEVELS)] if args.rounds else None
+    deadline = time.perf_counter() + args.settle
+    while final_level and time.perf_counter() < deadline:
+        time.sleep(args.settle_interval)
+        notified = 0
+        for sensor_index in range(args.sensors):
+            sensor_id = f"h{session_index}-s{sensor_index}"
+            last_alert = state['alert_history'][-1] if state['alert_history'] else None
+            generated_at = time.perf_counter()
+            add_data_point(state, datetime.now(), temperatures[final_level], HARNESS_HUMIDITY,
+                           sensor_id=sensor_id)
+            alert = state['alert_history'][-1] if state['alert_history'] else None
+            if alert is not last_alert and alert['notified']:
+                expected.setdefault((sensor_id, alert['level']), generated_at)
+                notified += 1
+        if not notified and state['notifier'].metrics()[0]['pending'] == 0:
+            break
+
+    # 送信待ちのアラートをすべて送信してから、まとめ送信のバッファを送信（失敗した分は再送）
+    state['notifier'].close()
+    if args.coalesce:
+        for _ in range(MAX_DIGEST_ATTEMPTS):
+            time.sleep(args.coalesce)
+            if notifier.flush():
+                break
+
+
+def run_harness(args) -> dict:
+    """
+    ハーネスを実行して計測結果を返す
+
+    Args:
+        args: コマンドライン引数
+
+    Returns:
+        計測結果の辞書
+    """
+    server = MockLineServer(
+        latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+        error_burst_every=args.error_burst_every, error_burst_length=args.error_burst_length,
+        timeout_rate=args.timeout_rate, hang_seconds=args.client_timeout * 2,
+        seed=args.seed
+    )
+    server.start()
+
+    temperatures = find_level_temperatures()
+    expected = {}
+    barrier = threading.Barrier(args.sessions)
+    threads = [
+        threading.Thread(target=run_session, args=(i, args, server.endpoint, temperatures, expected, barrier))
+        for i in range(args.sessions)
+    ]
+
+    log = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    server.stop()
+
+    delivered = {}
+    duplicates = 0
+    summarized = 0
+    latencies = []
+    for received_at, message in server.delivered_messages():
+        alerts, summary_count = extract_alerts(message)
+        summarized += summary_count
+        for key in alerts:
+            if key in delivered:
+                duplicates += 1
+                continue
+            delivered[key] = received_at
+            if key in expected:
+                latencies.append(received_at - expected[key])
+
+    # 届かなかったが、同じセンサーのより深刻なレベルが通知対象になったアラート（まとめ送信での統合を含む）
+    rank = {HEATSTROKE_LEVELS[level]['label']: i for i, level in enumerate(ALERT_LEVELS)}
+    top_rank = {}
+    for sensor, label in expected:
+        top_rank[sensor] = max(top_rank.get(sensor, -1), rank[label])
+    superseded = sum(1 for sensor, label in expected
+                     if rank[label] < top_rank[sensor] and (sensor, label) not in delivered)
+
+    # 最終レベルのアラートが届いていないセンサー数（途中のレベルは上位のレベルで置き換わるため別に数える）
+    final_label = HEATSTROKE_LEVELS[ALERT_LEVELS[(args.rounds - 1) % len(ALERT_LEVELS)]]['label'] if args.rounds else None
+    final_missing = sum(1 for (sensor, label) in expected if label == final_label and (sensor, label) not in delivered)
+    if summarized:
+        final_missing = max(0, final_missing - summarized)
+
+    accepted_requests = sum(1 for r in server.requests if r['status'] == 200)
+    return {
+        'alerts': len(expected),
+        'elapsed': elapsed,
+        'requests': len(server.requests),
+        'accepted_requests': accepted_requests,
+        'rate_limited': sum(1 for r in server.requests if r['status'] == 429),
+        'server_errors': sum(1 for r in server.requests if r['status'] >= 500),
+        'timeouts': sum(1 for r in server.requests if r['hung']),
+        'sends_per_sec': accepted_requests / elapsed if elapsed else 0.0,
+        'delivered': len(delivered),
+        'summarized': summarized,
+        'duplicates': duplicates,
+        'superseded': superseded,
+        'lost': max(0, len(expected) - len(delivered) - summarized - superseded),
+        'final_missing': final_missing,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p99': percentile(latencies, 99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LINE通知のスループット計測ハーネス")
+    parser.add_argument('--sessions', type=int, default=4, help="同時に動作するセッション数")
+    parser.add_argument('--sensors', type=int, default=50, help="セッションあたりのセンサー数")
+    parser.add_argument('--rounds', type=int, default=3, help="全センサーのレベルが変化する回数")
+    parser.add_argument('--interval', type=float, default=0.0, help="測定値の投入間隔（秒）")
+    parser.add_argument('--coalesce', type=float, default=0.0, help="まとめ送信の待ち時間（秒）")
+    parser.add_argument('--client-timeout', type=float, default=2.0, help="APIリクエストのタイムアウト（秒）")
+    parser.add_argument('--latency', type=float, default=0.01, help="模擬サーバーの応答遅延（秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="応答遅延の揺らぎ（秒）")
+    parser.add_argument('--rate-limit', type=float, default=None, help="模擬サーバーの1秒あたりの許容リクエスト数")
+    parser.add_argument('--error-burst-every', type=int, default=0, help="5xxバーストの間隔（リクエスト数）")
+    parser.add_argument('--error-burst-length', type=int, default=0, help="5xxバーストの長さ（リクエスト数）")
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help="応答を返さない確率")
+    parser.add_argument('--seed', type=int, default=0, help="乱数シード")
+    parser.add_argument('--settle', type=float, default=0.0,
+                        help="全ラウンドの後に最終レベルの測定値を投入し続ける最大時間（秒、送信失敗からの再通知の確認用）")
+    parser.add_argument('--settle-interval', type=float, default=0.2, help="最終レベルの測定値の投入間隔（秒）")
+    args = parser.parse_args()
+
+    result = run_harness(args)
+    print(f"アラート数:       {result['alerts']}")
+    print(f"経過時間:         {result['elapsed']:.2f}秒")
+    print(f"リクエスト数:     {result['requests']}（受理 {result['accepted_requests']} / "
+          f"429 {result['rate_limited']} / 5xx {result['server_errors']} / タイムアウト {result['timeouts']}）")
+    print(f"送信数/秒:        {result['sends_per_sec']:.1f}")
+    print(f"配信遅延 p50:     {result['latency_p50'] * 1000:.1f}ms")
+    print(f"配信遅延 p99:     {result['latency_p99'] * 1000:.1f}ms")
+    print(f"配信済み:         {result['delivered']}（サマリー {result['summarized']}）")
+    print(f"上位レベルに置換: {result['superseded']}")
+    print(f"重複:             {result['duplicates']}")
+    print(f"欠損:             {result['lost']}（最終レベル未配信 {result['final_missing']}）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,465 @@
+"""
+通知チャネルモジュール
+アラートをLINE・メール（SMTP）・Webhook・syslogの各チャネルに並行して送信する
+
+各チャネルは専用のスレッドで送信し、チャネルごとのタイムアウトを設定するため、
+応答の遅いチャネルがあっても他のチャネルの送信は遅れない。
+チャネルごとの送信数・成功率・遅延は NotificationDispatcher.metrics() で取得できる。
+"""
+import abc
+import json
+import math
+import os
+import smtplib
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+from typing import Optional
+
+from heatstroke import HEATSTROKE_LEVELS
+
+# 既定の送信タイムアウト（秒）
+DEFAULT_TIMEOUT_SECONDS = 5.0
+
+# チャネルごとの送信待ちの上限（超えた分は破棄して記録する）
+MAX_PENDING = 100
+
+# 遅延の集計に使う直近の送信数
+LATENCY_WINDOW = 1000
+
+# syslogのfacility（local0）とリスクレベルごとのseverity
+SYSLOG_FACILITY = 16
+SYSLOG_SEVERITY = {'warning': 4, 'severe_warning': 3, 'danger': 2}
+
+
+def get_notify_timeout() -> float:
+    """
+    送信タイムアウトを取得
+
+    Returns:
+        タイムアウト（秒、環境変数NOTIFY_TIMEOUT_SECONDSで変更可能）
+    """
+    return float(os.getenv('NOTIFY_TIMEOUT_SECONDS', DEFAULT_TIMEOUT_SECONDS))
+
+
+def build_alert_payload(temperature: float, humidity: float, discomfort_index: float, wbgt: float,
+                        risk_level: str, sensor_id=None, timestamp: Optional[datetime] = None) -> dict:
+    """
+    全チャネル共通のアラート内容を作成
+
+    Args:
+        temperature: 気温（℃）
+        humidity: 湿度（%）
+        discomfort_index: 不快指数
+        wbgt: WBGT（暑さ指数）
+        risk_level: リスクレベル
+        sensor_id: センサーID（省略可）
+        timestamp: 測定時刻（省略時は現在時刻）
+
+    Returns:
+        アラート内容の辞書
+    """
+    risk_info = HEATSTROKE_LEVELS[risk_level]
+    return {
+        'timestamp': (timestamp or datetime.now()).isoformat(timespec='seconds'),
+        'sensor_id': sensor_id,
+        'risk_level': risk_level,
+        'risk_label': risk_info['label'],
+        'advice': risk_info['advice'],
+        'temperature': temperature,
+        'humidity': humidity,
+        'discomfort_index': discomfort_index,
+        'wbgt': wbgt
+    }
+
+
+def format_alert_text(payload: dict) -> str:
+    """
+    アラート内容をテキストに整形（メール・syslog用）
+
+    Args:
+        payload: build_alert_payloadで作成した辞書
+
+    Returns:
+        テキスト
+    """
+    location = f"📍 {payload['sensor_id']}\n" if payload['sensor_id'] else ''
+    return (
+        f"【熱中症{payload['risk_label']}】\n"
+        f"{location}"
+        f"気温: {payload['temperature']}°C / 湿度: {payload['humidity']}%\n"
+        f"不快指数: {payload['discomfort_index']} / WBGT: {payload['wbgt']}°C\n"
+        f"{payload['advice']}\n"
+        f"測定時刻: {payload['timestamp']}"
+    )
+
+
+class Notifier(abc.ABC):
+    """通知チャネルの基底クラス（チャネルごとにsendを実装する）"""
+
+    name = 'notifier'
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            timeout: 送信タイムアウト（秒、省略時は環境変数NOTIFY_TIMEOUT_SECONDS）
+        """
+        self.timeout = timeout if timeout is not None else get_notify_timeout()
+
+    @abc.abstractmethod
+    def send(self, payload: dict) -> bool:
+        """
+        アラートを送信
+
+        Args:
+            payload: build_alert_payloadで作成した辞書
+
+        Returns:
+            送信成功時はTrue、失敗時はFalse
+        """
+
+
+class LineChannel(Notifier):
+    """LINE通知（LineNotifierをチャネルとして使う）"""
+
+    name = 'line'
+
+    def __init__(self, line_notifier, timeout: Optional[float] = None):
+        """
+        初期化
+
+        送信のタイムアウトはLineNotifierのAPIリクエストに設定したもの（LineNotifierのtimeout）が適用される。
+
+        Args:
+            line_notifier: LineNotifier
+            timeout: 遅延の判定に使うタイムアウト（秒、省略時はLineNotifierのタイムアウト）
+        """
+        super().__init__(timeout if timeout is not None else getattr(line_notifier, 'timeout', None))
+        self.line_notifier = line_notifier
+
+    def send(self, payload: dict) -> bool:
+        # 重複の判定はアラート状態で行うため常に送信
+        return self.line_notifier.send_discomfort_alert(
+            temperature=payload['temperature'],
+            humidity=payload['humidity'],
+            discomfort_index=payload['discomfort_index'],
+            wbgt=payload['wbgt'],
+            risk_level=payload['risk_level'],
+            risk_info=HEATSTROKE_LEVELS[payload['risk_level']],
+            sensor_id=payload['sensor_id'],
+            dedupe=False
+        )
+
+
+class WebhookNotifier(Notifier):
+    """Webhook通知（アラート内容をJSONでPOSTする）"""
+
+    name = 'webhook'
+
+    def __init__(self, url: str, timeout: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            url: 送信先のURL
+            timeout: 送信タイムアウト（秒）
+        """
+        super().__init__(timeout)
+        self.url = url
+
+    def send(self, payload: dict) -> bool:
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return 200 <= response.status < 300
+        except (urllib.error.URLError, OSError) as e:
+            print(f"Webhook送信エラー: {e}")
+            return False
+
+
+class EmailNotifier(Notifier):
+    """メール通知（SMTP）"""
+
+    name = 'email'
+
+    def __init__(self, host: str, port: int = 25, sender: str = '', recipients: Optional[list] = None,
+                 username: Optional[str] = None, password: Optional[str] = None,
+                 starttls: bool = False, timeout: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            host: SMTPサーバー
+            port: SMTPポート
+            sender: 送信元アドレス
+            recipients: 送信先アドレスのリスト
+            username: 認証ユーザー（省略時は認証しない）
+            password: 認証パスワード
+            starttls: STARTTLSを使う場合はTrue
+            timeout: 送信タイムアウト（秒）
+        """
+        super().__init__(timeout)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients or []
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+
+    def send(self, payload: dict) -> bool:
+        message = EmailMessage()
+        location = f" {payload['sensor_id']}" if payload['sensor_id'] else ''
+        message['Subject'] = f"[熱中症アラート] {payload['risk_label']}{location}"
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        message.set_content(format_alert_text(payload))
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                if self.starttls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password or '')
+                smtp.send_message(message)
+            return True
+        except (smtplib.SMTPException, OSError) as e:
+            print(f"メール送信エラー: {e}")
+            return False
+
+
+class SyslogNotifier(Notifier):
+    """syslog通知（UDP、RFC 3164形式）"""
+
+    name = 'syslog'
+
+    def __init__(self, host: str = 'localhost', port: int = 514, timeout: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            host: syslogサーバー
+            port: syslogポート（UDP）
+            timeout: 送信タイムアウト（秒）
+        """
+        super().__init__(timeout)
+        self.address = (host, port)
+        self.hostname = socket.gethostname()
+
+    def send(self, payload: dict) -> bool:
+        priority = SYSLOG_FACILITY * 8 + SYSLOG_SEVERITY.get(payload['risk_level'], 5)
+        text = format_alert_text(payload).replace('\n', ' ')
+        line = f"<{priority}>{time.strftime('%b %d %H:%M:%S')} {self.hostname} heatstroke: {text}"
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.sendto(line.encode('utf-8'), self.address)
+            return True
+        except OSError as e:
+            print(f"syslog送信エラー: {e}")
+            return False
+
+
+class NotificationDispatcher:
+    """アラートを全チャネルに並行して送信する"""
+
+    def __init__(self, channels: list):
+        """
+        初期化
+
+        送信用のスレッドはチャネルごとに最初の送信時に作成し、closeで停止する（次の送信時に再作成）。
+        同じ種類のチャネル（複数のWebhookなど）もチャネルごとに別のスレッドと計測結果を持つ。
+
+        Args:
+            channels: Notifierのリスト
+        """
+        self.channels = channels
+        self._lock = threading.Lock()
+        # チャネルごとに専用のスレッドで送信（遅いチャネルが他を待たせない、チャネル内の順序は保つ）
+        self._executors = {}  # Notifier -> ThreadPoolExecutor
+        self._metrics = {
+            channel: {
+                'sent': 0, 'failed': 0, 'timed_out': 0, 'dropped': 0, 'pending': 0,
+                'latencies': deque(maxlen=LATENCY_WINDOW)
+            }
+            for channel in channels
+        }
+        # セッションの破棄などでcloseされないまま解放された場合もスレッドを停止する
+        weakref.finalize(self, _shutdown_executors, self._executors)
+
+    def dispatch(self, payload: dict, callback=None) -> dict:
+        """
+        アラートを全チャネルに送信（送信の完了は待たない）
+
+        Args:
+            payload: build_alert_payloadで作成した辞書
+            callback: 全チャネルの送信が終わったときに呼び出す関数（省略可）。
+                いずれかのチャネルで送信に成功した場合はTrue、全チャネルで失敗した場合
+                （送信待ちの上限で破棄された場合を含む）はFalseを引数に呼び出す
+
+        Returns:
+            Notifier -> Future の辞書（送信待ちが上限を超えたチャネルは含まない）
+        """
+        futures = {}
+        for channel in self.channels:
+            metrics = self._metrics[channel]
+            with self._lock:
+                if metrics['pending'] >= MAX_PENDING:
+                    metrics['dropped'] += 1
+                    print(f"通知の送信待ちが上限を超えたため破棄しました ({channel.name})")
+                    continue
+                metrics['pending'] += 1
+                executor = self._executors.get(channel)
+                if executor is None:
+                    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"notify-{channel.name}")
+                    self._executors[channel] = executor
+                futures[channel] = executor.submit(self._send, channel, payload)
+
+        if callback is not None:
+            if futures:
+                _notify_when_done(list(futures.values()), callback)
+            else:
+                _run_callback(callback, False)
+        return futures
+
+    def _send(self, channel: Notifier, payload: dict) -> bool:
+        """1つのチャネルに送信して計測結果を記録"""
+        started = time.perf_counter()
+        try:
+            success = channel.send(payload)
+        except Exception as e:
+            print(f"通知送信エラー ({channel.name}): {e}")
+            success = False
+        elapsed = time.perf_counter() - started
+
+        metrics = self._metrics[channel]
+        with self._lock:
+            metrics['pending'] -= 1
+            metrics['sent' if success else 'failed'] += 1
+            if elapsed > channel.timeout:
+                metrics['timed_out'] += 1
+            metrics['latencies'].append(elapsed)
+        return success
+
+    def metrics(self) -> list:
+        """
+        チャネルごとの計測結果を取得
+
+        Returns:
+            {'channel', 'sent', 'failed', 'timed_out', 'dropped', 'pending',
+             'success_rate', 'p50_ms', 'p99_ms'} の辞書のリスト（channelsと同じ順）
+        """
+        results = []
+        with self._lock:
+            for channel in self.channels:
+                metrics = self._metrics[channel]
+                latencies = sorted(metrics['latencies'])
+                attempts = metrics['sent'] + metrics['failed']
+                results.append({
+                    'channel': channel.name,
+                    'sent': metrics['sent'],
+                    'failed': metrics['failed'],
+                    'timed_out': metrics['timed_out'],
+                    'dropped': metrics['dropped'],
+                    'pending': metrics['pending'],
+                    'success_rate': metrics['sent'] / attempts if attempts else None,
+                    'p50_ms': _percentile(latencies, 50) * 1000 if latencies else None,
+                    'p99_ms': _percentile(latencies, 99) * 1000 if latencies else None
+                })
+        return results
+
+    def close(self, wait: bool = True):
+        """
+        送信用のスレッドを停止（送信待ちのアラートは停止前に送信する）
+
+        Args:
+            wait: 送信待ちのアラートの送信完了まで待つ場合はTrue
+        """
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=wait)
+
+
+def _notify_when_done(futures: list, callback):
+    """全Futureの完了後に、いずれかが成功したかを引数にcallbackを呼び出す"""
+    lock = threading.Lock()
+    progress = {'remaining': len(futures), 'success': False}
+
+    def done(future):
+        success = not future.cancelled() and future.exception() is None and bool(future.result())
+        with lock:
+            progress['success'] = progress['success'] or success
+            progress['remaining'] -= 1
+            if progress['remaining']:
+                return
+        _run_callback(callback, progress['success'])
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def _run_callback(callback, success: bool):
+    """送信結果のコールバックを実行（例外は送信スレッドに伝えない）"""
+    try:
+        callback(success)
+    except Exception as e:
+        print(f"通知結果の処理エラー: {e}")
+
+
+def _shutdown_executors(executors: dict):
+    """送信用のスレッドを待たずに停止"""
+    for executor in list(executors.values()):
+        executor.shutdown(wait=False)
+    executors.clear()
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    """ソート済みの値のパーセンタイル（最近傍法）"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def build_channels_from_env(line_notifier=None) -> list:
+    """
+    環境変数から通知チャネルを作成
+
+    Args:
+        line_notifier: LineNotifier（LINE通知が無効の場合はNone）
+
+    Returns:
+        Notifierのリスト（設定されているチャネルのみ）
+    """
+    channels = []
+    if line_notifier is not None:
+        channels.append(LineChannel(line_notifier))
+    if os.getenv('NOTIFY_WEBHOOK_URL'):
+        channels.append(WebhookNotifier(os.getenv('NOTIFY_WEBHOOK_URL')))
+    if os.getenv('SMTP_HOST') and os.getenv('SMTP_TO'):
+        channels.append(EmailNotifier(
+            host=os.getenv('SMTP_HOST'),
+            port=int(os.getenv('SMTP_PORT', '25')),
+            sender=os.getenv('SMTP_FROM', 'heatstroke-monitor@localhost'),
+            recipients=[r.strip() for r in os.getenv('SMTP_TO').split(',') if r.strip()],
+            username=os.getenv('SMTP_USER'),
+            password=os.getenv('SMTP_PASSWORD'),
+            starttls=os.getenv('SMTP_STARTTLS', '').lower() in ('1', 'true', 'yes')
+        ))
+    if os.getenv('SYSLOG_ADDRESS'):
+        host, _, port = os.getenv('SYSLOG_ADDRESS').partition(':')
+        channels.append(SyslogNotifier(host or 'localhost', int(port or 514)))
+    return channels
@@ -0,0 +1,237 @@
+"""
+自動更新スケジューラモジュール
+リスクレベルと測定値の傾向に応じて画面の更新間隔を決め、新しい測定値がない間は再描画を省く
+
+    - 警戒レベル以上、または不快指数・WBGTが上昇傾向: 短い間隔で更新
+    - 注意レベル: 通常の間隔で更新
+    - 安全: 長い間隔で更新
+センサーの読み込みは画面の更新間隔によらず一定の間隔で行う（アラートの検知・通知は遅れない）。
+全セッション合計の再描画回数は、プロセス内で共有する描画予算（1秒あたりの上限）で制限する。
+"""
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from heatstroke import ALERT_LEVELS
+
+# 既定の更新間隔（秒）
+DEFAULT_FAST_SECONDS = 1.0
+DEFAULT_NORMAL_SECONDS = 3.0
+DEFAULT_SLOW_SECONDS = 10.0
+
+# センサーの読み込み間隔（秒）
+DEFAULT_SENSOR_POLL_SECONDS = 2.0
+
+# 全セッション合計の再描画回数の上限（回/秒）
+DEFAULT_RENDER_BUDGET = 10.0
+
+# 上昇傾向の判定に使う直近の測定値の件数と、上昇とみなす変化量
+TREND_WINDOW = 5
+TREND_DI_RISE = 1.0
+TREND_WBGT_RISE = 0.5
+
+# 待機中に状態を確認する間隔（秒）
+POLL_SECONDS = 0.5
+
+
+def get_refresh_intervals() -> dict:
+    """
+    更新間隔の設定を取得
+
+    Returns:
+        {'fast', 'normal', 'slow'} -> 秒 の辞書
+        （環境変数REFRESH_FAST_SECONDS / REFRESH_NORMAL_SECONDS / REFRESH_SLOW_SECONDSで変更可能）
+    """
+    return {
+        'fast': float(os.getenv('REFRESH_FAST_SECONDS', DEFAULT_FAST_SECONDS)),
+        'normal': float(os.getenv('REFRESH_NORMAL_SECONDS', DEFAULT_NORMAL_SECONDS)),
+        'slow': float(os.getenv('REFRESH_SLOW_SECONDS', DEFAULT_SLOW_SECONDS))
+    }
+
+
+def get_sensor_poll_seconds() -> float:
+    """
+    センサーの読み込み間隔を取得
+
+    Returns:
+        読み込み間隔（秒、環境変数SENSOR_POLL_SECONDSで変更可能）
+    """
+    return float(os.getenv('SENSOR_POLL_SECONDS', DEFAULT_SENSOR_POLL_SECONDS))
+
+
+class RenderBudget:
+    """全セッションで共有する再描画の予算（トークンバケット）"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            rate: 1秒あたりの再描画回数の上限（0以下で無制限）
+            burst: 一度に許可する回数の上限（省略時はrateと同じ、最低1回）
+        """
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """
+        再描画の許可を1回分取得
+
+        Returns:
+            取得できた場合は0、できなかった場合は次に取得できるまでの秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_render_budget() -> RenderBudget:
+    """
+    プロセス内で共有する描画予算を取得
+
+    Returns:
+        RenderBudget（環境変数RENDER_BUDGET_PER_SECONDで上限を変更可能）
+    """
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = RenderBudget(float(os.getenv('RENDER_BUDGET_PER_SECOND', DEFAULT_RENDER_BUDGET)))
+        return _budget
+
+
+def is_rising(sensor_data: dict, sensor_ids) -> bool:
+    """
+    いずれかのセンサーの不快指数・WBGTが上昇傾向か判定
+
+    Args:
+        sensor_data: セッション状態の測定値バッファ
+        sensor_ids: 対象のセンサーIDのリスト
+
+    Returns:
+        直近TREND_WINDOW件で不快指数がTREND_DI_RISE以上、
+        またはWBGTがTREND_WBGT_RISE以上上昇したセンサーがある場合はTrue
+    """
+    remaining = {sensor_id: TREND_WINDOW for sensor_id in sensor_ids}
+    latest = {}
+    oldest = {}
+    # 末尾から各センサーの直近の測定値だけを走査
+    for i in range(len(sensor_data['timestamp']) - 1, -1, -1):
+        sensor_id = sensor_data['sensor_id'][i]
+        if remaining.get(sensor_id, 0) <= 0:
+            if not any(remaining.values()):
+                break
+            continue
+        remaining[sensor_id] -= 1
+        values = (sensor_data['discomfort_index'][i], sensor_data['wbgt'][i])
+        latest.setdefault(sensor_id, values)
+        oldest[sensor_id] = values
+
+    for sensor_id, (di, wbgt) in latest.items():
+        old_di, old_wbgt = oldest[sensor_id]
+        if di - old_di >= TREND_DI_RISE or wbgt - old_wbgt >= TREND_WBGT_RISE:
+            return True
+    return False
+
+
+def next_interval(state, sensor_ids) -> float:
+    """
+    次の更新までの間隔を決定
+
+    Args:
+        state: セッション状態（st.session_stateまたは辞書）
+        sensor_ids: 監視対象のセンサーIDのリスト
+
+    Returns:
+        更新間隔（秒）
+    """
+    intervals = get_refresh_intervals()
+    levels = {state['alert_state'].level(sensor_id) for sensor_id in sensor_ids}
+    if levels & set(ALERT_LEVELS) or is_rising(state['sensor_data'], sensor_ids):
+        return intervals['fast']
+    if 'caution' in levels:
+        return intervals['normal']
+    return intervals['slow']
+
+
+def wait_for_refresh(state, sensor_ids, poll: Optional[Callable] = None,
+                     should_stop: Optional[Callable] = None,
+                     tick: Optional[Callable] = None) -> bool:
+    """
+    次の再描画のタイミングまで待機
+
+    待機中もpollで一定の間隔（SENSOR_POLL_SECONDS）ごとに測定値を取り込み、アラートの判定と通知を行う。
+    更新間隔が経過した時点で新しい測定値があれば、描画予算を取得して戻る。
+    新しい測定値がなければ再描画せずに次の間隔まで待つ。
+
+    Args:
+        state: セッション状態（st.session_stateまたは辞書）
+        sensor_ids: 監視対象のセンサーIDのリスト
+        poll: 測定値を取り込む関数（省略時は他から追加される測定値を待つ）
+        should_stop: 待機を打ち切る条件（Trueを返すと打ち切る）
+        tick: 待機中に定期的に呼ぶ関数（次の更新までの秒数を受け取る）
+
+    Returns:
+        再描画する場合はTrue、打ち切った場合はFalse
+    """
+    rendered_version = state.get('data_version', 0)
+    rendered_at = time.monotonic()
+    interval = next_interval(state, sensor_ids)
+    state['refresh_interval'] = interval
+    due = rendered_at + interval
+    poll_seconds = get_sensor_poll_seconds()
+    # 読み込みの予定は再実行をまたいで引き継ぐ（再描画のたびに読み込みが遅れないようにする）
+    next_poll = state.get('next_poll_at', rendered_at + poll_seconds)
+
+    while True:
+        if should_stop and should_stop():
+            return False
+        now = time.monotonic()
+
+        if poll and now >= next_poll:
+            poll()
+            next_poll = max(next_poll + poll_seconds, now)
+            state['next_poll_at'] = next_poll
+            # 読み込んだ測定値でレベルが上がった場合は更新間隔を縮める
+            interval = next_interval(state, sensor_ids)
+            state['refresh_interval'] = interval
+            due = min(due, rendered_at + interval)
+
+        remaining = due - now
+        if remaining > 0:
+            if tick:
+                tick(remaining)
+            wait = min(POLL_SECONDS, remaining)
+            if poll:
+                wait = min(wait, max(0.0, next_poll - now))
+            time.sleep(wait)
+            continue
+
+        if state.get('data_version', 0) == rendered_version:
+            # 新しい測定値がなければ再描画を省く
+            state['skipped_renders'] = state.get('skipped_renders', 0) + 1
+            rendered_at = now
+            interval = next_interval(state, sensor_ids)
+            state['refresh_interval'] = interval
+            due = now + interval
+            continue
+
+        wait = get_render_budget().try_acquire()
+        if wait == 0:
+            return True
+        # 描画予算を使い切っている場合は少し待ってから再描画
+        due = now + wait
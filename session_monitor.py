@@ -0,0 +1,276 @@
+"""
+セッション管理モジュール
+セッションごとのメモリ使用量と再実行のCPU時間を集計し、操作のないセッションを休止させる
+
+開いたままのタブは自動更新を続けてCPUとメモリを消費し続けるため、
+最後の操作から一定時間が経過したセッションは自動更新を止めてバッファを解放する。
+"""
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+# 休止までの無操作時間（分）
+DEFAULT_IDLE_MINUTES = 30.0
+
+# メモリ使用量を計測する間隔（秒、バッファ全体をたどるため再実行ごとには計測しない）
+DEFAULT_MEMORY_SAMPLE_SECONDS = 30.0
+
+# 集計対象のセッション状態のキー（アラート状態は全セッションで共有するため含めない）
+ACCOUNTED_KEYS = ['sensor_data', 'alert_history', 'zone_index']
+
+# 実行のないセッションの集計を保持する時間（分）
+DEFAULT_MAX_AGE_MINUTES = 60.0
+# 休止中のセッションの集計を保持する時間（分、終了を確認できない場合の上限）
+DEFAULT_PAUSED_MAX_AGE_MINUTES = 24 * 60.0
+
+# 終了したセッションを取り除く間隔（秒）
+PRUNE_INTERVAL_SECONDS = 60.0
+
+# 全セッションの集計（プロセス内で共有）
+_registry = {}
+_registry_lock = threading.Lock()
+_last_pruned = 0.0
+
+
+def get_idle_minutes() -> float:
+    """
+    休止までの無操作時間を取得
+
+    Returns:
+        無操作時間（分、環境変数SESSION_IDLE_MINUTESで変更可能、0で休止しない）
+    """
+    return float(os.getenv('SESSION_IDLE_MINUTES', DEFAULT_IDLE_MINUTES))
+
+
+def get_memory_sample_seconds() -> float:
+    """
+    メモリ使用量を計測する間隔を取得
+
+    Returns:
+        計測間隔（秒、環境変数SESSION_MEMORY_SAMPLE_SECONDSで変更可能、0で再実行ごとに計測）
+    """
+    return float(os.getenv('SESSION_MEMORY_SAMPLE_SECONDS', DEFAULT_MEMORY_SAMPLE_SECONDS))
+
+
+def estimate_size(obj, seen: Optional[set] = None) -> int:
+    """
+    オブジェクトが参照するメモリ量を概算
+
+    Args:
+        obj: 対象のオブジェクト
+        seen: 計上済みのオブジェクトIDの集合
+
+    Returns:
+        バイト数
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        size += estimate_size(vars(obj), seen)
+    return size
+
+
+def begin_run(session_id: str, state):
+    """
+    スクリプト実行の開始を記録
+
+    自動更新による再実行でなければユーザー操作とみなし、休止中なら再開する。
+
+    Args:
+        session_id: セッションID
+        state: セッション状態（st.session_stateまたは辞書）
+    """
+    now = time.time()
+    if not state.get('auto_rerun', False) or 'last_interaction' not in state:
+        state['last_interaction'] = now
+        state['idle_paused'] = False
+    state['auto_rerun'] = False
+    state['run_started'] = time.thread_time()
+
+    with _registry_lock:
+        entry = _registry.setdefault(session_id, {
+            'session_id': session_id,
+            'started_at': now,
+            'reruns': 0,
+            'cpu_seconds': 0.0,
+            'memory_bytes': 0
+        })
+        entry['reruns'] += 1
+
+
+def end_run(session_id: str, state, is_active=None):
+    """
+    スクリプト実行の終了を記録し、CPU時間とメモリ使用量を集計
+
+    メモリ使用量は計測間隔（SESSION_MEMORY_SAMPLE_SECONDS）ごとにのみ計測し、
+    それ以外の実行では前回の値を使う。PRUNE_INTERVAL_SECONDSごとに終了したセッションの集計を取り除く。
+
+    Args:
+        session_id: セッションID
+        state: セッション状態（st.session_stateまたは辞書）
+        is_active: セッションIDを受け取り、セッションが終了していなければTrueを返す関数（省略可）
+    """
+    global _last_pruned
+    now = time.time()
+    memory = None
+    if now - state.get('memory_sampled_at', 0) >= get_memory_sample_seconds():
+        memory = _measure_memory(state)
+        state['memory_sampled_at'] = now
+
+    record_cpu(session_id, state)
+    with _registry_lock:
+        entry = _registry.get(session_id)
+        if entry is None:
+            return
+        if memory is not None:
+            entry['memory_bytes'] = memory
+        entry['last_seen'] = now
+        entry['last_interaction'] = state['last_interaction']
+        entry['paused'] = state.get('idle_paused', False)
+        if now - _last_pruned < PRUNE_INTERVAL_SECONDS:
+            return
+        _last_pruned = now
+    prune_sessions(is_active=is_active)
+
+
+def record_cpu(session_id: str, state):
+    """
+    前回の計上からのCPU時間を集計に加える（自動更新の待機中の測定値の読み込みなどの計上に使用）
+
+    Args:
+        session_id: セッションID
+        state: セッション状態（st.session_stateまたは辞書）
+    """
+    now = time.thread_time()
+    cpu = now - state.get('run_started', now)
+    state['run_started'] = now
+
+    with _registry_lock:
+        entry = _registry.get(session_id)
+        if entry is not None:
+            entry['cpu_seconds'] += cpu
+
+
+def is_idle(state) -> bool:
+    """
+    無操作時間が上限を超えているか判定
+
+    Args:
+        state: セッション状態（st.session_stateまたは辞書）
+
+    Returns:
+        休止すべき場合はTrue
+    """
+    idle_minutes = get_idle_minutes()
+    if idle_minutes <= 0:
+        return False
+    return time.time() - state.get('last_interaction', time.time()) > idle_minutes * 60
+
+
+def pause_session(session_id: str, state):
+    """
+    セッションを休止し、測定値とアラート履歴のバッファを解放
+
+    通知の重複防止に使う状態（アラート状態・LINE Notifier）は保持するため、
+    再開後に同じアラートが再送されることはない。通知の送信用のスレッドも停止する
+    （送信待ちのアラートは送信してから停止し、再開後の最初の送信で作り直す）。
+    測定値ログの書き込み担当の場合は、他のセッションに引き継ぐ。
+
+    Args:
+        session_id: セッションID
+        state: セッション状態（st.session_stateまたは辞書）
+    """
+    state['idle_paused'] = True
+    for key in state['sensor_data']:
+        state['sensor_data'][key] = []
+    state['alert_history'] = []
+    if state.get('notifier'):
+        state['notifier'].close(wait=False)
+    if state.get('readings_log'):
+        state['readings_log'].release()  # 測定値ログの記録は他のセッションに引き継ぐ
+
+    memory = _measure_memory(state)
+    state['memory_sampled_at'] = time.time()
+    with _registry_lock:
+        entry = _registry.get(session_id)
+        if entry is not None:
+            entry['memory_bytes'] = memory
+            entry['paused'] = True
+
+
+def mark_auto_rerun(state):
+    """
+    次の再実行が自動更新によるものであることを記録
+
+    Args:
+        state: セッション状態（st.session_stateまたは辞書）
+    """
+    state['auto_rerun'] = True
+
+
+def prune_sessions(max_age_minutes: float = DEFAULT_MAX_AGE_MINUTES,
+                   paused_max_age_minutes: float = DEFAULT_PAUSED_MAX_AGE_MINUTES, is_active=None) -> int:
+    """
+    終了したセッションの集計を取り除く
+
+    一定時間実行のないセッション（閉じられたタブ）は取り除く。休止中のセッションは再実行されないため、
+    終了を確認できた場合（is_activeがFalseを返す場合）か、paused_max_age_minutesを超えた場合に取り除く。
+
+    Args:
+        max_age_minutes: 実行のないセッションの集計を保持する時間（分）
+        paused_max_age_minutes: 休止中のセッションの集計を保持する時間（分）
+        is_active: セッションIDを受け取り、セッションが終了していなければTrueを返す関数（省略可）
+
+    Returns:
+        取り除いたセッション数
+    """
+    now = time.time()
+    with _registry_lock:
+        entries = list(_registry.items())
+    expired = []
+    for session_id, entry in entries:
+        age = now - entry.get('last_seen', entry['started_at'])
+        if entry.get('paused'):
+            if age > paused_max_age_minutes * 60 or (is_active is not None and not is_active(session_id)):
+                expired.append(session_id)
+        elif age > max_age_minutes * 60:
+            expired.append(session_id)
+
+    with _registry_lock:
+        for session_id in expired:
+            _registry.pop(session_id, None)
+    return len(expired)
+
+
+def session_stats(max_age_minutes: float = DEFAULT_MAX_AGE_MINUTES, is_active=None) -> list:
+    """
+    全セッションの集計を取得（終了したセッションは先に取り除く）
+
+    Args:
+        max_age_minutes: 実行のないセッションの集計を保持する時間（分）
+        is_active: セッションIDを受け取り、セッションが終了していなければTrueを返す関数（省略可）
+
+    Returns:
+        セッションごとの集計の辞書のリスト（新しい順）
+    """
+    prune_sessions(max_age_minutes, is_active=is_active)
+    with _registry_lock:
+        stats = [dict(entry) for entry in _registry.values()]
+    return sorted(stats, key=lambda e: e.get('last_seen', e['started_at']), reverse=True)
+
+
+def _measure_memory(state) -> int:
+    """集計対象のキーが参照するメモリ量を概算"""
+    seen = set()
+    return sum(estimate_size(state[key], seen) for key in ACCOUNTED_KEYS if key in state)
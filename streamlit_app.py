@@ -9,10 +9,25 @@ import random
 import math
 import os
 from dotenv import load_dotenv
-from line_notifier import LineNotifier
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import session_monitor
+import refresh_scheduler
+import checkpoint
+from weather_feeds import get_feed_fetcher, observation_sensor_ids, collect_observations
+from monitoring import init_session_state, add_data_points, clear_data, select_sensor_data
+from exporter import (
+    READING_COLUMNS, ALERT_COLUMNS,
+    iter_readings_from_state, iter_alert_transitions, stream_csv
+)
+from heatstroke import (
+    HEATSTROKE_LEVELS, get_heatstroke_risk, get_hydration_recommendation, get_wbgt_mode, reload_thresholds
+)
+from threshold_sweep import History, threshold_grid, sweep, summarize
 
-# 環境変数の読み込み
+# 環境変数の読み込み（閾値は.envの更新を検知して再起動なしで反映）
 load_dotenv()
+reload_thresholds()
 
 # ページ設定
 st.set_page_config(
@@ -22,148 +37,60 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# セッション状態の初期化
-if 'sensor_data' not in st.session_state:
-    st.session_state.sensor_data = {
-        'timestamp': [],
-        'temperature': [],
-        'humidity': [],
-        'discomfort_index': [],
-        'wbgt': []  # 暑さ指数（WBGT）
-    }
-
-if 'is_connected' not in st.session_state:
-    st.session_state.is_connected = False
+# セッション状態の初期化（チェックポイントがあれば再起動前の状態から再開）
+init_session_state(st.session_state)
+checkpoint.warm_start(st.session_state)
+session_id = get_script_run_ctx().session_id
+session_monitor.begin_run(session_id, st.session_state)
 
-if 'alert_history' not in st.session_state:
-    st.session_state.alert_history = []
+# 監視対象のセンサー（"建物/フロア/部屋/センサー" 形式、カンマ区切りで複数指定）
+SENSOR_IDS = [s.strip() for s in os.getenv('SENSOR_IDS', '').split(',') if s.strip()] or [None]
+PRIMARY_SENSOR_ID = SENSOR_IDS[0]
 
-if 'line_notifier' not in st.session_state:
-    # LINE Notifierの初期化（環境変数が設定されている場合のみ）
-    try:
-        if os.getenv('LINE_CHANNEL_ACCESS_TOKEN') and os.getenv('LINE_USER_ID'):
-            st.session_state.line_notifier = LineNotifier()
-            st.session_state.line_enabled = True
-        else:
-            st.session_state.line_notifier = None
-            st.session_state.line_enabled = False
-    except Exception as e:
-        st.session_state.line_notifier = None
-        st.session_state.line_enabled = False
-        print(f"LINE通知の初期化エラー: {e}")
-
-# 閾値設定（熱中症対策用）
-HEATSTROKE_LEVELS = {
-    'safe': {'di': 70, 'wbgt': 21, 'color': '#27ae60', 'label': '安全', 'advice': '通常の活動が可能です'},
-    'caution': {'di': 75, 'wbgt': 25, 'color': '#f39c12', 'label': '注意', 'advice': 'こまめな水分補給を心がけましょう'},
-    'warning': {'di': 80, 'wbgt': 28, 'color': '#e67e22', 'label': '警戒', 'advice': '積極的な休憩と水分・塩分補給が必要です'},
-    'severe_warning': {'di': 85, 'wbgt': 31, 'color': '#e74c3c', 'label': '厳重警戒', 'advice': '激しい運動は避け、頻繁に休憩をとってください'},
-    'danger': {'di': 90, 'wbgt': 35, 'color': '#c0392b', 'label': '危険', 'advice': '外出・運動を控え、涼しい場所で過ごしてください'}
-}
+# 外部の気象データ（WEATHER_OBSERVATION_URL / WBGT_FORECAST_URL設定時のみ、全セッションで共有）
+feed_fetcher = get_feed_fetcher()
+MONITORED_SENSOR_IDS = SENSOR_IDS + observation_sensor_ids(feed_fetcher)
 
 # 関数定義
-def calculate_discomfort_index(temp, humidity):
-    """不快指数を計算"""
-    di = 0.81 * temp + 0.01 * humidity * (0.99 * temp - 14.3) + 46.3
-    return round(di, 1)
-
-def calculate_wbgt(temp, humidity):
-    """簡易WBGT（暑さ指数）を計算"""
-    # 室内での簡易計算式
-    wbgt = 0.567 * temp + 0.393 * (humidity / 100 * 6.105 * math.exp(17.27 * temp / (237.7 + temp))) + 3.94
-    return round(wbgt, 1)
-
-def get_heatstroke_risk(di, wbgt):
-    """熱中症リスクレベルを判定"""
-    if di >= HEATSTROKE_LEVELS['danger']['di'] or wbgt >= HEATSTROKE_LEVELS['danger']['wbgt']:
-        return 'danger'
-    elif di >= HEATSTROKE_LEVELS['severe_warning']['di'] or wbgt >= HEATSTROKE_LEVELS['severe_warning']['wbgt']:
-        return 'severe_warning'
-    elif di >= HEATSTROKE_LEVELS['warning']['di'] or wbgt >= HEATSTROKE_LEVELS['warning']['wbgt']:
-        return 'warning'
-    elif di >= HEATSTROKE_LEVELS['caution']['di'] or wbgt >= HEATSTROKE_LEVELS['caution']['wbgt']:
-        return 'caution'
-    else:
-        return 'safe'
-
-def get_hydration_recommendation(temp, humidity, activity_level='normal'):
-    """推奨水分補給量を計算（ml/時間）"""
-    base_amount = 200
-    
-    if temp > 30:
-        base_amount += (temp - 30) * 20
-    if humidity > 70:
-        base_amount += (humidity - 70) * 5
-    
-    if activity_level == 'light':
-        base_amount *= 1.2
-    elif activity_level == 'moderate':
-        base_amount *= 1.5
-    elif activity_level == 'heavy':
-        base_amount *= 2.0
-    
-    return int(base_amount)
-
-def generate_mock_data():
+def generate_mock_data(phase=0.0):
     """模擬データを生成"""
     current_time = datetime.now()
-    base_temp = 28 + math.sin(time.time() / 100) * 8
-    base_humidity = 65 + math.cos(time.time() / 80) * 20
+    base_temp = 28 + math.sin(time.time() / 100 + phase) * 8
+    base_humidity = 65 + math.cos(time.time() / 80 + phase) * 20
     
     temp = round(base_temp + random.uniform(-2, 2), 1)
     humidity = round(max(30, min(95, base_humidity + random.uniform(-5, 5))), 1)
     
     return current_time, temp, humidity
 
-def add_data_point(timestamp, temp, humidity):
-    """データポイントを追加"""
-    di = calculate_discomfort_index(temp, humidity)
-    wbgt = calculate_wbgt(temp, humidity)
-
-    st.session_state.sensor_data['timestamp'].append(timestamp)
-    st.session_state.sensor_data['temperature'].append(temp)
-    st.session_state.sensor_data['humidity'].append(humidity)
-    st.session_state.sensor_data['discomfort_index'].append(di)
-    st.session_state.sensor_data['wbgt'].append(wbgt)
+def generate_mock_weather():
+    """屋外センサー用の模擬気象データ（風速・日射量）を生成"""
+    wind_speed = round(max(0.0, 1.5 + math.sin(time.time() / 60) + random.uniform(-0.5, 0.5)), 1)
+    solar_radiation = round(max(0.0, 600 + math.sin(time.time() / 120) * 300 + random.uniform(-50, 50)))
+    return wind_speed, solar_radiation
 
-    # アラート履歴追加とLINE通知
-    risk_level = get_heatstroke_risk(di, wbgt)
-    if risk_level in ['warning', 'severe_warning', 'danger']:
-        alert = {
+def read_sensors():
+    """全センサーの測定値を取り込む（屋外センサーのWBGTは1回の読み込み分をまとめて計算）"""
+    readings = []
+    for i, sensor_id in enumerate(SENSOR_IDS):
+        timestamp, temp, humidity = generate_mock_data(phase=i)
+        wind_speed, solar_radiation = None, None
+        if get_wbgt_mode(sensor_id) == 'outdoor':
+            wind_speed, solar_radiation = generate_mock_weather()
+        readings.append({
             'timestamp': timestamp,
-            'level': HEATSTROKE_LEVELS[risk_level]['label'],
-            'di': di,
-            'wbgt': wbgt,
-            'temp': temp,
-            'humidity': humidity
-        }
-        if not st.session_state.alert_history or st.session_state.alert_history[-1]['level'] != alert['level']:
-            st.session_state.alert_history.append(alert)
-
-            # LINE通知を送信
-            if st.session_state.line_enabled and st.session_state.line_notifier:
-                try:
-                    success = st.session_state.line_notifier.send_discomfort_alert(
-                        temperature=temp,
-                        humidity=humidity,
-                        discomfort_index=di,
-                        wbgt=wbgt,
-                        risk_level=risk_level,
-                        risk_info=HEATSTROKE_LEVELS[risk_level]
-                    )
-                    if success:
-                        print(f"LINE通知送信成功: {HEATSTROKE_LEVELS[risk_level]['label']}")
-                except Exception as e:
-                    print(f"LINE通知送信エラー: {e}")
-
-    # 最新200件のデータのみ保持
-    if len(st.session_state.sensor_data['timestamp']) > 200:
-        for key in st.session_state.sensor_data:
-            st.session_state.sensor_data[key] = st.session_state.sensor_data[key][-200:]
+            'sensor_id': sensor_id,
+            'temperature': temp,
+            'humidity': humidity,
+            'wind_speed': wind_speed,
+            'solar_radiation': solar_radiation
+        })
+    readings.extend(collect_observations(st.session_state, feed_fetcher))
+    add_data_points(st.session_state, readings)
 
-    # アラート履歴は最新50件
-    if len(st.session_state.alert_history) > 50:
-        st.session_state.alert_history = st.session_state.alert_history[-50:]
+def is_active_session(sid):
+    """セッションが終了していない（タブが開いている）か判定（閉じたタブの集計の削除に使用）"""
+    return not runtime.exists() or runtime.get_instance().is_active_session(sid)
 
 # カスタムCSS
 st.markdown("""
@@ -223,7 +150,9 @@ with st.sidebar:
             st.info("監視を停止しました")
     
     # 接続状態表示
-    if st.session_state.is_connected:
+    if st.session_state.is_connected and st.session_state.idle_paused:
+        st.warning("⏸️ 休止中（無操作）")
+    elif st.session_state.is_connected:
         st.success("🟢 監視中")
     else:
         st.error("🔴 停止中")
@@ -271,35 +200,123 @@ LINE_CHANNEL_ACCESS_TOKEN=your_token
 LINE_USER_ID=your_user_id
             """)
 
+    # 通知チャネルごとの送信結果
+    if st.session_state.notifier:
+        with st.expander("📨 通知チャネル"):
+            channel_df = pd.DataFrame(st.session_state.notifier.metrics())
+            channel_df['成功率'] = channel_df['success_rate'].map(lambda x: f"{x:.0%}" if x is not None else '-')
+            channel_df['遅延p50(ms)'] = channel_df['p50_ms'].map(lambda x: round(x) if x is not None else None)
+            channel_df['遅延p99(ms)'] = channel_df['p99_ms'].map(lambda x: round(x) if x is not None else None)
+            st.dataframe(
+                channel_df[['channel', 'sent', 'failed', 'timed_out', '成功率', '遅延p50(ms)', '遅延p99(ms)']].rename(columns={
+                    'channel': 'チャネル',
+                    'sent': '成功',
+                    'failed': '失敗',
+                    'timed_out': 'タイムアウト'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+
+    st.divider()
+
+    # データエクスポート
+    st.subheader("💾 データエクスポート")
+    if st.session_state.sensor_data['timestamp']:
+        export_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # CSVはクリックされたときにのみ作成する（表示中のバッファを固定して渡す）
+        export_data = {key: list(values) for key, values in st.session_state.sensor_data.items()}
+        st.download_button(
+            "📥 測定値（CSV）",
+            data=lambda: "".join(stream_csv(iter_readings_from_state(export_data), READING_COLUMNS)),
+            file_name=f"readings_{export_time}.csv",
+            mime="text/csv"
+        )
+        st.download_button(
+            "📥 アラート遷移（CSV）",
+            data=lambda: "".join(stream_csv(
+                iter_alert_transitions(iter_readings_from_state(export_data)),
+                ALERT_COLUMNS
+            )),
+            file_name=f"alerts_{export_time}.csv",
+            mime="text/csv"
+        )
+    else:
+        st.caption("エクスポートできるデータがありません")
+    st.caption("長期間のデータは測定値ログ（READINGS_LOG）から`python exporter.py`で出力できます")
+
     st.divider()
 
     # データクリア
     if st.button("🗑️ 全データクリア"):
-        for key in st.session_state.sensor_data:
-            st.session_state.sensor_data[key] = []
-        st.session_state.alert_history = []
-        # LINE通知のレベルもリセット
-        if st.session_state.line_notifier:
-            st.session_state.line_notifier.reset_last_sent_level()
+        clear_data(st.session_state)
         st.success("データをクリアしました")
 
-# メインコンテンツ
-if st.session_state.is_connected:
-    timestamp, temp, humidity = generate_mock_data()
-    add_data_point(timestamp, temp, humidity)
+    st.divider()
+
+    # セッション管理
+    with st.expander("🛠️ セッション管理"):
+        idle_minutes = session_monitor.get_idle_minutes()
+        if idle_minutes > 0:
+            st.caption(f"{idle_minutes:g}分間操作のないセッションは自動更新を停止します")
+        stats = session_monitor.session_stats(is_active=is_active_session)
+        if stats:
+            now = time.time()
+            stats_df = pd.DataFrame([{
+                'セッション': entry['session_id'][:8] + (' (このタブ)' if entry['session_id'] == session_id else ''),
+                '状態': '休止中' if entry.get('paused') else '稼働中',
+                'メモリ(KB)': round(entry['memory_bytes'] / 1024, 1),
+                'CPU(秒)': round(entry['cpu_seconds'], 2),
+                '再実行回数': entry['reruns'],
+                '無操作(分)': round((now - entry.get('last_interaction', now)) / 60, 1)
+            } for entry in stats])
+            st.dataframe(stats_df, use_container_width=True, hide_index=True)
+
+    # 閾値シミュレーション
+    with st.expander("🧪 閾値シミュレーション"):
+        st.caption("表示中の測定値に対して、閾値をずらした場合のアラート数・通知数を比較します")
+        di_span = st.slider("不快指数のずれ（±）", 0.0, 5.0, 2.0, 0.5)
+        wbgt_span = st.slider("WBGTのずれ（±）", 0.0, 3.0, 1.0, 0.5)
+        if st.button("▶️ シミュレーション実行"):
+            history = History.from_readings(iter_readings_from_state(st.session_state.sensor_data))
+            di_offsets = np.arange(-di_span, di_span + 0.25, 0.5)
+            wbgt_offsets = np.arange(-wbgt_span, wbgt_span + 0.25, 0.5)
+            di_thresholds, wbgt_thresholds, offsets = threshold_grid(di_offsets, wbgt_offsets)
+            results = sweep(history, di_thresholds, wbgt_thresholds)
+            # 自動更新後も表示し続けるため、結果はセッション状態に保持
+            st.session_state.sweep_result = {
+                'table': summarize(results, di_thresholds, wbgt_thresholds,
+                                   labels=[f"DI{d:+g} / WBGT{w:+g}" for d, w in offsets]),
+                'readings': len(history),
+                'computed_at': datetime.now()
+            }
+        sweep_result = st.session_state.get('sweep_result')
+        if sweep_result:
+            st.caption(f"{sweep_result['computed_at'].strftime('%H:%M:%S')}時点の測定値{sweep_result['readings']}件で計算")
+            st.dataframe(
+                sweep_result['table'][['候補', 'アラート:警戒', 'アラート:厳重警戒', 'アラート:危険', '通知数', '平均リードタイム(分)', '見逃し']],
+                use_container_width=True, hide_index=True
+            )
 
-# 最新データ表示
-if st.session_state.sensor_data['timestamp']:
-    latest_temp = st.session_state.sensor_data['temperature'][-1]
-    latest_humidity = st.session_state.sensor_data['humidity'][-1]
-    latest_di = st.session_state.sensor_data['discomfort_index'][-1]
-    latest_wbgt = st.session_state.sensor_data['wbgt'][-1]
-    latest_time = st.session_state.sensor_data['timestamp'][-1]
+# メインコンテンツ（自動更新の場合は待機中に取り込み済み）
+if st.session_state.is_connected and not st.session_state.pop('prefetched', False):
+    read_sensors()
+
+# 最新データ表示（複数センサーの場合は先頭のセンサー）
+sensor_data = select_sensor_data(st.session_state.sensor_data, PRIMARY_SENSOR_ID)
+if sensor_data['timestamp']:
+    latest_temp = sensor_data['temperature'][-1]
+    latest_humidity = sensor_data['humidity'][-1]
+    latest_di = sensor_data['discomfort_index'][-1]
+    latest_wbgt = sensor_data['wbgt'][-1]
+    latest_time = sensor_data['timestamp'][-1]
     
     risk_level = get_heatstroke_risk(latest_di, latest_wbgt)
     risk_info = HEATSTROKE_LEVELS[risk_level]
     
     # 熱中症リスク表示（大きく目立つように）
+    if PRIMARY_SENSOR_ID is not None:
+        st.caption(f"📍 {PRIMARY_SENSOR_ID}")
     st.markdown(f"""
     <div style="background: {risk_info['color']}; padding: 2rem; border-radius: 15px; text-align: center; color: white; margin-bottom: 2rem; box-shadow: 0 4px 15px rgba(0,0,0,0.2);">
         <h2 style="margin: 0; font-size: 2.5rem;">⚠️ 現在の熱中症リスク</h2>
@@ -411,15 +428,15 @@ if st.session_state.sensor_data['timestamp']:
             """)
     
     # グラフ表示
-    if len(st.session_state.sensor_data['timestamp']) > 1:
+    if len(sensor_data['timestamp']) > 1:
         st.subheader("📊 環境データ推移")
         
         df = pd.DataFrame({
-            '時刻': st.session_state.sensor_data['timestamp'],
-            '気温(°C)': st.session_state.sensor_data['temperature'],
-            '湿度(%)': st.session_state.sensor_data['humidity'],
-            '不快指数': st.session_state.sensor_data['discomfort_index'],
-            'WBGT(°C)': st.session_state.sensor_data['wbgt']
+            '時刻': sensor_data['timestamp'],
+            '気温(°C)': sensor_data['temperature'],
+            '湿度(%)': sensor_data['humidity'],
+            '不快指数': sensor_data['discomfort_index'],
+            'WBGT(°C)': sensor_data['wbgt']
         })
         
         # タブで表示切り替え
@@ -521,13 +538,62 @@ if st.session_state.sensor_data['timestamp']:
             st.metric("平均WBGT", f"{df['WBGT(°C)'].mean():.1f}°C",
                      f"{df['WBGT(°C)'].iloc[-1] - df['WBGT(°C)'].mean():.1f}°C")
 
+    # ゾーン別リスク
+    zone_overview = st.session_state.zone_index.overview()
+    if zone_overview:
+        with st.expander("🏢 ゾーン別リスク", expanded=True):
+            zone_df = pd.DataFrame(zone_overview)
+            zone_df['ゾーン'] = zone_df.apply(
+                lambda row: "　" * row['depth'] + row['zone'].split('/')[-1], axis=1
+            )
+            zone_df['最大リスク'] = zone_df['risk_level'].map(lambda x: HEATSTROKE_LEVELS[x]['label'])
+            zone_df['最も暑いセンサー'] = zone_df['sensor_id'].map(lambda x: x.split('/')[-1])
+            st.dataframe(
+                zone_df[['ゾーン', 'sensors', '最大リスク', 'wbgt', 'di', '最も暑いセンサー']].rename(columns={
+                    'sensors': 'センサー数',
+                    'wbgt': 'WBGT',
+                    'di': '不快指数'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+
+    # WBGT予報（外部データ）
+    forecast = feed_fetcher.get('wbgt_forecast') if feed_fetcher and 'wbgt_forecast' in feed_fetcher.feeds else None
+    if forecast:
+        with st.expander("🌤️ WBGT予報（外部データ）", expanded=False):
+            forecast_df = pd.DataFrame(forecast)
+            fig_forecast = go.Figure()
+            fig_forecast.add_trace(go.Scatter(
+                x=forecast_df['timestamp'], y=forecast_df['wbgt'], mode='lines+markers', name='予報'
+            ))
+            # 実測値（外部の観測値とメインのセンサー）と比較
+            for compare_id in observation_sensor_ids(feed_fetcher) + [PRIMARY_SENSOR_ID]:
+                measured = select_sensor_data(st.session_state.sensor_data, compare_id)
+                if measured['timestamp']:
+                    fig_forecast.add_trace(go.Scatter(
+                        x=measured['timestamp'], y=measured['wbgt'], mode='lines',
+                        name=compare_id or '測定値'
+                    ))
+            for level in ['warning', 'severe_warning', 'danger']:
+                fig_forecast.add_hline(
+                    y=HEATSTROKE_LEVELS[level]['wbgt'], line_dash="dot",
+                    line_color=HEATSTROKE_LEVELS[level]['color'],
+                    annotation_text=HEATSTROKE_LEVELS[level]['label']
+                )
+            fig_forecast.update_layout(height=300, yaxis_title="WBGT(°C)")
+            st.plotly_chart(fig_forecast, use_container_width=True)
+            peak = forecast_df.loc[forecast_df['wbgt'].idxmax()]
+            st.caption(f"予報の最高値: {peak['wbgt']:.1f}°C（{peak['timestamp'].strftime('%m/%d %H時')}）")
+
     # アラート履歴
     if st.session_state.alert_history:
         with st.expander("🚨 アラート履歴", expanded=False):
             alert_df = pd.DataFrame(st.session_state.alert_history)
             alert_df['時刻'] = alert_df['timestamp'].apply(lambda x: x.strftime("%H:%M:%S"))
+            alert_df['通知'] = alert_df['notified'].map(lambda x: '📨' if x else '')
             st.dataframe(
-                alert_df[['時刻', 'level', 'temp', 'humidity', 'di', 'wbgt']].rename(columns={
+                alert_df[['時刻', 'level', '通知', 'temp', 'humidity', 'di', 'wbgt']].rename(columns={
                     'level': 'レベル',
                     'temp': '気温',
                     'humidity': '湿度',
@@ -582,7 +648,28 @@ with st.expander("📐 計算式の詳細"):
         st.latex(r"WBGT = 0.567 \times T + 0.393 \times e + 3.94")
         st.caption("T: 気温(°C), e: 水蒸気圧")
 
-# 自動更新
+    st.markdown("### WBGT（屋外センサー）")
+    st.latex(r"WBGT = 0.7 \times T_{nwb} + 0.2 \times T_g + 0.1 \times T")
+    st.caption("T_nwb: 自然湿球温度, T_g: 黒球温度（気温・湿度・風速・日射量からLiljegrenの方法で算出）")
+
+# 自動更新（リスクレベルに応じた間隔で、新しい測定値がある場合のみ再描画）
+session_monitor.end_run(session_id, st.session_state, is_active=is_active_session)
+checkpoint.maybe_checkpoint(st.session_state, session_id=session_id)
 if st.session_state.is_connected:
-    time.sleep(2)
-    st.rerun()
\ No newline at end of file
+    refresh_status = st.empty()
+    try:
+        refreshed = not session_monitor.is_idle(st.session_state) and refresh_scheduler.wait_for_refresh(
+            st.session_state, MONITORED_SENSOR_IDS, poll=read_sensors,
+            should_stop=lambda: session_monitor.is_idle(st.session_state),
+            tick=lambda remaining: refresh_status.caption(f"🔄 次の更新まで {remaining:.0f}秒")
+        )
+    finally:
+        # 待機中の測定値の読み込みにかかったCPU時間も計上
+        session_monitor.record_cpu(session_id, st.session_state)
+    if refreshed:
+        st.session_state.prefetched = True
+        session_monitor.mark_auto_rerun(st.session_state)
+        st.rerun()
+    # 操作のないセッションは自動更新を止めてバッファを解放
+    session_monitor.pause_session(session_id, st.session_state)
+    refresh_status.info("⏸️ 一定時間操作がないため自動更新を停止しました。画面を操作すると再開します")
@@ -0,0 +1,120 @@
+"""
+alert_stateのテスト
+閾値付近（WBGT 27.9↔28.1）で値が往復しても通知が繰り返されないこと、最低滞在時間・ヒステリシス幅を
+満たすまでレベルが下がらないこと、再通知と送信失敗時の巻き戻しを確認する
+"""
+from datetime import datetime, timedelta
+
+from alert_state import AlertStateMachine
+
+T0 = datetime(2026, 8, 1, 12, 0)
+DI = 60.0  # 不快指数は常に安全（WBGTのみでレベルが決まる）
+
+
+def machine(**kwargs) -> AlertStateMachine:
+    settings = dict(hysteresis_di=1.0, hysteresis_wbgt=0.5, min_dwell=60, renotify_after=0, state_file='')
+    settings.update(kwargs)
+    return AlertStateMachine(**settings)
+
+
+def feed(alert_state: AlertStateMachine, wbgts, interval: float = 30, start: datetime = T0) -> list:
+    """WBGTを一定間隔で評価し、各測定値の判定結果を返す"""
+    return [alert_state.evaluate('s1', DI, wbgt, start + timedelta(seconds=interval * i))
+            for i, wbgt in enumerate(wbgts)]
+
+
+def notified_levels(decisions: list) -> list:
+    return [d['level'] for d in decisions if d and d['notify']]
+
+
+def test_oscillation_notifies_once():
+    alert_state = machine()
+    decisions = feed(alert_state, [27.9, 28.1] * 40)
+
+    assert notified_levels(decisions) == ['warning']
+    assert alert_state.level('s1') == 'warning'
+
+
+def test_oscillation_without_hysteresis_renotifies():
+    # ヒステリシス・最低滞在時間がなければ、閾値をまたぐたびに通知される
+    alert_state = machine(hysteresis_wbgt=0, min_dwell=0)
+    decisions = feed(alert_state, [27.9, 28.1] * 40)
+
+    assert notified_levels(decisions) == ['warning'] * 40
+
+
+def test_level_drops_after_dwell():
+    alert_state = machine()
+    feed(alert_state, [28.5])
+
+    assert alert_state.evaluate('s1', DI, 26.0, T0 + timedelta(seconds=30)) is None
+    decision = alert_state.evaluate('s1', DI, 26.0, T0 + timedelta(seconds=60))
+
+    assert decision['changed'] and not decision['notify']
+    assert (decision['previous_level'], decision['level']) == ('warning', 'caution')
+
+
+def test_level_drops_only_below_hysteresis():
+    alert_state = machine()
+    feed(alert_state, [28.5])
+
+    assert alert_state.evaluate('s1', DI, 27.6, T0 + timedelta(minutes=5)) is None
+    assert alert_state.level('s1') == 'warning'
+    assert alert_state.evaluate('s1', DI, 27.4, T0 + timedelta(minutes=6))['level'] == 'caution'
+
+
+def test_rise_is_immediate_and_new_episode_notifies():
+    alert_state = machine()
+    decisions = feed(alert_state, [28.5, 31.2, 35.5])
+    assert notified_levels(decisions) == ['warning', 'severe_warning', 'danger']
+
+    # 警戒レベルを下回ると一連のアラートは終了し、再び上昇したときに通知する
+    decisions = feed(alert_state, [24.0] * 3 + [28.5], interval=60, start=T0 + timedelta(minutes=10))
+    assert alert_state.level('s1') == 'warning'
+    assert notified_levels(decisions) == ['warning']
+
+
+def test_renotify_after_interval():
+    alert_state = machine(renotify_after=600)
+    decisions = feed(alert_state, [28.5] * 25, interval=60)
+
+    notified_at = [i for i, d in enumerate(decisions) if d and d['notify']]
+    assert notified_at == [0, 10, 20]
+
+
+def test_failed_notification_is_retried():
+    alert_state = machine()
+    first = alert_state.evaluate('s1', DI, 28.5, T0)
+    assert first['notify'] and first['previous_notified'] == (None, None)
+
+    alert_state.notify_failed('s1', first)
+
+    retry = alert_state.evaluate('s1', DI, 28.5, T0 + timedelta(seconds=30))
+    assert retry['notify'] and not retry['changed']
+    assert alert_state.evaluate('s1', DI, 28.5, T0 + timedelta(seconds=60)) is None
+
+
+def test_stale_failure_does_not_undo_newer_notification():
+    alert_state = machine()
+    warning = alert_state.evaluate('s1', DI, 28.5, T0)
+    danger = alert_state.evaluate('s1', DI, 35.5, T0 + timedelta(seconds=30))
+
+    # 先に送った警戒の通知が後から失敗しても、危険の通知済みは残す
+    alert_state.notify_failed('s1', warning)
+    assert alert_state.evaluate('s1', DI, 35.5, T0 + timedelta(seconds=60)) is None
+
+    # 危険の通知が失敗した場合は、警戒の通知済みまで戻す
+    alert_state.notify_failed('s1', danger)
+    assert notified_levels(feed(alert_state, [35.5], start=T0 + timedelta(seconds=90))) == ['danger']
+
+
+def test_state_survives_save_and_load(tmp_path):
+    path = str(tmp_path / 'alert_state.json')
+    alert_state = machine(state_file=path)
+    feed(alert_state, [28.5])
+    alert_state.save()
+
+    reloaded = machine(state_file=path)
+
+    assert reloaded.level('s1') == 'warning'
+    assert reloaded.evaluate('s1', DI, 28.5, T0 + timedelta(seconds=30)) is None
@@ -0,0 +1,92 @@
+"""
+checkpointのテスト
+保存したチェックポイントから復元したバッファ・履歴が保存前と一致すること、途中で切れたファイルは
+空の状態から開始すること、実行中に開いたセッションも最新のチェックポイントから開始することを確認する
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import checkpoint
+from monitoring import add_data_point, make_offline_state
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(checkpoint, '_loaded', {})
+    monkeypatch.setattr(checkpoint, '_writers', {})
+
+
+def filled_state() -> dict:
+    """2台のセンサーの測定値（注意から危険への上昇を含む）を追加したセッション状態"""
+    state = make_offline_state()
+    t0 = datetime(2026, 8, 1, 12, 0)
+    for i in range(40):
+        timestamp = t0 + timedelta(seconds=30 * i)
+        add_data_point(state, timestamp, 26.0 + i * 0.25, 55.0 + i * 0.5, '本館/1F/101/s1')
+        add_data_point(state, timestamp, 24.5, 50.0, '本館/2F/201/s1')
+    state['feed_seen'] = {'jma': t0 + timedelta(minutes=10)}
+    return state
+
+
+def wait_for_write():
+    checkpoint._pending.result(timeout=10)
+
+
+def test_restored_buffers_match(tmp_path):
+    path = str(tmp_path / 'app.ckpt')
+    state = filled_state()
+    assert state['alert_history']
+    checkpoint.write_checkpoint(path, checkpoint.take_snapshot(state))
+
+    restored = make_offline_state()
+    assert checkpoint.warm_start(restored, path)
+
+    assert restored['sensor_data'] == state['sensor_data']
+    assert restored['alert_history'] == state['alert_history']
+    assert restored['feed_seen'] == state['feed_seen']
+    assert restored['alert_state'].to_dict() == state['alert_state'].to_dict()
+    assert restored['zone_index'].zone_max()['sensor_id'] == state['zone_index'].zone_max()['sensor_id']
+    # 同じセッションでは一度だけ復元する
+    assert not checkpoint.warm_start(restored, path)
+
+
+@pytest.mark.parametrize('keep', [4, checkpoint.HEADER_OFFSET, checkpoint.HEADER_OFFSET + 40, 0.5, -1])
+def test_truncated_file_starts_empty(tmp_path, keep):
+    path = str(tmp_path / 'app.ckpt')
+    checkpoint.write_checkpoint(path, checkpoint.take_snapshot(filled_state()))
+    with open(path, 'rb') as f:
+        data = f.read()
+    size = int(len(data) * keep) if isinstance(keep, float) else keep % len(data)
+    with open(path, 'wb') as f:
+        f.write(data[:size])
+
+    restored = make_offline_state()
+    assert not checkpoint.warm_start(restored, path)
+
+    assert all(values == [] for values in restored['sensor_data'].values())
+    assert restored['alert_history'] == []
+    assert restored['zone_index'].zone_max() is None
+
+
+def test_new_session_restores_latest_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setenv('CHECKPOINT_INTERVAL_SECONDS', '0')
+    path = str(tmp_path / 'app.ckpt')
+    writer = filled_state()
+    assert checkpoint.maybe_checkpoint(writer, path, session_id='writer')
+    wait_for_write()
+
+    # 書き込み担当以外のセッションは保存しない
+    viewer = make_offline_state()
+    assert checkpoint.warm_start(viewer, path)
+    add_data_point(viewer, datetime(2026, 8, 1, 13, 0), 25.0, 50.0, '本館/2F/201/s1')
+    assert not checkpoint.maybe_checkpoint(viewer, path, session_id='viewer')
+
+    # 書き込み担当が保存し直すと、その後に開いたセッションは新しい内容から開始する
+    add_data_point(writer, datetime(2026, 8, 1, 13, 0), 36.0, 80.0, '本館/1F/101/s1')
+    assert checkpoint.maybe_checkpoint(writer, path, session_id='writer')
+    wait_for_write()
+
+    later = make_offline_state()
+    assert checkpoint.warm_start(later, path)
+    assert later['sensor_data'] == writer['sensor_data']
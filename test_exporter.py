@@ -0,0 +1,86 @@
+"""
+exporterのテスト
+複数のセッションで共有する測定値ログに同じ測定値が重複して記録されないことと、
+アラートの遷移がアプリのアラート状態機械と同じ判定になることを確認する
+"""
+import csv
+from datetime import datetime, timedelta
+
+from alert_state import AlertStateMachine
+from exporter import ReadingLog, iter_alert_transitions
+
+
+def reading(timestamp: datetime, sensor_id: str = 's1', temp: float = 30.0) -> dict:
+    return {'timestamp': timestamp, 'sensor_id': sensor_id, 'temperature': temp, 'humidity': 60.0,
+            'wind_speed': None, 'solar_radiation': None}
+
+
+def log_rows(path) -> list:
+    with open(path, newline='', encoding='utf-8') as f:
+        return [(row['timestamp'], row['sensor_id']) for row in csv.DictReader(f)]
+
+
+def transition(timestamp: datetime, wbgt: float, sensor_id: str = 's1') -> dict:
+    """WBGTのみでリスクレベルが決まる測定値（不快指数は常に安全）"""
+    return {'timestamp': timestamp, 'sensor_id': sensor_id, 'temperature': 25.0, 'humidity': 50.0,
+            'discomfort_index': 60.0, 'wbgt': wbgt}
+
+
+def test_only_one_session_writes(tmp_path):
+    path = tmp_path / 'readings.csv'
+    log = ReadingLog(str(path), takeover_after=60)
+    first, second = log.session(), log.session()
+    t0 = datetime(2026, 8, 1, 12, 0)
+
+    for i in range(3):
+        readings = [reading(t0 + timedelta(seconds=2 * i), 's1'), reading(t0 + timedelta(seconds=2 * i), 's2')]
+        assert first.write(readings) == 2
+        assert second.write([dict(r, timestamp=r['timestamp'] + timedelta(seconds=1)) for r in readings]) == 0
+
+    assert len(log_rows(path)) == 6
+
+
+def test_shared_observations_are_logged_once(tmp_path):
+    path = tmp_path / 'readings.csv'
+    log = ReadingLog(str(path), takeover_after=0)  # 毎回書き込み担当を引き継ぐ
+    sessions = [log.session() for _ in range(3)]
+    observation = reading(datetime(2026, 8, 1, 12, 0), '屋外/気象観測')
+
+    assert [session.write([observation]) for session in sessions] == [1, 0, 0]
+    later = dict(observation, timestamp=observation['timestamp'] + timedelta(minutes=10))
+    assert [session.write([observation, later]) for session in sessions] == [1, 0, 0]
+
+    assert [sensor for _, sensor in log_rows(path)] == ['屋外/気象観測'] * 2
+
+
+def test_released_session_is_taken_over(tmp_path):
+    path = tmp_path / 'readings.csv'
+    log = ReadingLog(str(path), takeover_after=60)
+    first, second = log.session(), log.session()
+    t0 = datetime(2026, 8, 1, 12, 0)
+
+    assert first.write([reading(t0)]) == 1
+    assert second.write([reading(t0 + timedelta(seconds=1))]) == 0
+    first.release()
+    assert second.write([reading(t0 + timedelta(seconds=2))]) == 1
+    assert first.write([reading(t0 + timedelta(seconds=3))]) == 0
+
+    assert len(log_rows(path)) == 2
+
+
+def test_alert_transitions_follow_state_machine():
+    machine = AlertStateMachine(hysteresis_di=1.0, hysteresis_wbgt=0.5, min_dwell=60,
+                                renotify_after=0, state_file='')
+    t0 = datetime(2026, 8, 1, 12, 0)
+    # 注意↔安全の変化、閾値（WBGT 28）付近の往復、警戒への上昇と復帰
+    wbgts = [20.0, 25.5, 24.0, 25.5, 27.9, 28.1, 27.9, 28.1, 27.9, 26.0]
+    readings = [transition(t0 + timedelta(seconds=30 * i), wbgt) for i, wbgt in enumerate(wbgts)]
+
+    rows = list(iter_alert_transitions(readings, machine))
+
+    assert [(r['from_level'], r['to_level'], r['notified']) for r in rows] == [
+        ('caution', 'warning', True),
+        ('warning', 'caution', False)
+    ]
+    assert rows[0]['timestamp'] == readings[5]['timestamp']
+    assert rows[1]['timestamp'] == readings[9]['timestamp']
@@ -0,0 +1,281 @@
+"""
+notifiersのテスト
+模擬サーバー（mock_notification_servers・mock_line_server）に対して、各チャネルへの配信と、
+遅いチャネルが他のチャネルの送信を遅らせないことを確認する
+"""
+import gc
+import threading
+import time
+
+import pytest
+
+from alert_state import AlertStateMachine
+from heatstroke import HEATSTROKE_LEVELS
+from line_notifier import MAX_DIGEST_ATTEMPTS, LineNotifier
+from mock_line_server import MockLineServer
+from mock_notification_servers import MockSmtpServer, MockSyslogServer, MockWebhookServer
+from monitoring import init_session_state
+from notifiers import (
+    EmailNotifier, LineChannel, NotificationDispatcher, Notifier, SyslogNotifier, WebhookNotifier,
+    build_alert_payload
+)
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(server):
+        server.start()
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.stop()
+
+
+def make_payload(sensor_id='本館/1F/101/s1', risk_level='danger') -> dict:
+    return build_alert_payload(33.5, 70.0, 86.2, 31.4, risk_level, sensor_id=sensor_id)
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    """条件を満たすまで待機"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def coalescing_notifier(server) -> LineNotifier:
+    """明示的なflushでのみ送信するまとめ送信のLineNotifier（待ち時間を長くしてタイマーを使わない）"""
+    return LineNotifier(channel_access_token='test-token', user_id='test-user',
+                        coalesce_window=60, endpoint=server.endpoint, timeout=2.0)
+
+
+def enqueue(line_notifier: LineNotifier, sensor_id: str, risk_level: str):
+    payload = make_payload(sensor_id=sensor_id, risk_level=risk_level)
+    line_notifier.send_discomfort_alert(
+        payload['temperature'], payload['humidity'], payload['discomfort_index'], payload['wbgt'],
+        risk_level, HEATSTROKE_LEVELS[risk_level], sensor_id=sensor_id
+    )
+
+
+def bubble_alerts(message: dict) -> list:
+    """受信したメッセージの (センサーID, レベル表示名) のリスト"""
+    contents = message['contents']
+    bubbles = contents['contents'] if contents['type'] == 'carousel' else [contents]
+    alerts = []
+    for bubble in bubbles:
+        texts = [item.get('text', '') for item in bubble['body']['contents']]
+        alerts.append((texts[1][2:], texts[0]))
+    return alerts
+
+
+def notify_threads() -> list:
+    return [t for t in threading.enumerate() if t.name.startswith('notify-')]
+
+
+def test_notifier_requires_send():
+    with pytest.raises(TypeError):
+        Notifier()
+
+
+def test_webhook_delivery(servers):
+    server = servers(MockWebhookServer())
+    dispatcher = NotificationDispatcher([WebhookNotifier(server.url, timeout=2.0)])
+
+    futures = dispatcher.dispatch(make_payload())
+    assert all(future.result(5) for future in futures.values())
+    dispatcher.close()
+
+    [message] = server.messages()
+    assert message['risk_level'] == 'danger'
+    assert message['sensor_id'] == '本館/1F/101/s1'
+    assert dispatcher.metrics()[0]['sent'] == 1
+
+
+def test_email_delivery(servers):
+    server = servers(MockSmtpServer())
+    host, port = server.address
+    channel = EmailNotifier(host, port, sender='monitor@example.com', recipients=['alerts@example.com'],
+                            timeout=2.0)
+    dispatcher = NotificationDispatcher([channel])
+
+    dispatcher.dispatch(make_payload())
+    dispatcher.close()
+
+    [message] = server.messages()
+    assert message['to'] == ['<alerts@example.com>']
+    assert '危険' in message['subject']
+    assert '本館/1F/101/s1' in message['body']
+
+
+def test_syslog_delivery(servers):
+    server = servers(MockSyslogServer())
+    host, port = server.address
+    dispatcher = NotificationDispatcher([SyslogNotifier(host, port, timeout=2.0)])
+
+    dispatcher.dispatch(make_payload(risk_level='warning'))
+    dispatcher.close()
+
+    assert wait_for(lambda: server.messages())
+    [line] = server.messages()
+    assert line.startswith('<132>')  # local0 (16) * 8 + warning (4)
+    assert 'heatstroke:' in line
+
+
+def test_line_delivery(servers):
+    server = servers(MockLineServer())
+    line_notifier = LineNotifier(channel_access_token='test-token', user_id='test-user',
+                                 coalesce_window=0, endpoint=server.endpoint, timeout=2.0)
+    dispatcher = NotificationDispatcher([LineChannel(line_notifier)])
+
+    dispatcher.dispatch(make_payload())
+    dispatcher.close()
+
+    [(_, message)] = server.delivered_messages()
+    assert message['type'] == 'flex'
+
+
+def test_digest_keeps_highest_level_per_sensor(servers):
+    server = servers(MockLineServer())
+    line_notifier = coalescing_notifier(server)
+
+    enqueue(line_notifier, 's1', 'warning')
+    enqueue(line_notifier, 's2', 'warning')
+    enqueue(line_notifier, 's1', 'danger')
+    enqueue(line_notifier, 's1', 'severe_warning')
+    assert line_notifier.flush()
+
+    [(_, message)] = server.delivered_messages()
+    assert bubble_alerts(message) == [('s1', HEATSTROKE_LEVELS['danger']['label']),
+                                      ('s2', HEATSTROKE_LEVELS['warning']['label'])]
+
+
+def test_failed_digest_is_retried(servers):
+    # 2件目のリクエストのみ5xxを返す
+    server = servers(MockLineServer(error_burst_every=2, error_burst_length=1))
+    line_notifier = coalescing_notifier(server)
+
+    enqueue(line_notifier, 's1', 'warning')
+    assert line_notifier.flush()
+    enqueue(line_notifier, 's2', 'danger')
+    assert not line_notifier.flush()
+    assert [a['sensor_id'] for a in line_notifier._pending] == ['s2']
+
+    enqueue(line_notifier, 's3', 'warning')
+    assert line_notifier.flush()
+    delivered = [bubble_alerts(message) for _, message in server.delivered_messages()]
+    assert delivered[-1] == [('s2', HEATSTROKE_LEVELS['danger']['label']),
+                             ('s3', HEATSTROKE_LEVELS['warning']['label'])]
+
+
+def test_digest_is_dropped_after_max_attempts(servers):
+    server = servers(MockLineServer(error_burst_every=1, error_burst_length=1))  # 常に5xx
+    line_notifier = coalescing_notifier(server)
+
+    enqueue(line_notifier, 's1', 'danger')
+    for _ in range(MAX_DIGEST_ATTEMPTS):
+        assert not line_notifier.flush()
+
+    assert line_notifier._pending == []
+    assert line_notifier._flush_timer is None
+    assert 's1' not in line_notifier.last_sent_levels
+    assert len(server.requests) == MAX_DIGEST_ATTEMPTS
+
+
+def test_line_channel_enforces_notify_timeout(servers, monkeypatch):
+    server = servers(MockLineServer(timeout_rate=1.0, hang_seconds=3.0))  # 応答を返さない
+    monkeypatch.setenv('LINE_CHANNEL_ACCESS_TOKEN', 'test-token')
+    monkeypatch.setenv('LINE_USER_ID', 'test-user')
+    monkeypatch.setenv('LINE_API_ENDPOINT', server.endpoint)
+    monkeypatch.setenv('LINE_COALESCE_SECONDS', '0')
+    monkeypatch.setenv('NOTIFY_TIMEOUT_SECONDS', '0.5')
+    for name in ('NOTIFY_WEBHOOK_URL', 'SMTP_HOST', 'SYSLOG_ADDRESS', 'READINGS_LOG'):
+        monkeypatch.delenv(name, raising=False)
+    state = {'alert_state': AlertStateMachine(state_file='')}
+    init_session_state(state)
+
+    [future] = state['notifier'].dispatch(make_payload()).values()
+    started = time.perf_counter()
+    assert future.result(5) is False
+    assert time.perf_counter() - started < 2.0
+    state['notifier'].close()
+
+    [metrics] = state['notifier'].metrics()
+    assert metrics['channel'] == 'line'
+    assert metrics['failed'] == 1 and metrics['timed_out'] == 1
+
+
+def test_slow_channel_does_not_delay_others(servers):
+    slow = servers(MockWebhookServer(latency=1.0))
+    syslog = servers(MockSyslogServer())
+    smtp = servers(MockSmtpServer())
+    dispatcher = NotificationDispatcher([
+        WebhookNotifier(slow.url, timeout=3.0),
+        SyslogNotifier(*syslog.address, timeout=2.0),
+        EmailNotifier(*smtp.address, sender='monitor@example.com', recipients=['alerts@example.com'],
+                      timeout=2.0)
+    ])
+
+    started = time.perf_counter()
+    for i in range(3):
+        dispatcher.dispatch(make_payload(sensor_id=f"s{i}"))
+    assert time.perf_counter() - started < 0.2  # 送信の完了は待たない
+
+    assert wait_for(lambda: len(syslog.messages()) == 3 and len(smtp.messages()) == 3, timeout=0.9)
+    assert slow.messages() == []
+
+    dispatcher.close()
+    assert len(slow.messages()) == 3
+    sent = {m['channel']: m['sent'] for m in dispatcher.metrics()}
+    assert sent == {'webhook': 3, 'syslog': 3, 'email': 3}
+
+
+def test_channels_of_same_type_are_independent(servers):
+    slow = servers(MockWebhookServer(latency=1.0))
+    fast = servers(MockWebhookServer())
+    dispatcher = NotificationDispatcher([
+        WebhookNotifier(slow.url, timeout=3.0),
+        WebhookNotifier(fast.url, timeout=3.0)
+    ])
+
+    dispatcher.dispatch(make_payload())
+    assert wait_for(lambda: fast.messages(), timeout=0.5)
+    assert slow.messages() == []
+
+    dispatcher.close()
+    slow_metrics, fast_metrics = dispatcher.metrics()
+    assert slow_metrics['sent'] == 1 and fast_metrics['sent'] == 1
+    assert slow_metrics['p50_ms'] > 900 > fast_metrics['p50_ms']
+
+
+def test_close_stops_threads_and_dispatch_restarts(servers):
+    server = servers(MockWebhookServer())
+    before = len(notify_threads())
+    dispatcher = NotificationDispatcher([WebhookNotifier(server.url, timeout=2.0)])
+
+    dispatcher.dispatch(make_payload(sensor_id='s1'))
+    dispatcher.close()
+    assert len(notify_threads()) == before
+
+    dispatcher.dispatch(make_payload(sensor_id='s2'))
+    dispatcher.close()
+    assert [m['sensor_id'] for m in server.messages()] == ['s1', 's2']
+    assert dispatcher.metrics()[0]['sent'] == 2
+
+
+def test_released_dispatcher_stops_threads(servers):
+    server = servers(MockWebhookServer())
+    before = len(notify_threads())
+    dispatcher = NotificationDispatcher([WebhookNotifier(server.url, timeout=2.0)])
+    [future] = dispatcher.dispatch(make_payload()).values()
+    future.result(5)
+
+    del dispatcher, future
+    gc.collect()
+    assert wait_for(lambda: len(notify_threads()) == before)
+    assert len(server.messages()) == 1
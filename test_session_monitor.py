@@ -0,0 +1,74 @@
+"""
+session_monitorのテスト
+閉じられたタブ（休止中のものを含む）の集計が取り除かれ、集計が増え続けないことを確認する
+"""
+import time
+
+import pytest
+
+import session_monitor
+
+
+@pytest.fixture(autouse=True)
+def registry():
+    session_monitor._registry.clear()
+    yield session_monitor._registry
+    session_monitor._registry.clear()
+
+
+def run_session(session_id: str, paused: bool = False) -> dict:
+    state = {'sensor_data': {'timestamp': []}, 'alert_history': []}
+    session_monitor.begin_run(session_id, state)
+    session_monitor.end_run(session_id, state)
+    if paused:
+        session_monitor.pause_session(session_id, state)
+    return state
+
+
+def age(registry: dict, session_id: str, minutes: float):
+    registry[session_id]['last_seen'] -= minutes * 60
+
+
+def test_paused_session_is_kept_while_open(registry):
+    run_session('open', paused=True)
+    age(registry, 'open', 120)
+
+    stats = session_monitor.session_stats(is_active=lambda sid: True)
+
+    assert [entry['session_id'] for entry in stats] == ['open']
+    assert stats[0]['paused']
+
+
+def test_closed_paused_session_is_removed(registry):
+    run_session('closed', paused=True)
+    run_session('open', paused=True)
+
+    stats = session_monitor.session_stats(is_active=lambda sid: sid == 'open')
+
+    assert [entry['session_id'] for entry in stats] == ['open']
+
+
+def test_paused_session_expires_without_status(registry):
+    run_session('kiosk', paused=True)
+    age(registry, 'kiosk', session_monitor.DEFAULT_PAUSED_MAX_AGE_MINUTES + 1)
+
+    assert session_monitor.session_stats() == []
+
+
+def test_inactive_running_session_expires(registry):
+    run_session('recent')
+    run_session('stale')
+    age(registry, 'stale', 61)
+
+    assert [entry['session_id'] for entry in session_monitor.session_stats()] == ['recent']
+
+
+def test_end_run_prunes_closed_sessions(registry, monkeypatch):
+    run_session('closed', paused=True)
+    monkeypatch.setattr(session_monitor, '_last_pruned', time.time() - session_monitor.PRUNE_INTERVAL_SECONDS)
+
+    state = {'sensor_data': {'timestamp': []}, 'alert_history': []}
+    session_monitor.begin_run('viewer', state)
+    session_monitor.end_run('viewer', state, is_active=lambda sid: sid == 'viewer')
+
+    assert set(registry) == {'viewer'}
@@ -0,0 +1,128 @@
+"""
+threshold_sweepのテスト
+候補をまとめて計算した結果が、候補ごとに閾値を設定してget_heatstroke_riskで1件ずつ判定した結果と
+一致することを確認する
+"""
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import threshold_sweep
+from heatstroke import apply_thresholds, get_heatstroke_risk, get_thresholds
+from threshold_sweep import LEVEL_NAMES, WARNING_INDEX, History, risk_levels, sweep, threshold_grid
+
+MAX_GAP = 600.0
+
+
+@pytest.fixture(autouse=True)
+def restore_thresholds():
+    thresholds = get_thresholds()
+    yield
+    apply_thresholds(thresholds)
+
+
+def random_readings(seed: int = 0) -> list:
+    """閾値付近を上下する3台のセンサーの測定値（欠測区間を含み、順序はばらばら）"""
+    rng = random.Random(seed)
+    readings = []
+    t0 = datetime(2026, 8, 1, 9, 0)
+    for sensor_id in ('本館/1F/s1', '本館/2F/s1', '屋外/s1'):
+        t, di, wbgt = t0, 78.0, 27.0
+        for _ in range(300):
+            t += timedelta(seconds=rng.choice([30, 60, 60, 90, 1200]))
+            di = min(95.0, max(65.0, di + rng.uniform(-1.5, 1.6)))
+            wbgt = min(38.0, max(20.0, wbgt + rng.uniform(-0.8, 0.85)))
+            readings.append({'timestamp': t, 'sensor_id': sensor_id,
+                             'discomfort_index': round(di, 1), 'wbgt': round(wbgt, 1)})
+    rng.shuffle(readings)
+    return readings
+
+
+def loop_results(readings: list, thresholds: dict, baseline: dict) -> dict:
+    """1件ずつ判定して、sweepと同じ項目を数える"""
+    def levels_for(values):
+        apply_thresholds(values)
+        return [LEVEL_NAMES.index(get_heatstroke_risk(r['discomfort_index'], r['wbgt'])) for r in ordered]
+
+    ordered = sorted(readings, key=lambda r: (r['sensor_id'], r['timestamp']))
+    base_levels = levels_for(baseline)
+    levels = levels_for(thresholds)
+
+    alerts = [0] * (len(LEVEL_NAMES) - WARNING_INDEX)
+    notifications = 0
+    time_in_level = [0.0] * len(LEVEL_NAMES)
+    leads, missed = [], 0
+    for i, reading in enumerate(ordered):
+        first = i == 0 or ordered[i - 1]['sensor_id'] != reading['sensor_id']
+        if first:
+            prev = base_prev = notified = alert_start = None
+        level = levels[i]
+
+        if level >= WARNING_INDEX:
+            if level != prev:
+                alerts[level - WARNING_INDEX] += 1
+            if prev is None or prev < WARNING_INDEX:
+                alert_start = reading['timestamp']
+            if notified is None or level > notified:
+                notifications += 1
+                notified = level
+        else:
+            notified = alert_start = None
+
+        last = i + 1 == len(ordered) or ordered[i + 1]['sensor_id'] != reading['sensor_id']
+        if not last:
+            gap = (ordered[i + 1]['timestamp'] - reading['timestamp']).total_seconds()
+            time_in_level[level] += min(gap, MAX_GAP)
+
+        if base_levels[i] == len(LEVEL_NAMES) - 1 and base_prev != base_levels[i]:
+            if alert_start is None:
+                missed += 1
+            else:
+                leads.append((reading['timestamp'] - alert_start).total_seconds())
+        prev, base_prev = level, base_levels[i]
+
+    return {
+        'alerts': alerts, 'notifications': notifications, 'time_in_level': time_in_level,
+        'lead_time_mean': np.mean(leads) if leads else np.nan,
+        'lead_time_min': min(leads) if leads else np.nan,
+        'missed': missed
+    }
+
+
+def test_risk_levels_match_per_reading():
+    readings = random_readings()
+    history = History.from_readings(readings, MAX_GAP)
+    baseline = get_thresholds()
+    di_thresholds, wbgt_thresholds, _ = threshold_grid([-3, 0, 2], [-1.5, 0, 1])
+
+    levels = risk_levels(history, di_thresholds, wbgt_thresholds)
+
+    for c in range(len(di_thresholds)):
+        apply_thresholds({level: (di_thresholds[c, j], wbgt_thresholds[c, j])
+                          for j, level in enumerate(baseline)})
+        expected = [LEVEL_NAMES.index(get_heatstroke_risk(di, wbgt))
+                    for di, wbgt in zip(history.di.tolist(), history.wbgt.tolist())]
+        assert levels[c].tolist() == expected
+
+
+def test_sweep_matches_per_reading_loop(monkeypatch):
+    # 候補を複数のブロックに分けて評価する経路も通す
+    monkeypatch.setattr(threshold_sweep, 'BLOCK_CELLS', 2000)
+    readings = random_readings(1)
+    history = History.from_readings(readings, MAX_GAP)
+    baseline = get_thresholds()
+    di_thresholds, wbgt_thresholds, _ = threshold_grid(range(-3, 4), [-2, -1, 0, 1, 2])
+
+    results = sweep(history, di_thresholds, wbgt_thresholds, baseline)
+
+    for c in range(len(di_thresholds)):
+        thresholds = {level: (di_thresholds[c, j], wbgt_thresholds[c, j]) for j, level in enumerate(baseline)}
+        expected = loop_results(readings, thresholds, baseline)
+        assert results['alerts'][c].tolist() == expected['alerts']
+        assert results['notifications'][c] == expected['notifications']
+        assert results['missed'][c] == expected['missed']
+        np.testing.assert_allclose(results['time_in_level'][c], expected['time_in_level'])
+        np.testing.assert_allclose(results['lead_time_mean'][c], expected['lead_time_mean'])
+        np.testing.assert_allclose(results['lead_time_min'][c], expected['lead_time_min'])
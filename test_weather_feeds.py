@@ -0,0 +1,161 @@
+"""
+weather_feedsのテスト
+模擬サーバー（mock_weather_server）に対して、条件付きリクエスト・キャッシュの有効期限・
+同時の取得要求のまとめ・形式エラーのキャッシュ・観測値の取り込みを確認する
+"""
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+from mock_weather_server import MockWeatherServer
+from monitoring import make_offline_state
+from weather_feeds import FeedFetcher, ObservationFeed, WbgtForecastFeed, WeatherFeed, ingest_observations
+
+OBSERVATIONS = '/observations.json'
+FORECAST = '/wbgt_forecast.csv'
+
+
+class BrokenFeed(ObservationFeed):
+    """解析に失敗するフィード（想定外の形式の本文）"""
+
+    def parse(self, body: bytes) -> list:
+        raise TypeError("unexpected payload")
+
+
+@pytest.fixture
+def server():
+    server = MockWeatherServer(update_interval=3600)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def slow_server():
+    server = MockWeatherServer(update_interval=3600, latency=0.3)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_fetcher():
+    fetchers = []
+
+    def make(*feeds):
+        fetcher = FeedFetcher(list(feeds), timeout=5.0)
+        fetchers.append(fetcher)
+        return fetcher
+
+    yield make
+    for fetcher in fetchers:
+        fetcher.stop()
+
+
+def test_weather_feed_requires_parse():
+    with pytest.raises(TypeError):
+        WeatherFeed('feed', 'http://127.0.0.1/feed')
+
+
+def test_etag_returns_not_modified(server, make_fetcher):
+    fetcher = make_fetcher(ObservationFeed('observation', server.endpoint + OBSERVATIONS, ttl=0))
+
+    first = fetcher.refresh()['observation']
+    second = fetcher.refresh()['observation']
+
+    assert len(first) == 6
+    assert second == first
+    assert server.request_count(OBSERVATIONS) == {'total': 2, 'not_modified': 1}
+    assert fetcher.stats['not_modified'] == 1
+
+
+def test_if_modified_since_returns_not_modified(server, make_fetcher):
+    fetcher = make_fetcher(WbgtForecastFeed('wbgt_forecast', server.endpoint + FORECAST, point='44132', ttl=0))
+
+    first = fetcher.refresh()['wbgt_forecast']
+    # ETagを使わずLast-Modifiedのみで条件付きリクエストを送る
+    with fetcher._lock:
+        fetcher.entries['wbgt_forecast']['etag'] = None
+    second = fetcher.refresh()['wbgt_forecast']
+
+    assert len(first) == 8
+    assert second == first
+    assert server.request_count(FORECAST) == {'total': 2, 'not_modified': 1}
+
+
+def test_cache_is_reused_until_ttl_expires(server, make_fetcher):
+    fetcher = make_fetcher(ObservationFeed('observation', server.endpoint + OBSERVATIONS, ttl=0.5))
+
+    fetcher.refresh()
+    fetcher.refresh()
+    assert server.request_count(OBSERVATIONS)['total'] == 1
+
+    time.sleep(0.6)
+    fetcher.refresh()
+    assert server.request_count(OBSERVATIONS) == {'total': 2, 'not_modified': 1}
+
+
+def test_concurrent_requests_share_one_fetch(slow_server, make_fetcher):
+    fetcher = make_fetcher(ObservationFeed('observation', slow_server.endpoint + OBSERVATIONS, ttl=60))
+    results = []
+
+    def refresh():
+        results.append(fetcher.refresh()['observation'])
+
+    threads = [threading.Thread(target=refresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 8
+    assert all(result == results[0] for result in results)
+    assert slow_server.request_count(OBSERVATIONS)['total'] == 1
+
+
+def test_get_does_not_wait_and_joins_inflight_fetch(slow_server, make_fetcher):
+    fetcher = make_fetcher(ObservationFeed('observation', slow_server.endpoint + OBSERVATIONS, ttl=60))
+
+    started = time.perf_counter()
+    assert all(fetcher.get('observation') is None for _ in range(10))
+    assert time.perf_counter() - started < 0.3
+
+    fetcher.refresh()
+    assert fetcher.get('observation')
+    assert slow_server.request_count(OBSERVATIONS)['total'] == 1
+
+
+def test_parse_error_is_cached_until_ttl(server, make_fetcher):
+    fetcher = make_fetcher(BrokenFeed('observation', server.endpoint + OBSERVATIONS, ttl=60))
+
+    fetcher.refresh()
+    fetcher.refresh()
+    fetcher.get('observation')
+
+    assert server.request_count(OBSERVATIONS)['total'] == 1
+    assert 'TypeError' in fetcher.entries['observation']['error']
+    assert fetcher.entries['observation']['data'] is None
+    assert fetcher.stats['errors'] == 1
+
+
+def test_first_ingest_skips_backlog(server, make_fetcher):
+    fetcher = make_fetcher(ObservationFeed('observation', server.endpoint + OBSERVATIONS,
+                                           sensor_id='屋外/気象観測', ttl=60))
+    data = fetcher.refresh()['observation']
+    state = make_offline_state()
+
+    assert ingest_observations(state, fetcher) == 0
+    assert state['feed_seen']['observation'] == data[-1]['timestamp']
+    assert state['sensor_data']['timestamp'] == []
+
+    # 次の観測値が追加されたら、その分だけ取り込む
+    latest = dict(data[-1], timestamp=data[-1]['timestamp'] + timedelta(minutes=10))
+    with fetcher._lock:
+        fetcher.entries['observation']['data'] = data + [latest]
+
+    assert ingest_observations(state, fetcher) == 1
+    assert state['sensor_data']['timestamp'] == [latest['timestamp']]
+    assert state['sensor_data']['sensor_id'] == ['屋外/気象観測']
+    assert ingest_observations(state, fetcher) == 0
@@ -0,0 +1,95 @@
+"""
+zone_indexのテスト
+ランダムな更新の後もゾーンごとの最大値が全件の比較と一致すること、古いエントリの削除・再構築で
+ヒープが肥大化しないこと、測定値が途絶えたセンサーが取り除かれることを確認する
+"""
+import random
+from datetime import datetime, timedelta
+
+from zone_index import RISK_RANK, ZoneRiskIndex, zone_ancestors
+
+LEVELS = list(RISK_RANK)
+
+
+def brute_force_max(latest: dict, zone: str):
+    """ゾーン内の全センサーの最新値から最大のものを求める"""
+    members = [value for sensor_id, value in latest.items() if zone in zone_ancestors(sensor_id)]
+    if not members:
+        return None
+    return max(members, key=lambda v: (RISK_RANK[v['risk_level']], v['wbgt'], v['di']))
+
+
+def test_zone_ancestors():
+    assert zone_ancestors('本館/2F/会議室A/sensor-1') == ['', '本館', '本館/2F', '本館/2F/会議室A']
+    assert zone_ancestors('sensor-1') == ['']
+
+
+def test_zone_max_matches_brute_force():
+    rng = random.Random(0)
+    index = ZoneRiskIndex(stale_after=0)
+    sensor_ids = [f"b{b}/f{f}/r{r}/s{s}" for b in range(2) for f in range(3) for r in range(2) for s in range(3)]
+    latest = {}
+    t0 = datetime(2026, 8, 1, 12, 0)
+
+    for step in range(3000):
+        sensor_id = rng.choice(sensor_ids)
+        value = {'sensor_id': sensor_id, 'risk_level': rng.choice(LEVELS),
+                 'wbgt': round(rng.uniform(20, 35), 1), 'di': round(rng.uniform(60, 90), 1),
+                 'timestamp': t0 + timedelta(seconds=step)}
+        index.update(sensor_id, value['risk_level'], value['wbgt'], value['di'], value['timestamp'])
+        latest[sensor_id] = value
+        if step % 500 == 499:
+            removed = rng.choice(list(latest))
+            index.remove(removed)
+            del latest[removed]
+
+        if step % 50 == 0:
+            for zone in [''] + index.zones():
+                expected = brute_force_max(latest, zone)
+                actual = index.zone_max(zone)
+                assert (actual['risk_level'], actual['wbgt'], actual['di']) == \
+                       (expected['risk_level'], expected['wbgt'], expected['di'])
+
+    # 古いエントリは再構築で取り除かれ、ヒープは有効なエントリ数に比例した大きさに保たれる
+    for zone, heap in index._heaps.items():
+        assert len(heap) <= 4 * index.sensor_count(zone) + 16
+    assert index.sensor_count() == len(latest)
+
+
+def test_removed_zone_disappears():
+    index = ZoneRiskIndex(stale_after=0)
+    index.update('本館/1F/101/s1', 'danger', 33.0, 85.0)
+    index.update('別館/1F/101/s1', 'caution', 26.0, 72.0)
+
+    index.remove('本館/1F/101/s1')
+
+    assert '本館' not in index.zones()
+    assert index.zone_max()['sensor_id'] == '別館/1F/101/s1'
+    assert index.sensor_count() == 1
+
+
+def test_offline_sensor_expires():
+    index = ZoneRiskIndex(stale_after=600)
+    t0 = datetime(2026, 8, 1, 12, 0)
+    index.update('本館/1F/101/s1', 'danger', 33.0, 85.0, t0)
+    for minute in range(0, 12):
+        index.update('本館/1F/102/s1', 'warning', 28.5, 76.0, t0 + timedelta(minutes=minute))
+
+    # 10分間測定値が届かなかったs1は取り除かれ、ゾーンの最大値は稼働中のセンサーになる
+    assert index.zone_max('本館')['sensor_id'] == '本館/1F/102/s1'
+    assert '本館/1F/101' not in index.zones()
+    assert index.sensor_count() == 1
+    assert len(index._expiry) <= 4 * index.sensor_count() + 16
+
+    # 全センサーが停止した場合は一覧の取得時に取り除く
+    assert index.overview(now=t0 + timedelta(hours=1)) == []
+    assert index.zone_max() is None
+
+
+def test_expiry_can_be_disabled():
+    index = ZoneRiskIndex(stale_after=0)
+    t0 = datetime(2026, 8, 1, 12, 0)
+    index.update('本館/1F/101/s1', 'danger', 33.0, 85.0, t0)
+
+    assert index.expire(t0 + timedelta(days=1)) == []
+    assert index.zone_max()['risk_level'] == 'danger'
@@ -0,0 +1,307 @@
+"""
+閾値シミュレーションモジュール
+過去の測定値に対して多数の閾値の候補をまとめて評価し、アラート数・通知数・リードタイムを比較する
+
+使い方:
+    python threshold_sweep.py readings_log.csv --di-offsets=-3:3:1 --wbgt-offsets=-2:2:0.5 --top 20
+
+各候補のリスクレベルは (候補数 × 測定値数) の配列として一括で計算する。
+通知数はレベル上昇時のみ通知する方式で数える（ヒステリシス・最低滞在時間は考慮しない）。
+リードタイムは、基準の閾値で「危険」に達した時点に対して、その候補で
+警戒レベル以上の通知が始まっていた時間の長さ。
+"""
+import argparse
+import itertools
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from heatstroke import HEATSTROKE_LEVELS, THRESHOLD_LEVELS, get_thresholds
+
+# リスクレベルの番号（0: 安全 ～ 4: 危険）
+LEVEL_NAMES = list(HEATSTROKE_LEVELS)
+WARNING_INDEX = LEVEL_NAMES.index('warning')
+DANGER_INDEX = LEVEL_NAMES.index('danger')
+
+# 1件の測定値が代表する時間の上限（秒、欠測区間を計上しないため）
+DEFAULT_MAX_GAP = 600.0
+
+# 一度に評価する (候補数 × 測定値数) の上限（作業用の配列が複数あるため、200万でピークのメモリは100MB以下）
+BLOCK_CELLS = 2_000_000
+
+
+class History:
+    """閾値シミュレーション用の測定値の履歴（センサー・時刻順に並べた配列）"""
+
+    def __init__(self, timestamps, sensor_ids, di, wbgt, max_gap: float = DEFAULT_MAX_GAP):
+        """
+        初期化
+
+        Args:
+            timestamps: 測定時刻（datetimeまたはUNIX時間）の配列
+            sensor_ids: センサーIDの配列
+            di: 不快指数の配列
+            wbgt: WBGTの配列
+            max_gap: 1件の測定値が代表する時間の上限（秒）
+        """
+        times = np.array([t.timestamp() if hasattr(t, 'timestamp') else t for t in timestamps], dtype=float)
+        sensors = pd.factorize(pd.Series(list(sensor_ids), dtype=object).fillna(''))[0]
+        order = np.lexsort((times, sensors))
+
+        self.times = times[order]
+        self.sensors = sensors[order]
+        self.di = np.asarray(di, dtype=float)[order]
+        self.wbgt = np.asarray(wbgt, dtype=float)[order]
+
+        # センサーの先頭の測定値
+        self.sensor_start = np.ones(len(self.times), dtype=bool)
+        self.sensor_start[1:] = self.sensors[1:] != self.sensors[:-1]
+
+        # 各測定値が代表する時間（同じセンサーの次の測定までの間隔）
+        gaps = np.zeros(len(self.times))
+        if len(self.times) > 1:
+            gaps[:-1] = np.diff(self.times)
+            gaps[:-1][self.sensor_start[1:]] = 0.0
+        self.durations = np.clip(gaps, 0.0, max_gap)
+
+    def __len__(self):
+        return len(self.times)
+
+    @classmethod
+    def from_readings(cls, readings, max_gap: float = DEFAULT_MAX_GAP) -> 'History':
+        """
+        測定値の辞書のイテラブルから作成
+
+        Args:
+            readings: exporterのiter_readings_from_*が返す測定値
+            max_gap: 1件の測定値が代表する時間の上限（秒）
+
+        Returns:
+            History
+        """
+        timestamps, sensor_ids, di, wbgt = [], [], [], []
+        for reading in readings:
+            timestamps.append(reading['timestamp'])
+            sensor_ids.append(reading['sensor_id'])
+            di.append(reading['discomfort_index'])
+            wbgt.append(reading['wbgt'])
+        return cls(timestamps, sensor_ids, di, wbgt, max_gap)
+
+
+def threshold_grid(di_offsets, wbgt_offsets, base: Optional[dict] = None) -> tuple:
+    """
+    基準の閾値をずらした候補を作成
+
+    Args:
+        di_offsets: 不快指数の閾値に加える値のリスト
+        wbgt_offsets: WBGTの閾値に加える値のリスト
+        base: 基準の閾値（省略時は現在の閾値）
+
+    Returns:
+        (不快指数の閾値 (候補数, 4), WBGTの閾値 (候補数, 4), [(不快指数のずれ, WBGTのずれ), ...])
+    """
+    base = base or get_thresholds()
+    base_di = np.array([base[level][0] for level in THRESHOLD_LEVELS], dtype=float)
+    base_wbgt = np.array([base[level][1] for level in THRESHOLD_LEVELS], dtype=float)
+    offsets = list(itertools.product(di_offsets, wbgt_offsets))
+    di_thresholds = np.array([base_di + d for d, _ in offsets])
+    wbgt_thresholds = np.array([base_wbgt + w for _, w in offsets])
+    return di_thresholds, wbgt_thresholds, offsets
+
+
+def risk_levels(history: History, di_thresholds: np.ndarray, wbgt_thresholds: np.ndarray) -> np.ndarray:
+    """
+    候補ごとのリスクレベルを計算
+
+    Args:
+        history: 測定値の履歴
+        di_thresholds: 不快指数の閾値 (候補数, 4)
+        wbgt_thresholds: WBGTの閾値 (候補数, 4)
+
+    Returns:
+        リスクレベルの番号 (候補数, 測定値数)
+    """
+    levels = np.zeros((len(di_thresholds), len(history)), dtype=np.int8)
+    for j in range(len(THRESHOLD_LEVELS)):
+        levels += ((history.di[None, :] >= di_thresholds[:, j, None])
+                   | (history.wbgt[None, :] >= wbgt_thresholds[:, j, None]))
+    return levels
+
+
+def sweep(history: History, di_thresholds: np.ndarray, wbgt_thresholds: np.ndarray,
+          baseline: Optional[dict] = None) -> dict:
+    """
+    閾値の候補をまとめて評価
+
+    Args:
+        history: 測定値の履歴
+        di_thresholds: 不快指数の閾値 (候補数, 4)
+        wbgt_thresholds: WBGTの閾値 (候補数, 4)
+        baseline: リードタイムの基準となる閾値（省略時は現在の閾値）
+
+    Returns:
+        評価結果の辞書（各値は候補数を先頭の次元に持つ配列）:
+            alerts: 警戒レベル以上への遷移回数 (候補数, 3)
+            notifications: 通知数 (候補数,)
+            time_in_level: レベルごとの滞在時間（秒） (候補数, 5)
+            lead_time_mean: 平均リードタイム（秒、基準の危険到達がない場合はNaN） (候補数,)
+            lead_time_min: 最小リードタイム（秒） (候補数,)
+            missed: 基準の危険到達時に警戒レベル未満だった回数 (候補数,)
+    """
+    di_thresholds = np.asarray(di_thresholds, dtype=float)
+    wbgt_thresholds = np.asarray(wbgt_thresholds, dtype=float)
+    count = len(di_thresholds)
+
+    baseline = baseline or get_thresholds()
+    base_levels = risk_levels(
+        history,
+        np.array([[baseline[level][0] for level in THRESHOLD_LEVELS]]),
+        np.array([[baseline[level][1] for level in THRESHOLD_LEVELS]])
+    )[0]
+    base_prev = np.where(history.sensor_start, -1, np.roll(base_levels, 1))
+    danger_onsets = np.nonzero((base_levels == DANGER_INDEX) & (base_prev != DANGER_INDEX))[0]
+
+    results = {
+        'alerts': np.zeros((count, len(LEVEL_NAMES) - WARNING_INDEX), dtype=np.int64),
+        'notifications': np.zeros(count, dtype=np.int64),
+        'time_in_level': np.zeros((count, len(LEVEL_NAMES))),
+        'lead_time_mean': np.full(count, np.nan),
+        'lead_time_min': np.full(count, np.nan),
+        'missed': np.zeros(count, dtype=np.int64)
+    }
+    if len(history) == 0:
+        return results
+
+    block = max(1, BLOCK_CELLS // len(history))
+    for start in range(0, count, block):
+        end = min(count, start + block)
+        _evaluate_block(history, di_thresholds[start:end], wbgt_thresholds[start:end],
+                        danger_onsets, results, slice(start, end))
+    return results
+
+
+def _evaluate_block(history: History, di_thresholds, wbgt_thresholds, danger_onsets,
+                    results: dict, target: slice):
+    """候補の一部をまとめて評価して結果に書き込む"""
+    levels = risk_levels(history, di_thresholds, wbgt_thresholds)
+    n = len(history)
+
+    # 直前の測定値のレベル（センサーの先頭は-1）
+    prev = np.empty_like(levels)
+    prev[:, 0] = -1
+    prev[:, 1:] = levels[:, :-1]
+    prev[:, history.sensor_start] = -1
+
+    # 警戒レベル以上への遷移
+    changed = (levels != prev) & (levels >= WARNING_INDEX)
+    for i, level in enumerate(range(WARNING_INDEX, len(LEVEL_NAMES))):
+        results['alerts'][target, i] = (changed & (levels == level)).sum(axis=1)
+
+    # レベルごとの滞在時間
+    for level in range(len(LEVEL_NAMES)):
+        results['time_in_level'][target, level] = ((levels == level) * history.durations).sum(axis=1)
+
+    # 通知数: 警戒レベル未満に戻るまでの一連のアラート内で最大レベルが上がった回数
+    alerting = levels >= WARNING_INDEX
+    episode = np.cumsum(~alerting | history.sensor_start, axis=1)
+    key = episode * len(LEVEL_NAMES) + np.where(alerting, levels, 0)
+    running_max = np.maximum.accumulate(key, axis=1)
+    prev_max = np.empty_like(running_max)
+    prev_max[:, 0] = -1
+    prev_max[:, 1:] = running_max[:, :-1]
+    results['notifications'][target] = (alerting & (running_max > prev_max)).sum(axis=1)
+
+    # リードタイム: 基準の危険到達時点で、その候補の一連のアラートが始まってからの時間
+    if len(danger_onsets):
+        alert_start = alerting & ((prev < WARNING_INDEX) | history.sensor_start)
+        start_index = np.maximum.accumulate(np.where(alert_start, np.arange(n), -1), axis=1)
+        onset_start = start_index[:, danger_onsets]
+        in_alert = alerting[:, danger_onsets] & (onset_start >= 0)
+        lead = np.where(in_alert,
+                        history.times[danger_onsets][None, :] - history.times[np.maximum(onset_start, 0)],
+                        np.nan)
+        results['missed'][target] = (~in_alert).sum(axis=1)
+        hits = in_alert.sum(axis=1)
+        results['lead_time_mean'][target] = np.where(
+            hits > 0, np.where(in_alert, lead, 0.0).sum(axis=1) / np.maximum(hits, 1), np.nan)
+        results['lead_time_min'][target] = np.where(
+            hits > 0, np.where(in_alert, lead, np.inf).min(axis=1), np.nan)
+
+
+def summarize(results: dict, di_thresholds, wbgt_thresholds, labels=None) -> pd.DataFrame:
+    """
+    評価結果を表にまとめる
+
+    Args:
+        results: sweepの結果
+        di_thresholds: 不快指数の閾値 (候補数, 4)
+        wbgt_thresholds: WBGTの閾値 (候補数, 4)
+        labels: 候補の名前のリスト（省略可）
+
+    Returns:
+        候補ごとの評価結果のDataFrame
+    """
+    data = {}
+    if labels is not None:
+        data['候補'] = labels
+    for j, level in enumerate(THRESHOLD_LEVELS):
+        label = HEATSTROKE_LEVELS[level]['label']
+        data[f'DI:{label}'] = np.asarray(di_thresholds)[:, j]
+        data[f'WBGT:{label}'] = np.asarray(wbgt_thresholds)[:, j]
+    for i, level in enumerate(LEVEL_NAMES[WARNING_INDEX:]):
+        data[f'アラート:{HEATSTROKE_LEVELS[level]["label"]}'] = results['alerts'][:, i]
+    data['通知数'] = results['notifications']
+    for level, name in enumerate(LEVEL_NAMES):
+        data[f'滞在(分):{HEATSTROKE_LEVELS[name]["label"]}'] = np.round(results['time_in_level'][:, level] / 60, 1)
+    data['平均リードタイム(分)'] = np.round(results['lead_time_mean'] / 60, 1)
+    data['最小リードタイム(分)'] = np.round(results['lead_time_min'] / 60, 1)
+    data['見逃し'] = results['missed']
+    return pd.DataFrame(data)
+
+
+def parse_range(text: str) -> list:
+    """
+    "開始:終了:刻み" 形式またはカンマ区切りの値を展開
+
+    Args:
+        text: 範囲の指定（例: "-3:3:1", "-1,0,1"）
+
+    Returns:
+        値のリスト
+    """
+    if ':' in text:
+        start, stop, step = (float(v) for v in text.split(':'))
+        return [round(v, 6) for v in np.arange(start, stop + step / 2, step)]
+    return [float(v) for v in text.split(',')]
+
+
+def main():
+    from exporter import iter_readings_from_log
+
+    parser = argparse.ArgumentParser(description="閾値シミュレーション")
+    parser.add_argument('log', help="測定値ログ（CSV）のパス")
+    parser.add_argument('--di-offsets', default='-3:3:1', help="不快指数の閾値のずれ（例: -3:3:1）")
+    parser.add_argument('--wbgt-offsets', default='-2:2:0.5', help="WBGTの閾値のずれ（例: -2:2:0.5）")
+    parser.add_argument('--max-gap', type=float, default=DEFAULT_MAX_GAP, help="1件の測定値が代表する時間の上限（秒）")
+    parser.add_argument('--sort', default='通知数', help="並べ替えに使う列")
+    parser.add_argument('--top', type=int, default=20, help="表示する候補数")
+    parser.add_argument('-o', '--output', help="全候補の結果を書き出すCSVのパス")
+    args = parser.parse_args()
+
+    history = History.from_readings(iter_readings_from_log(args.log), args.max_gap)
+    di_thresholds, wbgt_thresholds, offsets = threshold_grid(parse_range(args.di_offsets),
+                                                             parse_range(args.wbgt_offsets))
+    results = sweep(history, di_thresholds, wbgt_thresholds)
+    table = summarize(results, di_thresholds, wbgt_thresholds,
+                      labels=[f"DI{d:+g} / WBGT{w:+g}" for d, w in offsets])
+
+    print(f"測定値: {len(history)}件, 候補: {len(offsets)}件")
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(table.sort_values(args.sort).head(args.top).to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
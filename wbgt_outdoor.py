@@ -0,0 +1,303 @@
+"""
+屋外WBGT計算モジュール
+Liljegrenらの方法で黒球温度・自然湿球温度を求め、日射と風を考慮したWBGTを計算する
+
+参考: Liljegren, J. C. et al. (2008) "Modeling the Wet Bulb Globe Temperature
+Using Standard Meteorological Measurements", J. Occup. Environ. Hyg. 5(10)
+
+黒球温度・自然湿球温度の熱収支式は反復計算で解く。入力はNumPy配列として
+まとめて受け取り、未収束の要素だけを対象に全要素を同時に反復する。
+"""
+import numpy as np
+
+# 物理定数
+STEFANB = 5.6696e-8          # ステファン・ボルツマン定数（W/m²K⁴）
+CP = 1003.5                  # 乾燥空気の定圧比熱（J/kgK）
+M_AIR = 28.97                # 乾燥空気の分子量
+M_H2O = 18.015               # 水の分子量
+R_GAS = 8314.34              # 気体定数（J/kmolK）
+R_AIR = R_GAS / M_AIR
+PR = CP / (CP + 1.25 * R_AIR)  # プラントル数
+RATIO = CP * M_AIR / M_H2O
+SOLAR_CONST = 1367.0         # 太陽定数（W/m²）
+
+# 黒球（直径2インチ）
+D_GLOBE = 0.0508
+EMIS_GLOBE = 0.95
+ALB_GLOBE = 0.05
+
+# 湿球の芯
+D_WICK = 0.007
+L_WICK = 0.0254
+EMIS_WICK = 0.95
+ALB_WICK = 0.4
+
+# 地表面
+EMIS_SFC = 0.999
+ALB_SFC = 0.45
+
+MIN_SPEED = 0.13             # 風速の下限（m/s）
+CZA_MIN = np.cos(np.radians(89.5))
+CONVERGENCE = 0.02
+MAX_ITER = 50
+
+DEFAULT_PRESSURE = 1013.25   # 気圧（hPa）
+
+
+def _esat(tk):
+    """飽和水蒸気圧（hPa、水面上、増大係数込み）"""
+    y = (tk - 273.15) / (tk - 32.18)
+    return 1.004 * 6.1121 * np.exp(17.502 * y)
+
+
+def _dew_point(e):
+    """水蒸気圧（hPa）から露点温度（K）を求める"""
+    z = np.log(e / (6.1121 * 1.004))
+    return 273.15 + 240.97 * z / (17.502 - z)
+
+
+def _viscosity(tk):
+    """空気の粘性係数（kg/ms）"""
+    omega = (tk / 97.0 - 2.9) / 0.4 * (-0.034) + 1.048
+    return 2.6693e-6 * np.sqrt(M_AIR * tk) / (3.617 ** 2 * omega)
+
+
+def _thermal_cond(tk):
+    """空気の熱伝導率（W/mK）"""
+    return (CP + 1.25 * R_AIR) * _viscosity(tk)
+
+
+def _diffusivity(tk, pressure):
+    """空気中の水蒸気の拡散係数（m²/s）"""
+    pcrit13 = (36.4 * 218.0) ** (1.0 / 3.0)
+    tcrit512 = (132.0 * 647.3) ** (5.0 / 12.0)
+    tcrit12 = np.sqrt(132.0 * 647.3)
+    mmix = np.sqrt(1.0 / M_AIR + 1.0 / M_H2O)
+    return 3.64e-4 * (tk / tcrit12) ** 2.334 * pcrit13 * tcrit512 * mmix / (pressure / 1013.25) * 1e-4
+
+
+def _evap(tk):
+    """水の蒸発潜熱（J/kg）"""
+    return (313.15 - tk) / 30.0 * (-71100.0) + 2.4073e6
+
+
+def _emis_atm(tk, rh):
+    """大気の放射率"""
+    return 0.575 * (rh * _esat(tk)) ** 0.143
+
+
+def _h_sphere(tk, pressure, speed):
+    """球（黒球）の対流熱伝達率（W/m²K）"""
+    density = pressure * 100.0 / (R_AIR * tk)
+    re = speed * density * D_GLOBE / _viscosity(tk)
+    nu = 2.0 + 0.6 * np.sqrt(re) * PR ** 0.3333
+    return nu * _thermal_cond(tk) / D_GLOBE
+
+
+def _h_cylinder(tk, pressure, speed):
+    """円柱（湿球の芯）の対流熱伝達率（W/m²K）"""
+    density = pressure * 100.0 / (R_AIR * tk)
+    re = speed * density * D_WICK / _viscosity(tk)
+    nu = 0.281 * re ** 0.6 * PR ** 0.44
+    return nu * _thermal_cond(tk) / D_WICK
+
+
+def _solve(initial, step):
+    """
+    全要素の不動点反復をまとめて解く
+
+    Args:
+        initial: 初期値の配列
+        step: (前回値, 対象要素のインデックス) -> 新しい値 を返す関数
+
+    Returns:
+        収束値の配列（MAX_ITER回で収束しない要素は最後の値）
+    """
+    prev = initial.copy()
+    result = initial.copy()
+    active = np.arange(initial.size)
+    for _ in range(MAX_ITER):
+        if active.size == 0:
+            break
+        current = step(prev[active], active)
+        done = np.abs(current - prev[active]) < CONVERGENCE
+        result[active] = current
+        prev[active] = np.where(done, prev[active], 0.9 * prev[active] + 0.1 * current)
+        active = active[~done]
+    return result
+
+
+def direct_beam_fraction(solar, cza):
+    """
+    全天日射量のうち直達日射の割合を推定
+
+    Args:
+        solar: 全天日射量（W/m²）
+        cza: 太陽天頂角の余弦
+
+    Returns:
+        直達日射の割合（0-0.9）
+    """
+    solar = np.asarray(solar, dtype=float)
+    cza = np.asarray(cza, dtype=float)
+    toa = SOLAR_CONST * np.maximum(cza, CZA_MIN)
+    s_star = np.clip(solar / toa, 0.01, 0.85)
+    fdir = np.clip(np.exp(3.0 - 1.34 * s_star - 1.65 / s_star), 0.0, 0.9)
+    return np.where((cza > CZA_MIN) & (solar > 0), fdir, 0.0)
+
+
+def cos_solar_zenith(timestamps, latitude, longitude):
+    """
+    太陽天頂角の余弦を計算（簡易式）
+
+    Args:
+        timestamps: 測定時刻（UTC）の配列（numpy.datetime64に変換可能なもの）
+        latitude: 緯度（度）
+        longitude: 経度（度、東経が正）
+
+    Returns:
+        太陽天頂角の余弦の配列（夜間は0）
+    """
+    t = np.asarray(timestamps, dtype='datetime64[s]')
+    day_start = t.astype('datetime64[D]')
+    day_of_year = (day_start - day_start.astype('datetime64[Y]')).astype(float) + 1
+    hours = (t - day_start).astype(float) / 3600.0
+
+    gamma = 2 * np.pi / 365.0 * (day_of_year - 1 + (hours - 12) / 24)
+    decl = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+            - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+            - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+    eqtime = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                       - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    solar_time = hours * 60 + eqtime + 4 * np.asarray(longitude, dtype=float)
+    hour_angle = np.radians(solar_time / 4 - 180)
+
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    cza = np.sin(lat) * np.sin(decl) + np.cos(lat) * np.cos(decl) * np.cos(hour_angle)
+    return np.clip(cza, 0.0, 1.0)
+
+
+def globe_temperature(temp, humidity, wind_speed, solar, cza,
+                      pressure=DEFAULT_PRESSURE, fdir=None):
+    """
+    黒球温度を計算
+
+    Args:
+        temp: 気温（℃）
+        humidity: 相対湿度（%）
+        wind_speed: 風速（m/s）
+        solar: 全天日射量（W/m²）
+        cza: 太陽天頂角の余弦
+        pressure: 気圧（hPa）
+        fdir: 直達日射の割合（省略時は推定）
+
+    Returns:
+        黒球温度（℃）の配列
+    """
+    ta, rh, speed, solar, cza, pressure, fdir = _prepare(temp, humidity, wind_speed, solar, cza, pressure, fdir)
+    return _globe_temperature(ta, rh, speed, solar, cza, pressure, fdir) - 273.15
+
+
+def natural_wet_bulb_temperature(temp, humidity, wind_speed, solar, cza,
+                                 pressure=DEFAULT_PRESSURE, fdir=None):
+    """
+    自然湿球温度を計算
+
+    Args:
+        temp: 気温（℃）
+        humidity: 相対湿度（%）
+        wind_speed: 風速（m/s）
+        solar: 全天日射量（W/m²）
+        cza: 太陽天頂角の余弦
+        pressure: 気圧（hPa）
+        fdir: 直達日射の割合（省略時は推定）
+
+    Returns:
+        自然湿球温度（℃）の配列
+    """
+    ta, rh, speed, solar, cza, pressure, fdir = _prepare(temp, humidity, wind_speed, solar, cza, pressure, fdir)
+    return _wet_bulb_temperature(ta, rh, speed, solar, cza, pressure, fdir) - 273.15
+
+
+def outdoor_wbgt(temp, humidity, wind_speed, solar, cza,
+                 pressure=DEFAULT_PRESSURE, fdir=None):
+    """
+    屋外WBGTを計算
+
+    WBGT = 0.7 × 自然湿球温度 + 0.2 × 黒球温度 + 0.1 × 気温
+
+    Args:
+        temp: 気温（℃）
+        humidity: 相対湿度（%）
+        wind_speed: 風速（m/s）
+        solar: 全天日射量（W/m²）
+        cza: 太陽天頂角の余弦
+        pressure: 気圧（hPa）
+        fdir: 直達日射の割合（省略時は推定）
+
+    Returns:
+        WBGT（℃）の配列
+    """
+    ta, rh, speed, solar, cza, pressure, fdir = _prepare(temp, humidity, wind_speed, solar, cza, pressure, fdir)
+    tg = _globe_temperature(ta, rh, speed, solar, cza, pressure, fdir) - 273.15
+    tnwb = _wet_bulb_temperature(ta, rh, speed, solar, cza, pressure, fdir) - 273.15
+    return 0.7 * tnwb + 0.2 * tg + 0.1 * (ta - 273.15)
+
+
+def _prepare(temp, humidity, wind_speed, solar, cza, pressure, fdir):
+    """入力を同じ形の1次元配列（気温はK、湿度は比率）に揃える"""
+    arrays = np.broadcast_arrays(
+        np.asarray(temp, dtype=float), np.asarray(humidity, dtype=float),
+        np.asarray(wind_speed, dtype=float), np.asarray(solar, dtype=float),
+        np.asarray(cza, dtype=float), np.asarray(pressure, dtype=float)
+    )
+    ta, rh, speed, solar, cza, pressure = (a.ravel() for a in arrays)
+    cza = np.clip(cza, CZA_MIN, 1.0)
+    # 日射量は大気上端の値を超えない
+    solar = np.clip(solar, 0.0, SOLAR_CONST * cza)
+    if fdir is None:
+        fdir = direct_beam_fraction(solar, cza)
+    else:
+        fdir = np.broadcast_to(np.asarray(fdir, dtype=float), ta.shape)
+    return ta + 273.15, rh / 100.0, np.maximum(speed, MIN_SPEED), solar, cza, pressure, fdir
+
+
+def _globe_temperature(ta, rh, speed, solar, cza, pressure, fdir):
+    """黒球温度（K）を反復計算"""
+    tsfc = ta
+    radiation = 0.5 * (_emis_atm(ta, rh) * ta ** 4 + EMIS_SFC * tsfc ** 4)
+    shortwave = solar / (2 * STEFANB * EMIS_GLOBE) * (1 - ALB_GLOBE) * (fdir * (1 / (2 * cza) - 1) + 1 + ALB_SFC)
+
+    def step(prev, idx):
+        h = _h_sphere(0.5 * (prev + ta[idx]), pressure[idx], speed[idx])
+        balance = radiation[idx] - h / (STEFANB * EMIS_GLOBE) * (prev - ta[idx]) + shortwave[idx]
+        return np.maximum(balance, 0.0) ** 0.25
+
+    return _solve(ta.copy(), step)
+
+
+def _wet_bulb_temperature(ta, rh, speed, solar, cza, pressure, fdir):
+    """自然湿球温度（K）を反復計算"""
+    tsfc = ta
+    eair = rh * _esat(ta)
+    tan_sza = np.sqrt(1 - cza ** 2) / cza
+    radiation = 0.5 * (_emis_atm(ta, rh) * ta ** 4 + EMIS_SFC * tsfc ** 4)
+    shortwave = (1 - ALB_WICK) * solar * (
+        (1 - fdir) * (1 + 0.25 * D_WICK / L_WICK)
+        + fdir * (tan_sza / np.pi + 0.25 * D_WICK / L_WICK)
+        + ALB_SFC
+    )
+
+    def step(prev, idx):
+        t_air = ta[idx]
+        p = pressure[idx]
+        tref = 0.5 * (prev + t_air)
+        h = _h_cylinder(tref, p, speed[idx])
+        fatm = STEFANB * EMIS_WICK * (radiation[idx] - prev ** 4) + shortwave[idx]
+        ewick = _esat(prev)
+        density = p * 100.0 / (R_AIR * tref)
+        sc = _viscosity(tref) / (density * _diffusivity(tref, p))
+        return (t_air - _evap(tref) / RATIO * (ewick - eair[idx]) / (p - ewick) * (PR / sc) ** 0.56
+                + fatm / h)
+
+    return _solve(_dew_point(eair), step)
@@ -0,0 +1,469 @@
+"""
+外部気象データ取得モジュール
+屋外の気象観測値とWBGT予報を外部のフィードから取得し、セッション間で共有する
+
+    - asyncioでフィードを並行して取得し、接続はプールして再利用する
+    - ETag / Last-Modified による条件付きリクエストで、変更がなければ本文を受け取らない
+    - 取得結果は有効期限（TTL）付きでプロセス内にキャッシュし、全セッションで共有する
+      （同じフィードへの同時の取得要求は1回の取得にまとめる）
+観測値は屋外センサーの測定値として、画面の測定値と同じ不快指数・WBGTの計算に取り込む。
+
+使い方:
+    python weather_feeds.py --observation-url http://127.0.0.1:8090/observations.json
+"""
+import abc
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import aiohttp
+
+from monitoring import add_data_points
+
+# 既定のキャッシュ有効期限（秒）
+DEFAULT_TTL_SECONDS = 300.0
+
+# 取得に失敗した場合に再取得するまでの時間（秒）
+RETRY_SECONDS = 30.0
+
+# 既定の観測値のセンサーID
+DEFAULT_OBSERVATION_SENSOR_ID = '屋外/気象観測'
+
+# WBGT予報の時刻のタイムゾーン
+JST = timezone(timedelta(hours=9))
+
+
+class FeedParseError(ValueError):
+    """取得した本文の形式が不正"""
+
+
+def _to_local(timestamp: datetime) -> datetime:
+    """タイムゾーン付きの時刻を画面の測定値と同じローカル時刻（タイムゾーンなし）に変換"""
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone().replace(tzinfo=None)
+
+
+class WeatherFeed(abc.ABC):
+    """外部フィードの基底クラス（種類ごとにparseを実装する）"""
+
+    kind = None
+
+    def __init__(self, name: str, url: str, ttl: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            name: フィード名（キャッシュのキー）
+            url: 取得先のURL
+            ttl: キャッシュの有効期限（秒、省略時は環境変数WEATHER_FEED_TTL_SECONDS）
+        """
+        self.name = name
+        self.url = url
+        self.ttl = ttl if ttl is not None else float(os.getenv('WEATHER_FEED_TTL_SECONDS', DEFAULT_TTL_SECONDS))
+
+    @abc.abstractmethod
+    def parse(self, body: bytes) -> list:
+        """
+        取得した本文を解析
+
+        Args:
+            body: レスポンスの本文
+
+        Returns:
+            時刻順のデータの辞書のリスト
+        """
+
+
+class ObservationFeed(WeatherFeed):
+    """
+    気象観測値のフィード（JSON）
+
+    形式:
+        {"observations": [{"time": "2026-08-19T14:00:00+09:00", "temperature": 33.1,
+                           "humidity": 58, "wind_speed": 2.4, "solar_radiation": 720}, ...]}
+    """
+
+    kind = 'observation'
+
+    def __init__(self, name: str, url: str, sensor_id: str = DEFAULT_OBSERVATION_SENSOR_ID,
+                 ttl: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            name: フィード名
+            url: 取得先のURL
+            sensor_id: 観測値を取り込むセンサーID（OUTDOOR_SENSORSに含めると屋外WBGTで計算）
+            ttl: キャッシュの有効期限（秒）
+        """
+        super().__init__(name, url, ttl)
+        self.sensor_id = sensor_id
+
+    def parse(self, body: bytes) -> list:
+        payload = json.loads(body)
+        observations = payload.get('observations', []) if isinstance(payload, dict) else payload
+        readings = [{
+            'timestamp': _to_local(datetime.fromisoformat(obs['time'])),
+            'temperature': float(obs['temperature']),
+            'humidity': float(obs['humidity']),
+            'wind_speed': float(obs['wind_speed']) if obs.get('wind_speed') is not None else None,
+            'solar_radiation': float(obs['solar_radiation']) if obs.get('solar_radiation') is not None else None
+        } for obs in observations]
+        return sorted(readings, key=lambda r: r['timestamp'])
+
+
+class WbgtForecastFeed(WeatherFeed):
+    """
+    WBGT予報のフィード（環境省 熱中症予防情報サイトの予測値CSV形式）
+
+    形式:
+        1行目: 空欄, 空欄, 予測対象時刻（YYYYMMDDHH、日本時間）...
+        2行目以降: 地点番号, 発表時刻, WBGTの10倍の値...
+    """
+
+    kind = 'wbgt_forecast'
+
+    def __init__(self, name: str, url: str, point: str, ttl: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            name: フィード名
+            url: 取得先のURL
+            point: 地点番号（例: 44132 東京）
+            ttl: キャッシュの有効期限（秒）
+        """
+        super().__init__(name, url, ttl)
+        self.point = str(point)
+
+    def parse(self, body: bytes) -> list:
+        rows = list(csv.reader(io.StringIO(body.decode('utf-8-sig'))))
+        if not rows:
+            return []
+        times = [_parse_forecast_time(value) for value in rows[0][2:]]
+        for row in rows[1:]:
+            if row and row[0].strip() == self.point:
+                return [
+                    {'timestamp': t, 'wbgt': int(value) / 10}
+                    for t, value in zip(times, row[2:])
+                    if t is not None and value.strip()
+                ]
+        return []
+
+
+def _parse_forecast_time(value: str) -> Optional[datetime]:
+    """予測対象時刻（YYYYMMDDHH、24時は翌日0時）をローカル時刻に変換"""
+    value = value.strip()
+    if len(value) != 10:
+        return None
+    day = datetime.strptime(value[:8], '%Y%m%d').replace(tzinfo=JST)
+    return _to_local(day + timedelta(hours=int(value[8:])))
+
+
+class FeedFetcher:
+    """外部フィードを取得してキャッシュする（専用スレッドのイベントループで動作）"""
+
+    def __init__(self, feeds: list, timeout: float = 10.0, max_connections: int = 10):
+        """
+        初期化
+
+        Args:
+            feeds: WeatherFeedのリスト
+            timeout: 1回の取得のタイムアウト（秒）
+            max_connections: 接続プールの最大接続数
+        """
+        self.feeds = {feed.name: feed for feed in feeds}
+        self.timeout = timeout
+        self.max_connections = max_connections
+
+        # フィード名 -> {'data', 'etag', 'last_modified', 'fetched_at', 'expires_at', 'error'}
+        self.entries = {}
+        self.stats = {'requests': 0, 'not_modified': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._inflight = {}  # フィード名 -> 取得中のタスク（イベントループのスレッドからのみ操作）
+
+    def start(self):
+        """イベントループをバックグラウンドスレッドで起動"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """接続を閉じてイベントループを停止"""
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(self.timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(self.timeout)
+        self._loop.close()
+        self._thread = None
+
+    def get(self, name: str) -> Optional[list]:
+        """
+        キャッシュ済みのデータを取得（待機しない）
+
+        有効期限が切れている場合はバックグラウンドで取得し直し、それまでは前回のデータを返す。
+
+        Args:
+            name: フィード名
+
+        Returns:
+            データのリスト（未取得の場合はNone）
+        """
+        with self._lock:
+            entry = self.entries.get(name)
+        if entry is None or time.time() >= entry['expires_at']:
+            self.start()
+            asyncio.run_coroutine_threadsafe(self._fetch_once(name), self._loop)
+        return entry['data'] if entry else None
+
+    def refresh(self, names: Optional[list] = None, timeout: Optional[float] = None) -> dict:
+        """
+        有効期限の切れたフィードを並行して取得し、完了まで待機
+
+        Args:
+            names: 対象のフィード名のリスト（省略時は全フィード）
+            timeout: 待機時間の上限（秒）
+
+        Returns:
+            フィード名 -> データのリスト の辞書
+        """
+        self.start()
+        names = list(self.feeds) if names is None else names
+        asyncio.run_coroutine_threadsafe(self._fetch_all(names), self._loop).result(timeout)
+        with self._lock:
+            return {name: self.entries[name]['data'] for name in names if name in self.entries}
+
+    async def _fetch_all(self, names: list):
+        """複数のフィードを並行して取得"""
+        await asyncio.gather(*(self._fetch_once(name) for name in names))
+
+    async def _fetch_once(self, name: str):
+        """有効期限が切れていれば取得する（同時の要求は取得中のタスクにまとめる）"""
+        with self._lock:
+            entry = self.entries.get(name)
+        if entry is not None and time.time() < entry['expires_at']:
+            return
+        task = self._inflight.get(name)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(self.feeds[name]))
+            self._inflight[name] = task
+            task.add_done_callback(lambda _: self._inflight.pop(name, None))
+        await task
+
+    async def _fetch(self, feed: WeatherFeed):
+        """フィードを条件付きリクエストで取得してキャッシュを更新"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+
+        with self._lock:
+            entry = dict(self.entries.get(feed.name) or {'data': None, 'etag': None, 'last_modified': None})
+            self.stats['requests'] += 1
+
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        now = time.time()
+        try:
+            async with self._session.get(feed.url, headers=headers) as response:
+                if response.status == 304:
+                    with self._lock:
+                        self.stats['not_modified'] += 1
+                elif response.status == 200:
+                    body = await response.read()
+                    try:
+                        entry['data'] = feed.parse(body)
+                    except Exception as e:
+                        raise FeedParseError(f"{type(e).__name__}: {e}") from e
+                    entry['etag'] = response.headers.get('ETag')
+                    entry['last_modified'] = response.headers.get('Last-Modified')
+                else:
+                    raise aiohttp.ClientResponseError(
+                        response.request_info, response.history, status=response.status,
+                        message=response.reason or ''
+                    )
+            entry.update(fetched_at=now, expires_at=now + feed.ttl, error=None)
+        except FeedParseError as e:
+            # 同じ本文は何度取得しても解析できないため、前回のデータを残して有効期限まで取得しない
+            print(f"気象データの形式エラー ({feed.name}): {e}")
+            entry.update(expires_at=now + feed.ttl, error=str(e))
+            entry.setdefault('fetched_at', None)
+            with self._lock:
+                self.stats['errors'] += 1
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # 前回のデータを残し、少し待ってから再取得する
+            print(f"気象データの取得エラー ({feed.name}): {e!r}")
+            entry.update(expires_at=now + min(feed.ttl, RETRY_SECONDS), error=str(e) or repr(e))
+            entry.setdefault('fetched_at', None)
+            with self._lock:
+                self.stats['errors'] += 1
+
+        with self._lock:
+            self.entries[feed.name] = entry
+
+    async def _close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def build_feeds_from_env() -> list:
+    """
+    環境変数からフィードを作成
+
+    Returns:
+        WeatherFeedのリスト（WEATHER_OBSERVATION_URL / WBGT_FORECAST_URLが未設定なら含まない）
+    """
+    feeds = []
+    if os.getenv('WEATHER_OBSERVATION_URL'):
+        feeds.append(ObservationFeed(
+            'observation', os.getenv('WEATHER_OBSERVATION_URL'),
+            sensor_id=os.getenv('WEATHER_OBSERVATION_SENSOR_ID', DEFAULT_OBSERVATION_SENSOR_ID)
+        ))
+    if os.getenv('WBGT_FORECAST_URL'):
+        feeds.append(WbgtForecastFeed(
+            'wbgt_forecast', os.getenv('WBGT_FORECAST_URL'), os.getenv('WBGT_FORECAST_POINT', '44132')
+        ))
+    return feeds
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_feed_fetcher() -> Optional[FeedFetcher]:
+    """
+    プロセス内で共有するFeedFetcherを取得
+
+    Returns:
+        FeedFetcher（フィードが設定されていない場合はNone）
+    """
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            feeds = build_feeds_from_env()
+            if not feeds:
+                return None
+            _fetcher = FeedFetcher(feeds)
+        return _fetcher
+
+
+def observation_sensor_ids(fetcher: Optional[FeedFetcher]) -> list:
+    """
+    観測値を取り込むセンサーIDを取得
+
+    Args:
+        fetcher: FeedFetcher
+
+    Returns:
+        センサーIDのリスト
+    """
+    if fetcher is None:
+        return []
+    return [feed.sensor_id for feed in fetcher.feeds.values() if isinstance(feed, ObservationFeed)]
+
+
+def collect_observations(state, fetcher: Optional[FeedFetcher]) -> list:
+    """
+    キャッシュ済みの観測値のうち未取り込みのものを取り出す（取り込み済みとして記録する）
+
+    セッションで初めて観測値を取得したときは、過去の観測値で古いアラートが出ないように
+    取り込み済みの時刻だけを記録し、以降に追加された観測値から取り込む。
+
+    Args:
+        state: セッション状態（st.session_stateまたは辞書）
+        fetcher: FeedFetcher
+
+    Returns:
+        add_data_pointsに渡す測定値の辞書のリスト
+    """
+    if fetcher is None:
+        return []
+    seen = state.setdefault('feed_seen', {})  # フィード名 -> 取り込み済みの最新の観測時刻
+    readings = []
+    for feed in fetcher.feeds.values():
+        if not isinstance(feed, ObservationFeed):
+            continue
+        data = fetcher.get(feed.name)
+        if not data:
+            continue
+        if feed.name not in seen:
+            seen[feed.name] = data[-1]['timestamp']
+            continue
+        for reading in data:
+            if reading['timestamp'] <= seen[feed.name]:
+                continue
+            readings.append(dict(reading, sensor_id=feed.sensor_id))
+            seen[feed.name] = reading['timestamp']
+    return readings
+
+
+def ingest_observations(state, fetcher: Optional[FeedFetcher]) -> int:
+    """
+    キャッシュ済みの観測値のうち未取り込みのものをセッションの測定値に追加
+
+    Args:
+        state: セッション状態（st.session_stateまたは辞書）
+        fetcher: FeedFetcher
+
+    Returns:
+        追加した件数
+    """
+    readings = collect_observations(state, fetcher)
+    add_data_points(state, readings)
+    return len(readings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="外部気象データの取得")
+    parser.add_argument('--observation-url', help="気象観測値（JSON）のURL")
+    parser.add_argument('--forecast-url', help="WBGT予報（CSV）のURL")
+    parser.add_argument('--point', default='44132', help="WBGT予報の地点番号")
+    parser.add_argument('--repeat', type=int, default=2, help="取得を繰り返す回数（2回目以降は条件付きリクエスト）")
+    args = parser.parse_args()
+
+    feeds = []
+    if args.observation_url:
+        feeds.append(ObservationFeed('observation', args.observation_url, ttl=0))
+    if args.forecast_url:
+        feeds.append(WbgtForecastFeed('wbgt_forecast', args.forecast_url, args.point, ttl=0))
+    if not feeds:
+        parser.error("--observation-url または --forecast-url を指定してください")
+
+    fetcher = FeedFetcher(feeds)
+    try:
+        for _ in range(args.repeat):
+            data = fetcher.refresh()
+        for name, records in data.items():
+            print(f"{name}: {len(records or [])}件")
+            for record in (records or [])[-3:]:
+                print(f"  {record}")
+        print(f"リクエスト: {fetcher.stats['requests']}件, "
+              f"304: {fetcher.stats['not_modified']}件, エラー: {fetcher.stats['errors']}件")
+    finally:
+        fetcher.stop()
+
+
+if __name__ == '__main__':
+    main()
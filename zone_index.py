@@ -0,0 +1,246 @@
+"""
+ゾーン別最大リスク集計モジュール
+建物 → フロア → 部屋 の階層ごとに、最もリスクの高いセンサーを逐次管理する
+
+センサーIDは "本館/2F/会議室A/sensor-1" のように "/" 区切りで階層を表し、
+最後の要素を除いた各プレフィックスがゾーンになる。
+一定時間（ZONE_STALE_MINUTES）測定値が届かないセンサーは、停止したものとしてインデックスから取り除く。
+"""
+import heapq
+import itertools
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from heatstroke import HEATSTROKE_LEVELS
+
+# リスクレベルの深刻度（大きいほど危険）
+RISK_RANK = {level: rank for rank, level in enumerate(HEATSTROKE_LEVELS)}
+
+# ゾーン区切り文字
+ZONE_SEPARATOR = '/'
+
+# 測定値が届かないセンサーを取り除くまでの既定の時間（分）
+DEFAULT_STALE_MINUTES = 30.0
+
+
+def get_stale_minutes() -> float:
+    """
+    測定値が届かないセンサーを取り除くまでの時間を取得
+
+    Returns:
+        時間（分、環境変数ZONE_STALE_MINUTESで変更可能。0で取り除かない）
+    """
+    return float(os.getenv('ZONE_STALE_MINUTES', DEFAULT_STALE_MINUTES))
+
+
+def zone_ancestors(sensor_id: str) -> list:
+    """
+    センサーが属するゾーンを上位から順に取得
+
+    Args:
+        sensor_id: センサーID（例: "本館/2F/会議室A/sensor-1"）
+
+    Returns:
+        ゾーン名のリスト（例: ["", "本館", "本館/2F", "本館/2F/会議室A"]）。
+        空文字は全体を表す
+    """
+    parts = str(sensor_id).split(ZONE_SEPARATOR)[:-1]
+    return [''] + [ZONE_SEPARATOR.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+class ZoneRiskIndex:
+    """
+    ゾーンごとの最大リスクを管理するインデックス
+
+    ゾーンごとに (リスクの深刻度, WBGT, 不快指数) をキーとする最大ヒープを持ち、
+    センサーの値が更新されると祖先ゾーンのヒープに新しいエントリを追加する。
+    古いエントリは遅延削除し、ヒープの先頭は常に有効なエントリに保つため、
+    最大値の参照はO(1)、更新は祖先ゾーンごとにO(log n)（償却）となる。
+    測定時刻の最小ヒープも同じ方法で管理し、測定値が途絶えたセンサーを古い順に取り除く。
+    """
+
+    def __init__(self, stale_after: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            stale_after: 測定値が届かないセンサーを取り除くまでの時間（秒、0で取り除かない。
+                省略時は環境変数ZONE_STALE_MINUTES）
+        """
+        self.stale_after = stale_after if stale_after is not None else get_stale_minutes() * 60
+        self._latest = {}       # センサーID -> 最新の値の辞書
+        self._versions = {}     # センサーID -> 最新エントリのバージョン
+        self._heaps = {}        # ゾーン名 -> ヒープ
+        self._members = {}      # ゾーン名 -> 所属センサー数
+        self._expiry = []       # (測定時刻, バージョン, センサーID) の最小ヒープ
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def update(self, sensor_id: str, risk_level: str, wbgt: float, di: float, timestamp=None):
+        """
+        センサーの最新値を登録
+
+        Args:
+            sensor_id: センサーID
+            risk_level: リスクレベル
+            wbgt: WBGT
+            di: 不快指数
+            timestamp: 測定時刻
+        """
+        with self._lock:
+            version = next(self._counter)
+            is_new = sensor_id not in self._latest
+            self._versions[sensor_id] = version
+            self._latest[sensor_id] = {
+                'sensor_id': sensor_id,
+                'risk_level': risk_level,
+                'wbgt': wbgt,
+                'di': di,
+                'timestamp': timestamp
+            }
+
+            # heapqは最小ヒープのため符号を反転したキーを使う
+            entry = (-RISK_RANK[risk_level], -wbgt, -di, version, sensor_id)
+            for zone in zone_ancestors(sensor_id):
+                heap = self._heaps.setdefault(zone, [])
+                if is_new:
+                    self._members[zone] = self._members.get(zone, 0) + 1
+                heapq.heappush(heap, entry)
+                self._prune(zone)
+
+            if timestamp is not None and self.stale_after > 0:
+                heapq.heappush(self._expiry, (timestamp, version, sensor_id))
+                self._expire(timestamp)
+
+    def remove(self, sensor_id: str):
+        """
+        センサーをインデックスから削除
+
+        Args:
+            sensor_id: センサーID
+        """
+        with self._lock:
+            self._remove(sensor_id)
+
+    def _remove(self, sensor_id: str):
+        """センサーを削除（ロックを保持して呼び出す）"""
+        if sensor_id not in self._latest:
+            return
+        del self._latest[sensor_id]
+        del self._versions[sensor_id]
+        for zone in zone_ancestors(sensor_id):
+            self._members[zone] -= 1
+            if self._members[zone] == 0:
+                del self._members[zone]
+                del self._heaps[zone]
+            else:
+                self._prune(zone)
+
+    def expire(self, now: Optional[datetime] = None) -> list:
+        """
+        測定値が一定時間届いていないセンサーを削除
+
+        Args:
+            now: 現在時刻（省略時はdatetime.now()）
+
+        Returns:
+            削除したセンサーIDのリスト
+        """
+        if self.stale_after <= 0:
+            return []
+        with self._lock:
+            return self._expire(now or datetime.now())
+
+    def _expire(self, now: datetime) -> list:
+        """古いセンサーを削除（ロックを保持して呼び出す）"""
+        cutoff = now - timedelta(seconds=self.stale_after)
+        removed = []
+        while self._expiry and self._expiry[0][0] < cutoff:
+            _, version, sensor_id = heapq.heappop(self._expiry)
+            if self._versions.get(sensor_id) == version:
+                self._remove(sensor_id)
+                removed.append(sensor_id)
+
+        # 更新済みのエントリが有効なエントリの数を大きく上回ったら作り直す
+        if len(self._expiry) > 4 * len(self._versions) + 16:
+            self._expiry = [e for e in self._expiry if self._versions.get(e[2]) == e[1]]
+            heapq.heapify(self._expiry)
+        return removed
+
+    def _prune(self, zone: str):
+        """
+        ヒープ先頭の古いエントリを取り除き、必要に応じてヒープを再構築
+
+        Args:
+            zone: ゾーン名
+        """
+        heap = self._heaps[zone]
+        while heap and self._versions.get(heap[0][4]) != heap[0][3]:
+            heapq.heappop(heap)
+
+        # 古いエントリが有効なエントリの数を大きく上回ったら作り直す
+        if len(heap) > 4 * self._members[zone] + 16:
+            self._heaps[zone] = [e for e in heap if self._versions.get(e[4]) == e[3]]
+            heapq.heapify(self._heaps[zone])
+
+    def zone_max(self, zone: str = '') -> Optional[dict]:
+        """
+        ゾーン内で最もリスクの高いセンサーの値を取得
+
+        Args:
+            zone: ゾーン名（空文字は全体）
+
+        Returns:
+            センサーの最新値の辞書（ゾーンが存在しない場合はNone）
+        """
+        with self._lock:
+            heap = self._heaps.get(zone)
+            if not heap:
+                return None
+            return self._latest[heap[0][4]]
+
+    def zones(self) -> list:
+        """
+        登録されているゾーンを階層順に取得
+
+        Returns:
+            ゾーン名のリスト（全体を表す空文字を除く）
+        """
+        with self._lock:
+            return sorted(zone for zone in self._heaps if zone)
+
+    def sensor_count(self, zone: str = '') -> int:
+        """
+        ゾーンに所属するセンサー数を取得
+
+        Args:
+            zone: ゾーン名（空文字は全体）
+
+        Returns:
+            センサー数
+        """
+        return self._members.get(zone, 0)
+
+    def overview(self, now: Optional[datetime] = None) -> list:
+        """
+        全ゾーンの最大リスクの一覧を取得（測定値が途絶えたセンサーは先に削除する）
+
+        Args:
+            now: 現在時刻（省略時はdatetime.now()）
+
+        Returns:
+            {'zone', 'depth', 'sensors', 'risk_level', 'wbgt', 'di', 'sensor_id', 'timestamp'} のリスト
+        """
+        self.expire(now)
+        rows = []
+        for zone in self.zones():
+            top = self.zone_max(zone)
+            rows.append({
+                'zone': zone,
+                'depth': zone.count(ZONE_SEPARATOR),
+                'sensors': self.sensor_count(zone),
+                **top
+            })
+        return rows